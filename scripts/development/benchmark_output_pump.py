@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+"""Measure the throughput of the subprocess output pump.
+
+Runs a synthetic process that writes lots of lines to both stdout and stderr, and
+reports how fast 'kiara_plugin.develop.utils.pump_output' consumes them. Use
+'--legacy' to compare against the old one-character-at-a-time reader (slow, use a
+small '--size-mb' value for that).
+"""
+
+import argparse
+import selectors
+import subprocess
+import sys
+import time
+
+from kiara.utils.cli import terminal_print
+from kiara_plugin.develop.utils import pump_output
+
+WRITER = """
+import os, sys
+line = (b"x" * 119) + b"\\n"
+chunk = line * 512
+remaining = {size}
+while remaining > 0:
+    os.write(1, chunk)
+    os.write(2, chunk)
+    remaining -= len(chunk)
+"""
+
+
+def legacy_unbuffered(proc):
+
+    sel = selectors.DefaultSelector()
+    sel.register(proc.stdout, selectors.EVENT_READ)
+    sel.register(proc.stderr, selectors.EVENT_READ)
+    current = {proc.stdout: "", proc.stderr: ""}
+    finished = set()
+    while len(finished) < 2:
+        for key, _ in sel.select():
+            data = key.fileobj.read(1)
+            if not data:
+                finished.add(key.fileobj)
+                sel.unregister(key.fileobj)
+                continue
+            if data == "\n":
+                yield current[key.fileobj]
+                current[key.fileobj] = ""
+            else:
+                current[key.fileobj] += data
+
+
+def run(size: int, legacy: bool) -> None:
+
+    cmd = [sys.executable, "-c", WRITER.format(size=size)]
+    start = time.perf_counter()
+    lines = 0
+    with subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=legacy,
+    ) as proc:
+        if legacy:
+            for _ in legacy_unbuffered(proc):
+                lines += 1
+        else:
+            for _ in pump_output(proc):
+                lines += 1
+        proc.wait()
+    duration = time.perf_counter() - start
+
+    total_mb = 2 * size / (1024 * 1024)
+    terminal_print(
+        f"{'legacy' if legacy else 'pump_output'}: {lines} lines, {total_mb:.0f} MB in {duration:.2f}s ({total_mb / duration:.1f} MB/s)"
+    )
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--size-mb", type=int, default=128, help="MB to write to each stream."
+    )
+    parser.add_argument("--legacy", action="store_true", help="Also run the old reader.")
+    args = parser.parse_args()
+
+    run(args.size_mb * 1024 * 1024, legacy=False)
+    if args.legacy:
+        run(args.size_mb * 1024 * 1024, legacy=True)
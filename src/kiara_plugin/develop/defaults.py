@@ -31,3 +31,52 @@ KIARA_DEV_MICROMAMBA_ENV = {
     "MAMBA_ROOT_PREFIX": os.path.join(kiara_dev_app_dirs.user_data_dir, "micromamba"),
 }
 DEFAULT_PYTHON_VERSION = "3.10"
+
+KIARA_DEV_PYPI_CACHE_FOLDER = os.path.join(KIARA_DEV_CACHE_FOLDER, "pypi_cache")
+"""Folder that holds cached PyPI metadata responses."""
+KIARA_DEV_PYPI_CACHE_TTL = int(os.environ.get("KIARA_DEV_PYPI_CACHE_TTL", "3600"))
+"""Seconds before a cached, unpinned PyPI response is revalidated."""
+KIARA_DEV_PYPI_CACHE_SIZE_LIMIT = int(
+    os.environ.get("KIARA_DEV_PYPI_CACHE_SIZE_LIMIT", str(512 * 1024 * 1024))
+)
+"""Maximum size (in bytes) of the PyPI metadata cache, before LRU eviction kicks in."""
+KIARA_DEV_PYPI_MAX_CONNECTIONS = int(os.environ.get("KIARA_DEV_PYPI_MAX_CONNECTIONS", "8"))
+"""Maximum number of concurrent connections (and fetch threads) used for PyPI requests."""
+KIARA_DEV_PYPI_METADATA_BACKEND = os.environ.get("KIARA_DEV_PYPI_METADATA_BACKEND", "simple")
+"""How to retrieve PyPI metadata: 'simple' (PEP 691/658, falls back to 'json'), 'json' (full json API documents), or 'index' (local package index only)."""
+KIARA_DEV_PKG_INDEX_PATH = os.environ.get(
+    "KIARA_DEV_PKG_INDEX_PATH", os.path.join(KIARA_DEV_CACHE_FOLDER, "pkg_index.sqlite")
+)
+"""Path to the local (offline) package index database."""
+KIARA_DEV_PROJECT_METADATA_CACHE_FOLDER = os.path.join(
+    KIARA_DEV_CACHE_FOLDER, "project_metadata_cache"
+)
+"""Folder that holds the metadata of local projects that needed a build to be read."""
+KIARA_DEV_LICENSE_INDEX_PATH = os.path.join(KIARA_DEV_CACHE_FOLDER, "spdx_license_index.json")
+"""Path to the persisted SPDX license alias index."""
+KIARA_DEV_SOURCE_CACHE_FOLDER = os.path.join(KIARA_DEV_CACHE_FOLDER, "sources")
+"""Folder that holds downloaded package sources, keyed by their sha256 digest."""
+KIARA_DEV_OUTPUT_BUFFER_SIZE = int(
+    os.environ.get("KIARA_DEV_OUTPUT_BUFFER_SIZE", str(256 * 1024))
+)
+"""Number of characters of each output stream of a logged command that are kept in memory."""
+KIARA_DEV_STATES_CACHE_PATH = os.path.join(KIARA_DEV_CACHE_FOLDER, "states.json")
+"""Path to the file that persists resolved build environment states."""
+KIARA_DEV_LOCAL_CHANNEL_FOLDER = os.environ.get(
+    "KIARA_DEV_LOCAL_CHANNEL_FOLDER", os.path.join(KIARA_DEV_CACHE_FOLDER, "channel")
+)
+"""Folder of the local conda channel that built packages are published to."""
+KIARA_DEV_BUILD_CACHE_FOLDER = os.path.join(KIARA_DEV_CACHE_FOLDER, "build_cache")
+"""Folder that holds build artifacts, keyed by the fingerprint of everything that went into the build."""
+KIARA_DEV_PACKAGE_CACHE_FOLDER = os.environ.get(
+    "KIARA_DEV_PACKAGE_CACHE_FOLDER", os.path.join(KIARA_DEV_CACHE_FOLDER, "pkgs")
+)
+"""Folder that holds the conda package and repodata caches shared by all rattler-build and micromamba runs."""
+KIARA_DEV_PACKAGE_CACHE_SIZE_LIMIT = int(
+    os.environ.get("KIARA_DEV_PACKAGE_CACHE_SIZE_LIMIT", str(10 * 1024 * 1024 * 1024))
+)
+"""Maximum size (in bytes) of the cached conda packages, least recently used packages are removed first."""
+KIARA_DEV_REPODATA_CACHE_SIZE_LIMIT = int(
+    os.environ.get("KIARA_DEV_REPODATA_CACHE_SIZE_LIMIT", str(2 * 1024 * 1024 * 1024))
+)
+"""Maximum size (in bytes) of the cached channel repodata, least recently used files are removed first."""
@@ -8,7 +8,7 @@
 import os
 import sys
 from pathlib import Path
-from typing import Any, Union
+from typing import Any, Dict, List, Tuple, Union
 
 import rich_click as click
 
@@ -26,6 +26,71 @@ def conda(ctx):
     """Rattler-build environment related sub-commands."""
 
 
+@pkg_build.group()
+@click.pass_context
+def index(ctx):
+    """Local (offline) package index related sub-commands."""
+
+
+@index.command("sync")
+@click.argument("pkgs", nargs=-1, required=False)
+@click.option(
+    "--file",
+    "-f",
+    "pkgs_file",
+    help="A file containing package names (or 'name==version'), one per line.",
+    required=False,
+)
+@click.option("--db", help="The path to the index database.", required=False)
+@click.pass_context
+def sync_index(
+    ctx, pkgs: Tuple[str, ...], pkgs_file: Union[str, None], db: Union[str, None]
+):
+    """Snapshot PyPI metadata for a set of packages into the local index."""
+
+    from kiara_plugin.develop.utils.pkg_index import PackageIndex, read_pkg_list_file
+
+    all_pkgs = list(pkgs)
+    if pkgs_file:
+        all_pkgs.extend(read_pkg_list_file(pkgs_file))
+
+    if not all_pkgs:
+        terminal_print()
+        terminal_print("No packages specified, doing nothing...")
+        sys.exit(1)
+
+    pkg_index = PackageIndex(db) if db else PackageIndex()
+    result = pkg_index.sync(all_pkgs)
+
+    terminal_print()
+    terminal_print(f"Synced {len(result)} package(s) into: {pkg_index.db_path}")
+    for pkg_name, versions in sorted(result.items()):
+        terminal_print(f"  - {pkg_name}: {', '.join(versions)}")
+
+
+@index.command("query")
+@click.argument("pattern", required=False)
+@click.option("--db", help="The path to the index database.", required=False)
+@click.pass_context
+def query_index(ctx, pattern: Union[str, None], db: Union[str, None]):
+    """List the packages in the local index (supports '*' wildcards)."""
+
+    from kiara_plugin.develop.utils.pkg_index import PackageIndex
+
+    pkg_index = PackageIndex(db) if db else PackageIndex()
+    pkgs = pkg_index.query(pattern)
+
+    terminal_print()
+    if not pkgs:
+        terminal_print("No matching packages in index.")
+        return
+
+    for pkg in pkgs:
+        terminal_print(
+            f"  - {pkg['name']}: latest {pkg['latest_version']} (metadata for: {', '.join(pkg['versions'])})"
+        )
+
+
 @conda.command("pkg-from-spec")
 @click.argument("pkg_spec", nargs=1, required=True)
 @click.option(
@@ -50,6 +115,12 @@ def conda(ctx):
     required=False
 )
 @click.option("--output-folder", "-o", help="The output folder for the built package.", required=False)
+@click.option(
+    "--rebuild", help="Build, even if there is a cached build with the same inputs.", is_flag=True
+)
+@click.option(
+    "--local-channel", help="Resolve dependencies from the local channel (that all built packages are added to) first.", is_flag=True
+)
 @click.pass_context
 def build_package_from_spec(
     ctx,
@@ -59,6 +130,8 @@ def build_package_from_spec(
     user: Union[str, None] = None,
     channel: Union[str, None] = None,
     output_folder: Union[str, None] = None,
+    rebuild: bool = False,
+    local_channel: bool = False,
 ):
     """Create a conda environment."""
 
@@ -89,13 +162,20 @@ def build_package_from_spec(
     from kiara.utils.files import get_data_from_file
     from kiara_plugin.develop.pkg_build.models import PkgSpec
     from kiara_plugin.develop.pkg_build.rattler import RattlerBuildEnvMgmt
+    from kiara_plugin.develop.utils.package_cache import prune_package_cache
 
     rattler_mgmt: RattlerBuildEnvMgmt = RattlerBuildEnvMgmt()
 
     recipe_data = get_data_from_file(pkg_spec)
     pkg = PkgSpec(**recipe_data)
 
-    pkg_result = rattler_mgmt.build_package(pkg, output_folder=output_folder)
+    pkg_result = rattler_mgmt.build_package(
+        pkg,
+        output_folder=output_folder,
+        rebuild=rebuild,
+        use_local_channel=local_channel,
+    )
+    prune_package_cache()
     if publish:
         rattler_mgmt.upload_package(artifacts_or_folder=pkg_result.build_artifacts, token=token, user=user, channel=channel)  # type: ignore
 
@@ -120,6 +200,17 @@ def build_package_from_spec(
 @click.option(
     "--patch-data", "-p", help="A file to patch the auto-generated spec with."
 )
+@click.option(
+    "--stats", help="Print statistics about the PyPI requests that were made.", is_flag=True
+)
+@click.option(
+    "--offline", help="Only use the local package index, no network requests.", is_flag=True
+)
+@click.option(
+    "--index-db",
+    help="The path to the local package index database (used with '--offline').",
+    required=False,
+)
 @click.pass_context
 def build_package_spec(
     ctx,
@@ -130,6 +221,9 @@ def build_package_spec(
     format: str,
     force_version: bool,
     patch_data: Union[str, None] = None,
+    stats: bool = False,
+    offline: bool = False,
+    index_db: Union[str, None] = None,
 ):
     """Create a conda package spec file."""
 
@@ -145,6 +239,11 @@ def build_package_spec(
             terminal_print()
             terminal_print(f"Output path already exists: {output}. Doing nothing...")
 
+    if offline:
+        from kiara_plugin.develop.utils.pypi import set_pypi_metadata_backend
+
+        set_pypi_metadata_backend("index", pkg_index_path=index_db)
+
     _patch_data = None
     if patch_data:
         from kiara.utils.files import get_data_from_file
@@ -183,6 +282,242 @@ def build_package_spec(
             os.unlink(o)
         o.write_text(pkg_out)  # type: ignore
 
+    if stats:
+        from kiara_plugin.develop.utils.pypi import get_pypi_metadata_cache
+
+        fetch_stats = get_pypi_metadata_cache().stats
+        terminal_print()
+        terminal_print(
+            f"PyPI requests: {fetch_stats.requests}, cache hits: {fetch_stats.cache_hits}, bytes transferred: {fetch_stats.bytes_transferred}, parse time: {fetch_stats.parse_time:.3f}s"
+        )
+
+
+@conda.command("pkg-specs")
+@click.argument("pkgs", nargs=-1, required=False)
+@click.option(
+    "--file",
+    "-f",
+    "pkgs_file",
+    help="A file containing one package per line, in the format: 'name[==version] [patch_file]'.",
+    required=False,
+)
+@click.option(
+    "--output-folder",
+    "-o",
+    help="The folder to write the specs into (one sub-folder per package).",
+    required=True,
+)
+@click.option(
+    "--format",
+    "-t",
+    help="The format(s) of the generated files.",
+    type=click.Choice(["spec", "rattler-build"]),
+    multiple=True,
+    default=["spec", "rattler-build"],
+)
+@click.option(
+    "--workers",
+    "-w",
+    help="The number of specs to create in parallel.",
+    type=int,
+    default=8,
+)
+@click.option(
+    "--offline", help="Only use the local package index, no network requests.", is_flag=True
+)
+@click.option(
+    "--index-db",
+    help="The path to the local package index database (used with '--offline').",
+    required=False,
+)
+@click.pass_context
+def build_package_specs(
+    ctx,
+    pkgs: Tuple[str, ...],
+    pkgs_file: Union[str, None],
+    output_folder: str,
+    format: Tuple[str, ...],
+    workers: int,
+    offline: bool,
+    index_db: Union[str, None],
+):
+    """Create conda package specs for several packages, in one go."""
+
+    from kiara.utils.files import get_data_from_file
+    from kiara_plugin.develop.pkg_build.models import PkgSpec
+    from kiara_plugin.develop.utils import write_file_atomic
+    from kiara_plugin.develop.utils.pkg_index import read_pkg_list_file
+    from kiara_plugin.develop.utils.pkg_utils import create_pkg_specs, parse_pkg_list
+
+    if offline:
+        from kiara_plugin.develop.utils.pypi import set_pypi_metadata_backend
+
+        set_pypi_metadata_backend("index", pkg_index_path=index_db)
+
+    items = parse_pkg_list(pkgs)
+    if pkgs_file:
+        items.extend(
+            parse_pkg_list(
+                read_pkg_list_file(pkgs_file),
+                base_dir=os.path.dirname(os.path.abspath(pkgs_file)),
+            )
+        )
+
+    if not items:
+        terminal_print()
+        terminal_print("No packages specified, doing nothing...")
+        sys.exit(1)
+
+    all_pkgs = []
+    for pkg, version, patch_file in items:
+        patch_data = get_data_from_file(patch_file) if patch_file else None
+        all_pkgs.append((pkg, version, patch_data))
+
+    results = create_pkg_specs(all_pkgs, max_workers=workers)
+
+    terminal_print()
+    failed = False
+    for pkg, result in results.items():
+        if not isinstance(result, PkgSpec):
+            failed = True
+            terminal_print(f"  - [red]{pkg}[/red]: {result}")
+            continue
+
+        pkg_folder = Path(output_folder) / result.pkg_name
+        if "spec" in format:
+            write_file_atomic(pkg_folder / "spec.json", result.model_dump_json(indent=2))
+        if "rattler-build" in format:
+            write_file_atomic(
+                pkg_folder / "recipe.yaml", result.create_rattler_build_recipe()
+            )
+        terminal_print(
+            f"  - [green]{result.pkg_name}[/green] {result.pkg_version}: {pkg_folder}"
+        )
+
+    if failed:
+        sys.exit(1)
+
+
+@conda.command("deps")
+@click.argument("pkg")
+@click.option("--version", "-v", help="The version of the package.", required=False)
+@click.option(
+    "--extra", "-e", help="Include the requirements of this extra.", multiple=True
+)
+@click.option(
+    "--force-version", help="Overwrite the Python package version number.", is_flag=True
+)
+@click.pass_context
+def list_package_dependencies(
+    ctx,
+    pkg: str,
+    version: Union[str, None],
+    extra: Tuple[str, ...],
+    force_version: bool,
+):
+    """Resolve all (transitive) dependencies of a package, in build order."""
+
+    from kiara_plugin.develop.utils.dependency_graph import DependencyGraph
+    from kiara_plugin.develop.utils.pkg_utils import get_pkg_metadata
+
+    pkg_metadata = get_pkg_metadata(
+        pkg=pkg, version=version, force_version=force_version
+    )
+
+    graph = DependencyGraph()
+    graph.resolve_metadata(pkg_metadata, extras=extra)
+
+    packages = graph.packages()
+    cycles = graph.find_cycles()
+    if cycles:
+        terminal_print()
+        terminal_print("[red]Dependency cycles detected[/red]:")
+        for cycle in cycles:
+            terminal_print(f"  - {' -> '.join(cycle)}")
+        sys.exit(1)
+
+    terminal_print()
+    terminal_print(f"Dependencies of '{pkg_metadata['name']}', in build order:")
+    for pkg_name in graph.topological_order():
+        terminal_print(f"  - {pkg_name} {packages[pkg_name]}")
+
+
+@conda.command("check-reqs")
+@click.argument("paths", nargs=-1, required=True)
+@click.option(
+    "--offline", help="Only use the local package index, no network requests.", is_flag=True
+)
+@click.option(
+    "--index-db",
+    help="The path to the local package index database (used with '--offline').",
+    required=False,
+)
+@click.pass_context
+def check_requirements(
+    ctx, paths: Tuple[str, ...], offline: bool, index_db: Union[str, None]
+):
+    """Check that all pinned requirements in spec or patch files can be satisfied.
+
+    Paths can be package spec files (as created by 'pkg-specs'), patch files, or
+    folders that contain 'spec.json' files.
+    """
+
+    from rich.table import Table
+
+    from kiara.utils.files import get_data_from_file
+    from kiara_plugin.develop.utils.releases import check_requirements
+
+    if offline:
+        from kiara_plugin.develop.utils.pypi import set_pypi_metadata_backend
+
+        set_pypi_metadata_backend("index", pkg_index_path=index_db)
+
+    files: List[Path] = []
+    for path in paths:
+        _path = Path(os.path.expanduser(path))
+        if _path.is_dir():
+            files.extend(sorted(_path.rglob("spec.json")))
+        else:
+            files.append(_path)
+
+    requirements: Dict[str, List[str]] = {}
+    for f in files:
+        data = get_data_from_file(f.as_posix())
+        if "pkg_requirements" in data.keys():
+            reqs = data["pkg_requirements"]
+        else:
+            reqs = [r for r in data.get("requirements", {}).values() if r]
+        for req in reqs:
+            requirements.setdefault(req, []).append(f.as_posix())
+
+    checks = check_requirements(requirements.keys())
+
+    table = Table(show_header=True, box=None)
+    table.add_column("requirement", style="i")
+    table.add_column("latest match")
+    table.add_column("latest")
+    table.add_column("used in")
+
+    failed = False
+    for check in checks:
+        if check.error:
+            match = f"[yellow]not checked: {check.error}[/yellow]"
+        elif check.latest_matching is None:
+            failed = True
+            match = "[red]none[/red]"
+        else:
+            match = f"[green]{check.latest_matching}[/green]"
+        table.add_row(
+            check.requirement,
+            match,
+            check.latest or "",
+            "\n".join(requirements[check.requirement]),
+        )
+
+    terminal_print(table)
+    if failed:
+        sys.exit(1)
+
 
 @conda.command("pkg")
 @click.argument("pkg")
@@ -215,6 +550,20 @@ def build_package_spec(
     "--force-version", help="Overwrite the Python package version number.", is_flag=True
 )
 @click.option("--output-folder", "-o", help="The output folder for the built package.", required=False)
+@click.option(
+    "--offline", help="Only use the local package index to look up package metadata.", is_flag=True
+)
+@click.option(
+    "--index-db",
+    help="The path to the local package index database (used with '--offline').",
+    required=False,
+)
+@click.option(
+    "--rebuild", help="Build, even if there is a cached build with the same inputs.", is_flag=True
+)
+@click.option(
+    "--local-channel", help="Resolve dependencies from the local channel (that all built packages are added to) first.", is_flag=True
+)
 @click.pass_context
 def build_package(
     ctx,
@@ -227,10 +576,15 @@ def build_package(
     patch_data: Union[str, None] = None,
     force_version: bool = False,
     output_folder: Union[str, None] = None,
+    offline: bool = False,
+    index_db: Union[str, None] = None,
+    rebuild: bool = False,
+    local_channel: bool = False,
 ):
     """Create a conda environment."""
 
     from kiara_plugin.develop.pkg_build.rattler import RattlerBuildEnvMgmt
+    from kiara_plugin.develop.utils.package_cache import prune_package_cache
     from kiara_plugin.develop.utils.pkg_utils import create_pkg_spec, get_pkg_metadata
 
     if publish and not token:
@@ -258,6 +612,11 @@ def build_package(
             sys.exit(1)
 
 
+    if offline:
+        from kiara_plugin.develop.utils.pypi import set_pypi_metadata_backend
+
+        set_pypi_metadata_backend("index", pkg_index_path=index_db)
+
     rattler_mgmt: RattlerBuildEnvMgmt = RattlerBuildEnvMgmt()
 
     _patch_data: Any = None
@@ -277,12 +636,156 @@ def build_package(
     terminal_print(_pkg.create_conda_spec())
     terminal_print()
     terminal_print("Building package...")
-    pkg_result = rattler_mgmt.build_package(_pkg, output_folder=output_folder)
+    pkg_result = rattler_mgmt.build_package(
+        _pkg,
+        output_folder=output_folder,
+        rebuild=rebuild,
+        use_local_channel=local_channel,
+    )
+    prune_package_cache()
     if publish:
         rattler_mgmt.upload_package(artifacts_or_folder=pkg_result.build_artifacts, token=token, user=user, channel=channel)  # type: ignore
 
     terminal_print(pkg_result)
 
+@conda.command("pkgs")
+@click.argument("pkgs", nargs=-1, required=False)
+@click.option(
+    "--file",
+    "-f",
+    "pkgs_file",
+    help="A file containing one package per line, in the format: 'name[==version] [patch_file]'.",
+    required=False,
+)
+@click.option(
+    "--spec",
+    "-s",
+    "spec_files",
+    help="A package spec file (as created by 'pkg-specs'), can be used multiple times.",
+    multiple=True,
+)
+@click.option(
+    "--workers",
+    "-w",
+    help="The number of packages to build in parallel.",
+    type=int,
+    default=2,
+)
+@click.option(
+    "--channel-folder",
+    help="The folder of the local channel built packages are added to (and resolved from).",
+    required=False,
+)
+@click.option("--output-folder", "-o", help="The output folder for the built packages.", required=False)
+@click.option(
+    "--offline", help="Only use the local package index to look up package metadata.", is_flag=True
+)
+@click.option(
+    "--index-db",
+    help="The path to the local package index database (used with '--offline').",
+    required=False,
+)
+@click.option(
+    "--rebuild", help="Build, even if there is a cached build with the same inputs.", is_flag=True
+)
+@click.pass_context
+def build_packages(
+    ctx,
+    pkgs: Tuple[str, ...],
+    pkgs_file: Union[str, None],
+    spec_files: Tuple[str, ...],
+    workers: int,
+    channel_folder: Union[str, None],
+    output_folder: Union[str, None],
+    offline: bool,
+    index_db: Union[str, None],
+    rebuild: bool,
+):
+    """Build several packages, in dependency order, using a local channel for packages built in this run."""
+
+    from kiara.utils.files import get_data_from_file
+    from kiara_plugin.develop.pkg_build.channel import LocalChannel
+    from kiara_plugin.develop.pkg_build.models import PkgSpec
+    from kiara_plugin.develop.pkg_build.rattler import RattlerBuildEnvMgmt
+    from kiara_plugin.develop.pkg_build.scheduler import BuildScheduler
+    from kiara_plugin.develop.utils.package_cache import prune_package_cache
+    from kiara_plugin.develop.utils.pkg_index import read_pkg_list_file
+    from kiara_plugin.develop.utils.pkg_utils import create_pkg_specs, parse_pkg_list
+
+    if offline:
+        from kiara_plugin.develop.utils.pypi import set_pypi_metadata_backend
+
+        set_pypi_metadata_backend("index", pkg_index_path=index_db)
+
+    items = parse_pkg_list(pkgs)
+    if pkgs_file:
+        items.extend(
+            parse_pkg_list(
+                read_pkg_list_file(pkgs_file),
+                base_dir=os.path.dirname(os.path.abspath(pkgs_file)),
+            )
+        )
+
+    if not items and not spec_files:
+        terminal_print()
+        terminal_print("No packages specified, doing nothing...")
+        sys.exit(1)
+
+    specs: List[PkgSpec] = [PkgSpec(**get_data_from_file(f)) for f in spec_files]
+    all_pkgs = []
+    for pkg, version, patch_file in items:
+        patch_data = get_data_from_file(patch_file) if patch_file else None
+        all_pkgs.append((pkg, version, patch_data))
+
+    for pkg, result in create_pkg_specs(all_pkgs).items():
+        if not isinstance(result, PkgSpec):
+            terminal_print()
+            terminal_print(f"Can't create spec for package '{pkg}': {result}")
+            sys.exit(1)
+        specs.append(result)
+
+    channel = LocalChannel(channel_folder) if channel_folder else LocalChannel()
+    rattler_mgmt: RattlerBuildEnvMgmt = RattlerBuildEnvMgmt()
+
+    def _build(pkg_spec: PkgSpec):
+        return rattler_mgmt.build_package(
+            pkg_spec,
+            output_folder=output_folder,
+            show_output=False,
+            rebuild=rebuild,
+            local_channel=channel,
+            use_local_channel=True,
+        )
+
+    def _on_event(pkg_name: str, event: str, msg: Union[None, str]):
+        color = {"finished": "green", "failed": "red", "skipped": "yellow"}.get(event, "")
+        line = f"  - {pkg_name}: [{color}]{event}[/{color}]" if color else f"  - {pkg_name}: {event}"
+        terminal_print(f"{line} ({msg})" if msg else line)
+
+    terminal_print()
+    terminal_print(f"Building {len(specs)} package(s), using local channel: {channel.path}")
+    scheduler = BuildScheduler(
+        _build, channel=channel, max_workers=workers, on_event=_on_event
+    )
+    results = scheduler.build(specs)
+    # once all builds are finished, so no package that is still in use is removed
+    prune_package_cache()
+
+    terminal_print()
+    failed = False
+    for pkg_name, build_result in results.items():
+        if isinstance(build_result, Exception):
+            failed = True
+            terminal_print(f"  - [red]{pkg_name}[/red]: {build_result}")
+        else:
+            terminal_print(
+                f"  - [green]{pkg_name}[/green]: {', '.join(build_result.build_artifacts)}"
+            )
+
+    if failed:
+        sys.exit(1)
+
+
 @conda.command("publish")
 @click.argument("artifact_or_folder", nargs=-1, required=True)
 @click.option(
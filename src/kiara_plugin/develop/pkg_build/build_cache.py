@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""A cache for package builds, keyed by the fingerprint of all build inputs."""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Iterable, Union
+
+import structlog
+
+from kiara_plugin.develop.defaults import KIARA_DEV_BUILD_CACHE_FOLDER
+from kiara_plugin.develop.pkg_build.models import PkgSpec, RattlerBuildPackageDetails
+
+logger = structlog.getLogger()
+
+# folders in the root of local projects that don't affect the build result
+IGNORED_PROJECT_FOLDERS = {"build", "dist", "node_modules", "site"}
+BUILD_DETAILS_FILE = "details.json"
+
+
+def create_tree_hash(path: Union[str, Path]) -> str:
+    """Hash the paths and contents of all files in a (local project) folder.
+
+    Hidden files and folders (incl. '.git'), as well as '__pycache__' folders are
+    ignored. Build output folders are only ignored at the root of the project, a
+    (source) package called e.g. 'build' further down is part of the hash.
+    """
+
+    root = Path(path)
+    sha = hashlib.sha256()
+    for folder, dirs, files in os.walk(root):
+        dirs[:] = sorted(
+            d
+            for d in dirs
+            if not d.startswith(".")
+            and d != "__pycache__"
+            and not d.endswith(".egg-info")
+            and not (folder == str(root) and d in IGNORED_PROJECT_FOLDERS)
+        )
+        for file_name in sorted(files):
+            if file_name.startswith("."):
+                continue
+            file_path = Path(folder) / file_name
+            sha.update(file_path.relative_to(root).as_posix().encode())
+            sha.update(b"\0")
+            with open(file_path, "rb") as f:
+                while chunk := f.read(1024 * 1024):
+                    sha.update(chunk)
+            sha.update(b"\0")
+    return sha.hexdigest()
+
+
+def create_build_fingerprint(
+    package: PkgSpec,
+    recipe: str,
+    build_tool_version: str,
+    channels: Iterable[str],
+    python_version: str,
+    package_formats: Iterable[str],
+) -> str:
+    """Create a key for all the inputs of a build, if they are unchanged, so is the build result."""
+
+    if package.pkg_is_local:
+        source_hash: Union[None, str] = create_tree_hash(package.pkg_url)
+    else:
+        # for git sources, the url and revision are part of the recipe
+        source_hash = package.pkg_hash
+
+    data = {
+        "recipe": recipe,
+        "source_hash": source_hash,
+        "build_tool_version": build_tool_version,
+        "channels": list(channels),
+        "python_version": python_version,
+        "package_formats": list(package_formats),
+    }
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+
+class BuildCache(object):
+    """Stores build artifacts, and the details of the build that created them, per build fingerprint."""
+
+    def __init__(self, root: Union[str, Path] = KIARA_DEV_BUILD_CACHE_FOLDER) -> None:
+
+        self._root: Path = Path(os.path.expanduser(root))
+
+    @property
+    def root(self) -> Path:
+        return self._root
+
+    def get(self, fingerprint: str) -> Union[None, RattlerBuildPackageDetails]:
+        """Return the details of a cached build, or 'None' if there is none.
+
+        A build whose artifacts, build folder or recipe file are gone (e.g. the build
+        folder was wiped by a later build of the same version) counts as a miss.
+        """
+
+        details_file = self._root / fingerprint / BUILD_DETAILS_FILE
+        try:
+            details = RattlerBuildPackageDetails.model_validate_json(
+                details_file.read_text()
+            )
+        except Exception:
+            return None
+
+        if not all(Path(a).is_file() for a in details.build_artifacts):
+            return None
+        if not (Path(details.base_dir).is_dir() and Path(details.meta_file).is_file()):
+            logger.debug("build_cache.stale", fingerprint=fingerprint)
+            return None
+        return details
+
+    def store(
+        self, fingerprint: str, details: RattlerBuildPackageDetails
+    ) -> RattlerBuildPackageDetails:
+        """Copy the artifacts of a build into the cache, and return the details that point to the copies."""
+
+        self._root.mkdir(parents=True, exist_ok=True)
+        target = self._root / fingerprint
+        temp_dir = Path(tempfile.mkdtemp(dir=self._root, prefix=f".{fingerprint}."))
+        try:
+            artifacts = []
+            for artifact in details.build_artifacts:
+                shutil.copy2(artifact, temp_dir)
+                artifacts.append((target / Path(artifact).name).as_posix())
+
+            cached = details.model_copy(
+                update={"build_artifacts": artifacts, "build_fingerprint": fingerprint}
+            )
+            (temp_dir / BUILD_DETAILS_FILE).write_text(cached.model_dump_json(indent=2))
+
+            if target.exists():
+                shutil.rmtree(target)
+            os.replace(temp_dir, target)
+        except Exception:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            raise
+
+        logger.debug("build_cache.stored", fingerprint=fingerprint, artifacts=artifacts)
+        return cached
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""A local (file-based) conda channel, for packages built by this plugin."""
+import hashlib
+import json
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Union
+
+import structlog
+
+from kiara_plugin.develop.defaults import KIARA_DEV_LOCAL_CHANNEL_FOLDER
+from kiara_plugin.develop.utils import lock_file, write_file_atomic
+from kiara_plugin.develop.utils.conda_package import (
+    CONDA_PACKAGE_EXTENSIONS,
+    get_package_format,
+    read_package_file,
+)
+
+logger = structlog.getLogger()
+
+# conda clients expect a 'noarch' subdir in every channel
+DEFAULT_SUBDIRS = ["noarch"]
+
+
+def create_repodata_record(path: Union[str, Path]) -> Dict[str, Any]:
+    """Create the repodata entry for a package, from its 'info/index.json' file and its checksums."""
+
+    path = Path(path)
+    record: Dict[str, Any] = json.loads(read_package_file(path, "info/index.json"))
+
+    md5 = hashlib.md5(usedforsecurity=False)
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            md5.update(chunk)
+            sha256.update(chunk)
+    record["md5"] = md5.hexdigest()
+    record["sha256"] = sha256.hexdigest()
+    record["size"] = path.stat().st_size
+    return record
+
+
+class LocalChannel(object):
+    """A conda channel in a local folder, that packages can be added to while builds are running.
+
+    Packages are copied into their subdir, and the subdir's 'repodata.json' is
+    updated incrementally, and replaced atomically, so concurrent builds that use the
+    channel never see a partially written index.
+    """
+
+    def __init__(self, path: Union[str, Path] = KIARA_DEV_LOCAL_CHANNEL_FOLDER) -> None:
+
+        self._path: Path = Path(os.path.expanduser(path)).absolute()
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    @property
+    def url(self) -> str:
+        return self._path.as_uri()
+
+    def ensure_index(self) -> None:
+        """Make sure the channel can be used, even if it doesn't contain any packages yet."""
+
+        with self._locked():
+            self._ensure_index()
+
+    def _ensure_index(self) -> None:
+
+        for subdir in DEFAULT_SUBDIRS:
+            repodata_file = self._path / subdir / "repodata.json"
+            if not repodata_file.exists():
+                self._write_repodata(subdir, self._create_repodata(subdir))
+
+    def _create_repodata(self, subdir: str) -> Dict[str, Any]:
+
+        return {
+            "info": {"subdir": subdir},
+            "packages": {},
+            "packages.conda": {},
+            "removed": [],
+            "repodata_version": 1,
+        }
+
+    def _write_repodata(self, subdir: str, repodata: Dict[str, Any]) -> None:
+
+        write_file_atomic(
+            self._path / subdir / "repodata.json",
+            json.dumps(repodata, indent=2, sort_keys=True),
+        )
+
+    def index(self, subdir: str) -> Dict[str, Any]:
+        """(Re-)create the 'repodata.json' of a subdir, from all packages it contains."""
+
+        repodata = self._create_repodata(subdir)
+        folder = self._path / subdir
+        if folder.is_dir():
+            for f in sorted(folder.iterdir()):
+                if not f.name.endswith(tuple(CONDA_PACKAGE_EXTENSIONS.values())):
+                    continue
+                key = "packages.conda" if get_package_format(f) == "conda" else "packages"
+                repodata[key][f.name] = create_repodata_record(f)
+        self._write_repodata(subdir, repodata)
+        return repodata
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """Serialize index updates, between threads and (where supported) processes."""
+
+        with self._lock, lock_file(self._path / ".lock"):
+            yield
+
+    def _read_repodata(self, subdir: str) -> Union[None, Dict[str, Any]]:
+
+        try:
+            with open(self._path / subdir / "repodata.json", "rb") as f:
+                data: Dict[str, Any] = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return data
+
+    def add_packages(self, artifacts: Iterable[Union[str, Path]]) -> List[Path]:
+        """Copy packages into the channel, and update the index of their subdir(s).
+
+        Only the new packages are read, their records are merged into the existing
+        'repodata.json'. Packages that are already in the channel (with the same
+        checksum) are not copied again.
+        """
+
+        result = []
+        with self._locked():
+            self._ensure_index()
+            repodatas: Dict[str, Union[None, Dict[str, Any]]] = {}
+            for artifact in artifacts:
+                record = create_repodata_record(artifact)
+                subdir = record.get("subdir", "noarch")
+                target = self._path / subdir / Path(artifact).name
+                key = "packages.conda" if get_package_format(target) == "conda" else "packages"
+
+                if subdir not in repodatas.keys():
+                    repodatas[subdir] = self._read_repodata(subdir)
+                repodata = repodatas[subdir]
+                existing = repodata.get(key, {}).get(target.name) if repodata else None
+                if not (
+                    target.is_file()
+                    and existing is not None
+                    and existing.get("sha256") == record["sha256"]
+                ):
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    shutil.copy2(artifact, target)
+                if repodata is not None:
+                    repodata.setdefault(key, {})[target.name] = record
+                result.append(target)
+
+            for subdir, repodata in repodatas.items():
+                if repodata is None:
+                    # the new packages are already in place, so they are picked up here
+                    self.index(subdir)
+                else:
+                    self._write_repodata(subdir, repodata)
+
+        logger.debug("channel.packages_added", channel=self.url, packages=[p.name for p in result])
+        return result
+
+
+_LOCAL_CHANNEL: Union[None, LocalChannel] = None
+
+
+def get_local_channel() -> LocalChannel:
+
+    global _LOCAL_CHANNEL
+    if _LOCAL_CHANNEL is None:
+        _LOCAL_CHANNEL = LocalChannel()
+    return _LOCAL_CHANNEL
@@ -6,8 +6,6 @@ import subprocess
 from pathlib import Path
 from typing import Any, List, Union
 
-from diskcache import Cache
-
 from kiara.utils.cli import terminal_print
 from kiara_plugin.develop.defaults import (
     DEFAULT_PYTHON_VERSION,
@@ -23,10 +21,11 @@ from kiara_plugin.develop.pkg_build.models import (
     CondaBuildPackageDetails,
     PkgSpec,
 )
-from kiara_plugin.develop.pkg_build.states import States
-
-CACHE_DIR = os.path.join(KIARA_DEV_CACHE_FOLDER, "pypi_cache")
-cache = Cache(CACHE_DIR)
+from kiara_plugin.develop.pkg_build.states import States, StatesResolution
+from kiara_plugin.develop.utils.package_cache import (
+    get_package_cache_env,
+    package_cache_in_use,
+)
 
 
 class CondaEnvMgmt(object):
@@ -70,6 +69,15 @@ class CondaEnvMgmt(object):
     def get_state(self, state_id: str):
         return self._states.get_state(state_id)
 
+    def prepare_environments(self, parallel: int = 2) -> StatesResolution:
+        """Make sure micromamba and all environments exist, creating independent environments concurrently.
+
+        Already resolved states are not resolved again, so this is cheap to call
+        before every operation that needs one of the environments.
+        """
+
+        return self._states.resolve_all(parallel=parallel)
+
     def list_conda_envs(self) -> List[str]:
 
         micromamba_path = self.get_state_detail(
@@ -98,11 +106,10 @@ class CondaEnvMgmt(object):
     ) -> CondaBuildPackageDetails:
 
         from kiara_plugin.develop.utils import execute
-        from kiara_plugin.develop.utils.pkg_utils import (
-            default_stderr_print,
-            default_stdout_print,
-        )
+        from kiara_plugin.develop.utils.output_renderer import OutputRenderer
+        from kiara_plugin.develop.utils.source_cache import get_source_cache
 
+        self.prepare_environments()
         build_env_details = self.get_state_details("conda-build-env")
         env_name = build_env_details["env_name"]
         prefix = build_env_details["mamba_prefix"]
@@ -124,7 +131,8 @@ class CondaEnvMgmt(object):
         build_dir.mkdir(parents=True, exist_ok=False)
 
         meta_file = Path(base_dir) / "meta.yaml"
-        recipe = package.create_conda_spec()
+        source_url = get_source_cache().get_source_url(package)
+        recipe = package.create_conda_spec(source_url=source_url)
         with open(meta_file, "wt") as f:
             f.write(recipe)
 
@@ -138,12 +146,18 @@ class CondaEnvMgmt(object):
         args.extend(channels)
         args.extend(["--output-folder", build_dir.as_posix(), base_dir])
 
-        result = execute(
-            conda_bin,
-            *args,
-            stdout_callback=default_stdout_print,
-            stderr_callback=default_stderr_print,
-        )
+        with package_cache_in_use(), OutputRenderer(
+            title=f"Building '{package.pkg_name}' ({package.pkg_version})"
+        ) as renderer:
+            result = execute(
+                conda_bin,
+                *args,
+                stdout_callback=renderer.stdout,
+                stderr_callback=renderer.stderr,
+                log_dir=os.path.join(base_dir, "logs"),
+                log_name="conda-build",
+                env_vars=get_package_cache_env(),
+            )
 
         artifact = os.path.join(
             build_dir,
@@ -158,6 +172,10 @@ class CondaEnvMgmt(object):
             args=args[1:],
             stdout=result.stdout,
             stderr=result.stderr,
+            stdout_file=result.stdout_file,
+            stderr_file=result.stderr_file,
+            truncated=result.truncated,
+            resource_usage=result.resource_usage,
             exit_code=result.exit_code,
             base_dir=base_dir,
             build_dir=build_dir.as_posix(),
@@ -175,7 +193,7 @@ class CondaEnvMgmt(object):
     ):
 
         from kiara_plugin.develop.utils import execute
-        from kiara_plugin.develop.utils.pkg_utils import (
+        from kiara_plugin.develop.utils.output_renderer import (
             default_stderr_print,
             default_stdout_print,
         )
@@ -188,6 +206,7 @@ class CondaEnvMgmt(object):
         else:
             artifact = build_result.build_artifact
 
+        self.prepare_environments()
         build_env_details = self.get_state_details("conda-build-env")
         env_name = build_env_details["env_name"]
         prefix = build_env_details["mamba_prefix"]
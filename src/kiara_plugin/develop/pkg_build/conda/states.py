@@ -1,22 +1,53 @@
 # -*- coding: utf-8 -*-
-import io
+import hashlib
 import json
 import os
 import platform
+import re
 import shutil
 import subprocess
-import tarfile
-import tempfile
-import urllib
 from pathlib import Path
 from typing import Any, Dict, List, Mapping, Union
 
+import structlog
+
 from kiara.utils.cli import terminal_print
 from kiara_plugin.develop.defaults import KIARA_DEV_MICROMAMBA_TARGET_PREFIX
-from kiara_plugin.develop.pkg_build.states import State
+from kiara_plugin.develop.pkg_build.states import State, create_file_fingerprint
+from kiara_plugin.develop.utils import write_file_atomic
+from kiara_plugin.develop.utils.downloads import download_file, extract_tar_member
+from kiara_plugin.develop.utils.package_cache import (
+    get_package_cache_env,
+    package_cache_in_use,
+)
+
+logger = structlog.getLogger()
+
+# the sha256 digests of the release archives, per version and platform token, a
+# 'sha256' config value takes precedence (e.g. for other versions)
+MICROMAMBA_SHA256: Dict[str, Dict[str, str]] = {
+    "1.4.6": {},
+}
+
+# the file (in an environment prefix) that records the spec the environment was created from
+ENV_SPEC_FILE = os.path.join("conda-meta", "kiara-dev-spec.json")
+
+DEPENDENCY_NAME = re.compile(r"^(?:[^:\s]+::)?([A-Za-z0-9_.\-]+)")
+
+
+def get_dependency_name(dependency: str) -> str:
+    """Return the package name of a conda match spec, e.g. 'python' for 'python==3.9'."""
+
+    match = DEPENDENCY_NAME.match(dependency.strip())
+    if match is None:
+        raise Exception(f"Invalid dependency: {dependency}")
+    return match.group(1).lower()
 
 
 class MicroMambaAvailable(State):
+    def fingerprint(self, details: Mapping[str, Any]) -> Union[None, str]:
+        return create_file_fingerprint(details["micromamba_bin"])
+
     def _check(self) -> Union[None, Mapping[str, Any]]:
 
         root_path: str = self.get_config("root_path")
@@ -72,18 +103,24 @@ class MicroMambaAvailable(State):
 
         url = f"https://micro.mamba.pm/api/micromamba/{token}/{version}"
 
-        root_path: Path = self.get_config("root_path")
-        # bin_path = root_path / "bin" / "micromamba"
-        # bin_path.parent.mkdir(parents=True, exist_ok=True)
-        terminal_print("Downloading micromamba...")
+        root_path: str = self.get_config("root_path")
+        try:
+            sha256 = self.get_config("sha256")
+        except Exception:
+            sha256 = None
+        if not sha256:
+            sha256 = MICROMAMBA_SHA256.get(version, {}).get(token, None)
+        if not sha256:
+            logger.warning("download.unverified", url=url, reason="no pinned sha256")
 
-        fh = io.BytesIO()
-        with urllib.request.urlopen(url) as response:  # type: ignore  # noqa
-            fh.write(response.read())
+        terminal_print("Downloading micromamba...")
 
-        fh.seek(0)
-        tar_archive = tarfile.open(fileobj=fh, mode="r:bz2")
-        tar_archive.extract("bin/micromamba", root_path)
+        archive = Path(root_path) / "downloads" / f"micromamba-{token}-{version}.tar.bz2"
+        download_file(url, archive, sha256=sha256)
+        extract_tar_member(
+            archive, "bin/micromamba", os.path.join(root_path, "bin", "micromamba")
+        )
+        os.unlink(archive)
 
         current = self._check()
         if current is not None:
@@ -93,41 +130,63 @@ class MicroMambaAvailable(State):
 
 
 class MambaEnvironment(State):
-    def list_conda_envs(self) -> List[str]:
 
-        micromamba_path = self.get_other_state_detail(
-            "micromamba_available", "micromamba_bin"
-        )
-        micromamba_prefix = self.get_config("mamba_prefix")
+    DEFAULT_DEPENDENCIES = ("micromamba_available",)
 
-        args = [micromamba_path, "env", "list", "--json"]
-        result = subprocess.run(
-            args, capture_output=True, text=True, check=True, shell=False
+    def fingerprint(self, details: Mapping[str, Any]) -> Union[None, str]:
+        # every transaction in an environment is appended to its history file
+        return create_file_fingerprint(
+            os.path.join(details["env_path"], "conda-meta", "history")
         )
 
-        envs = json.loads(result.stdout)
-        return [
-            x[len(micromamba_prefix) + 1 :]
-            for x in envs["envs"]
-            if x.startswith(micromamba_prefix)
-        ]
-
-    def _check(self) -> Union[None, Mapping[str, Any]]:
+    @property
+    def env_path(self) -> str:
 
         env_name: str = self.get_config("env_name")
         if not env_name:
             raise Exception("Environment 'name' can't be empty.")
+        return os.path.join(self.get_config("mamba_prefix"), env_name)
+
+    def create_spec(self) -> Dict[str, Any]:
+        """Return the environment spec, and its hash, as stored in the environment prefix."""
+
+        channels: List[str] = list(self.get_config("channels"))
+        # the order of dependencies doesn't matter, the order of channels does
+        dependencies: List[str] = sorted(set(self.get_config("dependencies")))
+        spec_str = json.dumps({"channels": channels, "dependencies": dependencies})
+        return {
+            "spec_hash": hashlib.sha256(spec_str.encode()).hexdigest(),
+            "channels": channels,
+            "dependencies": dependencies,
+        }
 
-        if env_name in self.list_conda_envs():
-            micromamba_prefix = self.get_config("mamba_prefix")
-            return {
-                "env_name": env_name,
-                "env_path": os.path.join(micromamba_prefix, env_name),
-                "mamba_prefix": self.get_config("mamba_prefix"),
-            }
-        else:
+    def read_installed_spec(self) -> Union[None, Dict[str, Any]]:
+        """Return the spec the environment was last created/updated with, if any."""
+
+        try:
+            with open(os.path.join(self.env_path, ENV_SPEC_FILE), "rt") as f:
+                spec: Dict[str, Any] = json.load(f)
+            return spec
+        except (OSError, ValueError):
+            return None
+
+    def _check(self) -> Union[None, Mapping[str, Any]]:
+
+        # a direct filesystem check, instead of listing all environments
+        env_path = self.env_path
+        if not os.path.isdir(os.path.join(env_path, "conda-meta")):
+            return None
+
+        installed = self.read_installed_spec()
+        if installed is None or installed.get("spec_hash") != self.create_spec()["spec_hash"]:
             return None
 
+        return {
+            "env_name": self.get_config("env_name"),
+            "env_path": env_path,
+            "mamba_prefix": self.get_config("mamba_prefix"),
+        }
+
     def _purge(self):
 
         micromamba_prefix = self.get_config("mamba_prefix")
@@ -141,62 +200,81 @@ class MambaEnvironment(State):
 
         shutil.rmtree(micromamba_prefix)
 
-    def _resolve(self) -> Mapping[str, Any]:
-
-        check = self._check()
-        if check is not None:
-            return check
+    def _run_micromamba(self, *args: str) -> None:
 
-        micromamba_prefix = self.get_config("mamba_prefix")
         micromamba_path = self.get_other_state_detail(
             "micromamba_available", "micromamba_bin"
         )
-
         env_name = self.get_config("env_name")
-        channels = self.get_config("channels")
-        dependencies = self.get_config("dependencies")
-
-        channels_str = "\n".join((f"  - {c}" for c in channels))
-        dependencies_str = "\n".join((f"  - {d}" for d in dependencies))
-
-        spec_content = f"""name: {env_name}
-channels:
-{channels_str}
-dependencies:
-{dependencies_str}
-"""
-        handle, filename = tempfile.mkstemp(text=True, suffix=".yaml")
-        with os.fdopen(handle, "wt") as f:
-            f.write(spec_content)
-
-        terminal_print(
-            f"Creating conda environment '{env_name}'. This will take a while..."
-        )
-
-        args = [
-            micromamba_path,
-            "create",
-            "--yes",
-            "--json",
-            "-p",
-            os.path.join(micromamba_prefix, env_name),
-            "-f",
-            filename,
-        ]
-        result = subprocess.run(args, capture_output=True, text=True, shell=False, check=False)
-
-        if filename is not None:
-            os.unlink(filename)
+        cmd = [micromamba_path, *args, "--yes", "--json", "-p", self.env_path]
+        with package_cache_in_use():
+            result = subprocess.run(
+                cmd,
+                capture_output=True,
+                text=True,
+                shell=False,
+                check=False,
+                env={**os.environ, **get_package_cache_env()},
+            )
 
         if result.returncode != 0:
-            print(f"Error creating environment '{env_name}':")
+            print(f"Error running 'micromamba {args[0]}' for environment '{env_name}':")
             print("stdout:")
             print(result.stdout)
             print("stderr:")
             print(result.stderr)
-            raise Exception(f"Error creating environment '{env_name}'.")
+            raise Exception(f"Error running 'micromamba {args[0]}' for environment '{env_name}'.")
+
+    def _resolve(self) -> Mapping[str, Any]:
+
+        check = self._check()
+        if check is not None:
+            return check
 
-        # env_details = json.loads(result.stdout)
+        env_name = self.get_config("env_name")
+        env_path = self.env_path
+        spec = self.create_spec()
+        channel_args = [x for c in spec["channels"] for x in ("-c", c)]
+
+        installed: Union[None, Dict[str, Any]] = None
+        if os.path.isdir(os.path.join(env_path, "conda-meta")):
+            installed = self.read_installed_spec()
+            if installed is not None and installed.get("channels") != spec["channels"]:
+                # packages might come from a different channel now, so start over
+                terminal_print(f"Channels of conda environment '{env_name}' changed, re-creating it...")
+                shutil.rmtree(env_path)
+                installed = None
+            elif installed is None:
+                # unknown state (e.g. created by an older version), let the solver sort it out
+                installed = {"dependencies": []}
+
+        if installed is None:
+            terminal_print(
+                f"Creating conda environment '{env_name}'. This will take a while..."
+            )
+            self._run_micromamba("create", *channel_args, *spec["dependencies"])
+        else:
+            current_deps = set(installed["dependencies"])
+            to_install = [d for d in spec["dependencies"] if d not in current_deps]
+            new_names = {get_dependency_name(d) for d in spec["dependencies"]}
+            to_remove = sorted(
+                {
+                    get_dependency_name(d)
+                    for d in current_deps
+                    if get_dependency_name(d) not in new_names
+                }
+            )
+            terminal_print(
+                f"Updating conda environment '{env_name}' (install: {', '.join(to_install) or '-'}, remove: {', '.join(to_remove) or '-'})..."
+            )
+            if to_remove:
+                self._run_micromamba("remove", *to_remove)
+            if to_install:
+                self._run_micromamba("install", *channel_args, *to_install)
+
+        write_file_atomic(
+            os.path.join(env_path, ENV_SPEC_FILE), json.dumps(spec, indent=2)
+        )
 
         check = self._check()
         if check is not None:
@@ -1,6 +1,9 @@
 # -*- coding: utf-8 -*-
+import mmap
 import os
-from typing import Any, Dict, List, Union
+import re
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Tuple, Union
 
 from jinja2 import Environment, FileSystemLoader, select_autoescape
 from pydantic import BaseModel, ConfigDict, Extra, Field, PrivateAttr, model_validator
@@ -164,26 +167,158 @@ class PkgSpec(BaseModel):
         result: str = template.render(pkg_info=self)
         return result
 
-    def create_conda_spec(self) -> str:
+    def create_conda_spec(self, source_url: Union[str, None] = None) -> str:
 
         template = self.jinja_environment().get_template("meta.yaml.j2")
-        result: str = template.render(pkg_info=self)
+        result: str = template.render(pkg_info=self, source_url=source_url)
         return result
 
-    def create_rattler_build_recipe(self) -> str:
+    def create_rattler_build_recipe(self, source_url: Union[str, None] = None) -> str:
+        """Render the rattler-build recipe, optionally with a (local) url to the source archive."""
 
         template = self.jinja_environment().get_template("rattler-build-recipe.yaml.j2")
-        result: str = template.render(pkg_info=self)
+        result: str = template.render(pkg_info=self, source_url=source_url)
         return result
 
 
+class ResourceUsage(BaseModel):
+
+    wall_time: float = Field(description="The wall clock time (in seconds).")
+    user_time: Union[float, None] = Field(
+        description="The user CPU time (in seconds).", default=None
+    )
+    system_time: Union[float, None] = Field(
+        description="The system CPU time (in seconds).", default=None
+    )
+    max_rss: Union[int, None] = Field(
+        description="The maximum resident set size (in bytes).", default=None
+    )
+    read_bytes: Union[int, None] = Field(
+        description="The number of bytes read from storage.", default=None
+    )
+    write_bytes: Union[int, None] = Field(
+        description="The number of bytes written to storage.", default=None
+    )
+    read_chars: Union[int, None] = Field(
+        description="The number of bytes read via syscalls (incl. pipes and page cache).",
+        default=None,
+    )
+    write_chars: Union[int, None] = Field(
+        description="The number of bytes written via syscalls (incl. pipes and page cache).",
+        default=None,
+    )
+
+    @classmethod
+    def aggregate(cls, usages: Iterable["ResourceUsage"]) -> "ResourceUsage":
+        """Sum up the usage of several (sequential) processes, 'max_rss' is the maximum."""
+
+        def _sum(values: List[Any]) -> Any:
+            values = [v for v in values if v is not None]
+            return sum(values) if values else None
+
+        _usages = list(usages)
+        max_rss = [u.max_rss for u in _usages if u.max_rss is not None]
+        return cls(
+            wall_time=sum(u.wall_time for u in _usages),
+            user_time=_sum([u.user_time for u in _usages]),
+            system_time=_sum([u.system_time for u in _usages]),
+            max_rss=max(max_rss) if max_rss else None,
+            read_bytes=_sum([u.read_bytes for u in _usages]),
+            write_bytes=_sum([u.write_bytes for u in _usages]),
+            read_chars=_sum([u.read_chars for u in _usages]),
+            write_chars=_sum([u.write_chars for u in _usages]),
+        )
+
+
 class RunDetails(BaseModel):
 
     cmd: str = Field(description="The command that was run.")
     args: List[str] = Field(description="The arguments to the command.")
     exit_code: int = Field(description="The command exit code.")
-    stdout: str = Field(description="The command output.")
-    stderr: str = Field(description="THe command error output.")
+    stdout: str = Field(
+        description="The command output (only the last part, if 'truncated')."
+    )
+    stderr: str = Field(
+        description="THe command error output (only the last part, if 'truncated')."
+    )
+    stdout_file: Union[str, None] = Field(
+        description="The path to the file that contains the full command output.",
+        default=None,
+    )
+    stderr_file: Union[str, None] = Field(
+        description="The path to the file that contains the full command error output.",
+        default=None,
+    )
+    truncated: bool = Field(
+        description="Whether 'stdout'/'stderr' only contain the last part of the output.",
+        default=False,
+    )
+    resource_usage: Union[ResourceUsage, None] = Field(
+        description="The resources the process used.", default=None
+    )
+
+    def _get_stream(self, stream: str) -> Tuple[str, Union[str, None]]:
+
+        if stream == "stdout":
+            return self.stdout, self.stdout_file
+        elif stream == "stderr":
+            return self.stderr, self.stderr_file
+        else:
+            raise Exception(f"Invalid stream '{stream}', must be 'stdout' or 'stderr'.")
+
+    @contextmanager
+    def open_output(self, stream: str = "stdout") -> Iterator[Union[bytes, mmap.mmap]]:
+        """Provide the full output of a stream as a read-only (memory-mapped, if logged) buffer."""
+
+        text, log_file = self._get_stream(stream)
+        if log_file is None or os.path.getsize(log_file) == 0:
+            yield text.encode("utf-8")
+            return
+
+        with open(log_file, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                yield mm
+
+    def read_output(self, stream: str = "stdout") -> str:
+        """Return the full output of a stream."""
+
+        text, log_file = self._get_stream(stream)
+        if log_file is None:
+            return text
+        with self.open_output(stream) as buffer:
+            return buffer[:].decode("utf-8").removesuffix("\n")
+
+    def tail(self, lines: int = 20, stream: str = "stdout") -> List[str]:
+        """Return the last lines of a stream."""
+
+        text, log_file = self._get_stream(stream)
+        in_memory = text.split("\n") if text else []
+        if len(in_memory) >= lines or log_file is None:
+            return in_memory[-lines:]
+
+        with self.open_output(stream) as buffer:
+            end = len(buffer)
+            if end and buffer[end - 1 : end] == b"\n":
+                end = end - 1
+            start = end
+            for _ in range(lines):
+                start = buffer.rfind(b"\n", 0, start)
+                if start == -1:
+                    break
+            return buffer[start + 1 : end].decode("utf-8").split("\n")
+
+    def grep(
+        self, pattern: Union[str, "re.Pattern"], stream: str = "stdout"
+    ) -> List[str]:
+        """Return all lines of a stream that match a regular expression."""
+
+        regex = re.compile(pattern) if isinstance(pattern, str) else pattern
+        text, log_file = self._get_stream(stream)
+        if log_file is None:
+            return [line for line in text.split("\n") if regex.search(line)]
+
+        with open(log_file, "rt", encoding="utf-8") as f:
+            return [line.rstrip("\n") for line in f if regex.search(line)]
 
 
 class CondaBuildPackageDetails(RunDetails):
@@ -194,6 +329,16 @@ class CondaBuildPackageDetails(RunDetails):
     package: PkgSpec = Field(description="Package metadata.")
     build_artifact: str = Field(description="Path to the package build artifact.")
 
+class BuildPhase(BaseModel):
+
+    name: str = Field(description="The name of the phase.")
+    run: Union[str, None] = Field(
+        description="The run (e.g. package format) this phase belongs to.", default=None
+    )
+    started: float = Field(description="The start time of the phase (epoch seconds).")
+    duration: float = Field(description="The duration of the phase (in seconds).")
+
+
 class RattlerBuildPackageDetails(BaseModel):
 
     run_details: List[RunDetails] = Field(description="The run details.")
@@ -202,3 +347,17 @@ class RattlerBuildPackageDetails(BaseModel):
     meta_file: str = Field(description="The path to the package meta file.")
     package: PkgSpec = Field(description="Package metadata.")
     build_artifacts: List[str] = Field(description="Path to the package build artifacts.")
+    resource_usage: Union[ResourceUsage, None] = Field(
+        description="The aggregated resource usage of all runs.", default=None
+    )
+    phases: List[BuildPhase] = Field(
+        description="The build phases of all runs, with their durations.",
+        default_factory=list,
+    )
+    build_fingerprint: Union[str, None] = Field(
+        description="The fingerprint of all inputs of the build.", default=None
+    )
+    from_cache: bool = Field(
+        description="Whether the artifacts were taken from the build cache, instead of being built.",
+        default=False,
+    )
@@ -1,37 +1,78 @@
 # -*- coding: utf-8 -*-
+import json
 import os
 import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from pathlib import Path
-from typing import List, Union
+from typing import Any, ContextManager, List, Union
 
-from diskcache import Cache
+import structlog
 
 from kiara.utils.cli import terminal_print
 from kiara_plugin.develop.defaults import (
     DEFAULT_PYTHON_VERSION,
     KIARA_DEV_CACHE_FOLDER,
 )
+from kiara_plugin.develop.pkg_build.build_cache import (
+    BuildCache,
+    create_build_fingerprint,
+)
+from kiara_plugin.develop.pkg_build.channel import LocalChannel, get_local_channel
 from kiara_plugin.develop.pkg_build.models import (
+    BuildPhase,
     PkgSpec,
     RattlerBuildPackageDetails,
+    ResourceUsage,
     RunDetails,
 )
+from kiara_plugin.develop.pkg_build.rattler.log_parser import RattlerBuildLogParser
 from kiara_plugin.develop.pkg_build.rattler.states import RattlerBuildAvailable
 from kiara_plugin.develop.pkg_build.states import States
 from kiara_plugin.develop.utils import execute
+from kiara_plugin.develop.utils.conda_package import (
+    CONDA_PACKAGE_EXTENSIONS,
+    transcode_package,
+    zstandard_available,
+)
+from kiara_plugin.develop.utils.output_renderer import (
+    OutputRenderer,
+    default_stderr_print,
+    default_stdout_print,
+)
+from kiara_plugin.develop.utils.package_cache import (
+    get_package_cache_env,
+    mark_packages_used,
+    package_cache_in_use,
+)
+from kiara_plugin.develop.utils.source_cache import get_source_cache
 
-CACHE_DIR = os.path.join(KIARA_DEV_CACHE_FOLDER, "pypi_cache")
-cache = Cache(CACHE_DIR)
+logger = structlog.getLogger()
 
+RATTLER_BUILD_VERSION = "0.15.0"
 
-def default_stdout_print(msg):
-    terminal_print(f"[green]stdout[/green]: {msg}")
 
+def get_resolved_packages(rendered: Any) -> List[str]:
+    """Return the resolved packages (as '<name>-<version>-<build>') in the (json) output of 'rattler-build build --render-only --with-solve'."""
 
-def default_stderr_print(msg):
-    terminal_print(f"[red]stderr[/red]: {msg}")
+    result = []
+    pending = [rendered]
+    while pending:
+        item = pending.pop()
+        if isinstance(item, list):
+            pending.extend(item)
+        elif isinstance(item, dict):
+            for record in item.get("resolved", None) or []:
+                if isinstance(record, dict) and all(
+                    k in record.keys() for k in ("name", "version", "build")
+                ):
+                    result.append(
+                        f"{record['name']}-{record['version']}-{record['build']}"
+                    )
+            pending.extend(v for k, v in item.items() if k != "resolved")
+    return result
 
-RATTLER_BUILD_VERSION = "0.15.0"
 
 class RattlerBuildEnvMgmt(object):
     def __init__(self) -> None:
@@ -47,8 +88,76 @@ class RattlerBuildEnvMgmt(object):
         return self._states.get_state_details(state_id)
 
     def build_package(
-        self, package: PkgSpec, python_version=DEFAULT_PYTHON_VERSION, package_formats: Union[str, List[str]] = ["tarbz2", "conda"], output_folder: Union[str, None]=None
+        self,
+        package: PkgSpec,
+        python_version=DEFAULT_PYTHON_VERSION,
+        package_formats: Union[str, List[str]] = ["tarbz2", "conda"],
+        output_folder: Union[str, None] = None,
+        channels: Union[None, List[str]] = None,
+        show_output: bool = True,
+        rebuild: bool = False,
+        local_channel: Union[None, LocalChannel] = None,
+        use_local_channel: bool = False,
+        prefetch: bool = True,
     ) -> RattlerBuildPackageDetails:
+        """Build a package.
+
+        Arguments:
+            package: the package spec
+            python_version: the Python version to build for
+            package_formats: the formats of the build artifacts
+            output_folder: if set, the build artifacts are copied into this folder
+            channels: additional channels to resolve dependencies from, before the ones in the package spec
+            show_output: whether to render the build output to the terminal (it is always written to log files)
+            rebuild: build the package, even if there is a cached build with the same inputs
+            local_channel: the local channel the build artifacts are added to (default: the shared one)
+            use_local_channel: whether to resolve dependencies from the local channel first
+            prefetch: whether to solve the dependencies while the package source is downloaded
+        """
+
+        if isinstance(package_formats, str):
+            package_formats = [package_formats]
+
+        if not package_formats:
+            raise Exception("No package formats provided.")
+        for package_format in package_formats:
+            if package_format not in CONDA_PACKAGE_EXTENSIONS.keys():
+                raise Exception(f"Invalid package format: {package_format}")
+
+        # the recipe with the original source url, the source is identified by its hash
+        source_recipe = package.create_rattler_build_recipe()
+        if local_channel is None:
+            local_channel = get_local_channel()
+        all_channels = list(channels or []) + package.pkg_channels
+        if use_local_channel:
+            # rattler-build can't use a channel without a 'repodata.json'
+            local_channel.ensure_index()
+            all_channels.insert(0, local_channel.url)
+
+        build_cache = BuildCache()
+        fingerprint = create_build_fingerprint(
+            package,
+            recipe=source_recipe,
+            build_tool_version=RATTLER_BUILD_VERSION,
+            channels=all_channels,
+            python_version=python_version,
+            package_formats=package_formats,
+        )
+        if not rebuild:
+            cached = build_cache.get(fingerprint)
+            if cached is not None:
+                logger.debug(
+                    "build.cached", pkg_name=package.pkg_name, fingerprint=fingerprint
+                )
+                local_channel.add_packages(cached.build_artifacts)
+                return cached.model_copy(
+                    update={
+                        "from_cache": True,
+                        "build_artifacts": self._copy_artifacts(
+                            cached.build_artifacts, output_folder
+                        ),
+                    }
+                )
 
         build_env_details = self.get_state_details("rattler-build-available")
         rattler_build_bin = build_env_details["rattler_build_bin"]
@@ -69,52 +178,117 @@ class RattlerBuildEnvMgmt(object):
 
         build_dir = base_dir / "build"
 
-
-        recipe_file = base_dir / "recipe" / "recipe.yaml"
-        recipe = package.create_rattler_build_recipe()
-        recipe_file.parent.mkdir(parents=True, exist_ok=False)
-        with open(recipe_file, "wt") as f:
-            f.write(recipe)
-
-        channels = [
+        channel_args = [
             item
-            for tokens in (("--channel", channel) for channel in package.pkg_channels)
+            for tokens in (("--channel", channel) for channel in all_channels)
             for item in tokens
         ]
-
-        args = ["build", "-r", recipe_file.absolute().as_posix(), "--log-style", "plain"]
-
-        args.extend(channels)
-        args.extend(["--output-dir", build_dir.as_posix()])
-
-        if isinstance(package_formats, str):
-            package_formats = [package_formats]
-
-        if not package_formats:
-            raise Exception("No package formats provided.")
+        cache_env = get_package_cache_env()
 
         all_run_details = []
-        for package_format in package_formats:
-
-            pkg_format_args = args.copy()
-            pkg_format_args.append("--package-format")
-            pkg_format_args.append(package_format)
-
-            result = execute(
-                rattler_build_bin,
-                *pkg_format_args,
-                stdout_callback=default_stdout_print,
-                stderr_callback=default_stderr_print,
-            )
-
-            run_details = RunDetails(
-                cmd=rattler_build_bin,
-                args=pkg_format_args[1:],
-                stdout=result.stdout,
-                stderr=result.stderr,
-                exit_code=result.exit_code
-            )
-            all_run_details.append(run_details)
+        all_phases: List[BuildPhase] = []
+
+        # packages in the shared cache are not removed while the build uses them
+        with package_cache_in_use():
+            # the dependencies are solved while the source archive is downloaded (only
+            # once, for all builds of this version)
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                prefetch_started = time.time()
+                prefetch_future = (
+                    executor.submit(
+                        self.prefetch_dependencies,
+                        rattler_build_bin,
+                        source_recipe,
+                        channel_args,
+                        base_dir,
+                    )
+                    if prefetch
+                    else None
+                )
+                source_url = get_source_cache().get_source_url(package)
+                recipe = package.create_rattler_build_recipe(source_url=source_url)
+                if prefetch_future is not None:
+                    prefetch_details = prefetch_future.result()
+                    if prefetch_details is not None:
+                        usage = prefetch_details.resource_usage
+                        all_run_details.append(prefetch_details)
+                        all_phases.append(
+                            BuildPhase(
+                                name="prefetch",
+                                run="prefetch",
+                                started=prefetch_started,
+                                duration=usage.wall_time if usage else 0.0,
+                            )
+                        )
+
+            recipe_file = base_dir / "recipe" / "recipe.yaml"
+            recipe_file.parent.mkdir(parents=True, exist_ok=False)
+            with open(recipe_file, "wt") as f:
+                f.write(recipe)
+
+            args = ["build", "-r", recipe_file.absolute().as_posix(), "--log-style", "plain"]
+
+            args.extend(channel_args)
+            args.extend(["--output-dir", build_dir.as_posix()])
+
+            # the package is built once, the other formats are converted from that artifact
+            if zstandard_available():
+                build_formats = package_formats[:1]
+            else:
+                logger.debug("build.no_transcoding", reason="'zstandard' not installed")
+                build_formats = package_formats
+
+            for idx, package_format in enumerate(build_formats, start=1):
+
+                pkg_format_args = args.copy()
+                pkg_format_args.append("--package-format")
+                pkg_format_args.append(package_format)
+
+                renderer_ctx: ContextManager[Union[None, OutputRenderer]] = (
+                    OutputRenderer(
+                        title=f"Building '{package.pkg_name}' ({package.pkg_version})"
+                    )
+                    if show_output
+                    else nullcontext()
+                )
+                with renderer_ctx as renderer:
+                    if renderer is not None:
+                        renderer.set_progress(
+                            f"format {idx}/{len(build_formats)}: {package_format}"
+                        )
+                    log_parser = RattlerBuildLogParser(
+                        run=package_format,
+                        on_phase=(lambda phase, _: renderer.set_phase(phase))
+                        if renderer is not None
+                        else None,
+                    )
+
+                    def _stdout(line: str) -> None:
+                        log_parser.feed(line)
+                        if renderer is not None:
+                            renderer.stdout(line)
+
+                    def _stderr(line: str) -> None:
+                        log_parser.feed(line)
+                        if renderer is not None:
+                            renderer.stderr(line)
+
+                    try:
+                        result = execute(
+                            rattler_build_bin,
+                            *pkg_format_args,
+                            stdout_callback=_stdout,
+                            stderr_callback=_stderr,
+                            log_dir=base_dir / "logs",
+                            log_name=f"rattler-build-{package_format}",
+                            env_vars=cache_env,
+                        )
+                    finally:
+                        all_phases.extend(log_parser.finish())
+
+                # the full output is in the log files, only the tail is kept in memory
+                run_details = result.model_copy(update={"args": pkg_format_args[1:]})
+                all_run_details.append(run_details)
 
 
         artefact_stem = f"{package.pkg_name}-{package.pkg_version}-*"
@@ -125,22 +299,25 @@ class RattlerBuildEnvMgmt(object):
 
         if not artefacts:
             raise Exception(f"No build artifact found in: {build_output_folder}")
-        elif len(artefacts) != len(package_formats):
+        elif len(artefacts) != len(build_formats):
             raise Exception(f"Invalid number of build artifacts found in: {build_output_folder}")
 
         for artifact in artefacts:
             if not artifact.is_file():
                 raise Exception(f"Invalid artifact path (not a file): {artifact.as_posix()}")
 
-        if output_folder:
-            all_artifacts = []
-            output_folder_path = Path(output_folder)  # type: ignore
-            output_folder_path.mkdir(parents=True, exist_ok=True)
-            for artifact in artefacts:
-                artifact_path = shutil.copy(artifact, output_folder_path)
-                all_artifacts.append(artifact_path)
-        else:
-            all_artifacts = [artifact.as_posix() for artifact in artefacts]
+        for package_format in package_formats[len(build_formats):]:
+            started = time.time()
+            start = time.monotonic()
+            artefacts.append(transcode_package(artefacts[0], package_format))
+            all_phases.append(
+                BuildPhase(
+                    name="transcode",
+                    run=package_format,
+                    started=started,
+                    duration=time.monotonic() - start,
+                )
+            )
 
         result_details = RattlerBuildPackageDetails(
             run_details=all_run_details,
@@ -148,9 +325,95 @@ class RattlerBuildEnvMgmt(object):
             build_dir=build_dir.as_posix(),
             meta_file=recipe_file.as_posix(),
             package=package,
-            build_artifacts=all_artifacts
+            build_artifacts=[artifact.as_posix() for artifact in artefacts],
+            resource_usage=ResourceUsage.aggregate(
+                rd.resource_usage for rd in all_run_details if rd.resource_usage
+            ),
+            phases=all_phases,
+        )
+        # the build folder is wiped by the next build, the cache keeps the artifacts
+        result_details = build_cache.store(fingerprint, result_details)
+        local_channel.add_packages(result_details.build_artifacts)
+        return result_details.model_copy(
+            update={
+                "build_artifacts": self._copy_artifacts(
+                    result_details.build_artifacts, output_folder
+                )
+            }
+        )
+
+    def prefetch_dependencies(
+        self,
+        rattler_build_bin: str,
+        recipe: str,
+        channel_args: List[str],
+        base_dir: Path,
+    ) -> Union[None, RunDetails]:
+        """Solve the environments of a recipe, so the shared caches are warm when the build starts.
+
+        rattler-build has no download-only mode, so this renders the recipe and solves
+        its environments, which fetches the repodata of all channels into the shared
+        cache. The resolved packages are marked as used, so they are the last ones to
+        be pruned from the cache. Failures are only logged, the build itself will
+        report them properly.
+        """
+
+        recipe_file = base_dir / "prefetch" / "recipe.yaml"
+        recipe_file.parent.mkdir(parents=True, exist_ok=True)
+        recipe_file.write_text(recipe)
+
+        args = [
+            "build",
+            "-r",
+            recipe_file.absolute().as_posix(),
+            "--render-only",
+            "--with-solve",
+            "--log-style",
+            "plain",
+            *channel_args,
+        ]
+        # the rendered recipe (incl. the solved environments) is printed as json
+        rendered: List[str] = []
+        try:
+            result = execute(
+                rattler_build_bin,
+                *args,
+                stdout_callback=rendered.append,
+                log_dir=base_dir / "logs",
+                log_name="rattler-build-prefetch",
+                env_vars=get_package_cache_env(),
+            )
+        except Exception as e:
+            logger.debug("build.prefetch_failed", recipe=recipe_file.as_posix(), reason=str(e))
+            return None
+
+        # skip anything that is printed before the json document
+        start = next(
+            (i for i, line in enumerate(rendered) if line.lstrip().startswith(("[", "{"))),
+            len(rendered),
         )
-        return result_details
+        try:
+            mark_packages_used(
+                get_resolved_packages(json.loads("\n".join(rendered[start:])))
+            )
+        except ValueError as e:
+            logger.debug("build.prefetch_unparsable", reason=str(e))
+        return result.model_copy(update={"args": args})
+
+    def _copy_artifacts(
+        self, artifacts: List[str], output_folder: Union[str, None]
+    ) -> List[str]:
+
+        if not output_folder:
+            return list(artifacts)
+
+        all_artifacts = []
+        output_folder_path = Path(output_folder)
+        output_folder_path.mkdir(parents=True, exist_ok=True)
+        for artifact in artifacts:
+            artifact_path = shutil.copy(artifact, output_folder_path)
+            all_artifacts.append(str(artifact_path))
+        return all_artifacts
 
     def upload_package(
             self,
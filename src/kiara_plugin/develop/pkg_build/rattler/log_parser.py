@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""Extraction of build phases (and their durations) from rattler-build output."""
+import re
+import time
+from typing import Callable, List, Tuple, Union
+
+from kiara_plugin.develop.pkg_build.models import BuildPhase
+
+ANSI_ESCAPE = re.compile(r"\x1b\[[0-9;?]*[A-Za-z]")
+# the tree/box characters rattler-build uses to indent (nested) log spans
+SPAN_DECORATIONS = re.compile(r"^[\s│╭╰─├┤┊]+")
+# the level and target prefix of the 'plain' log style, e.g. 'INFO rattler_build::build: '
+LOG_PREFIX = re.compile(r"^(TRACE|DEBUG|INFO|WARN|ERROR)\s+\S+?:\s+")
+
+# the first pattern that matches a line determines the phase it starts, patterns
+# cover both the 'fancy' span headers and the 'plain' log messages
+RATTLER_BUILD_PHASE_PATTERNS: List[Tuple[str, re.Pattern]] = [
+    (
+        "source_fetch",
+        re.compile(
+            r"^(Fetching source|Downloading source|Copying source|Checking out|Found valid source cache)",
+            re.IGNORECASE,
+        ),
+    ),
+    (
+        "environment_solve",
+        re.compile(
+            r"^(Resolving (environments|build environment|host environment|test environment)|Solving environment)",
+            re.IGNORECASE,
+        ),
+    ),
+    (
+        "package_download",
+        re.compile(
+            r"^(Installing (build|host|test) environment|Downloading and extracting|Linking packages)",
+            re.IGNORECASE,
+        ),
+    ),
+    (
+        "build_script",
+        re.compile(r"^(Running build script|Starting build)", re.IGNORECASE),
+    ),
+    (
+        "packaging",
+        re.compile(
+            r"^(Packaging new files|Post-processing|Copying license files|Writing (test|metadata|about) files)",
+            re.IGNORECASE,
+        ),
+    ),
+    (
+        "compression",
+        re.compile(r"^(Compressing|Creating (\.tar\.bz2|\.conda))", re.IGNORECASE),
+    ),
+    (
+        "tests",
+        re.compile(r"^(Running tests?|Testing (package|commands))", re.IGNORECASE),
+    ),
+]
+
+
+class RattlerBuildLogParser(object):
+    """Detects the phases of a rattler-build run from its (line-by-line) output.
+
+    Lines are fed in via the 'stdout'/'stderr' methods, which can be used as (or
+    called from) 'execute' callbacks. Every phase change is reported to 'on_phase',
+    with the name of the new phase and its start time (epoch seconds).
+    The time before the first recognized phase is recorded as 'setup'.
+    """
+
+    def __init__(
+        self,
+        run: Union[None, str] = None,
+        on_phase: Union[None, Callable[[str, float], None]] = None,
+    ) -> None:
+
+        # all patterns in one regex, so every line is only scanned once
+        self._pattern: re.Pattern = re.compile(
+            "|".join(
+                f"(?P<{phase}>{pattern.pattern})"
+                for phase, pattern in RATTLER_BUILD_PHASE_PATTERNS
+            ),
+            re.IGNORECASE,
+        )
+        self._run: Union[None, str] = run
+        self._on_phase: Union[None, Callable[[str, float], None]] = on_phase
+        self._phases: List[BuildPhase] = []
+        self._current: str = "setup"
+        self._current_start: float = time.time()
+        self._current_start_monotonic: float = time.monotonic()
+
+    @property
+    def current_phase(self) -> str:
+        return self._current
+
+    def detect_phase(self, line: str) -> Union[None, str]:
+
+        message = SPAN_DECORATIONS.sub("", ANSI_ESCAPE.sub("", line))
+        message = LOG_PREFIX.sub("", message)
+        match = self._pattern.match(message)
+        if match is None:
+            return None
+        return match.lastgroup
+
+    def feed(self, line: str) -> None:
+
+        phase = self.detect_phase(line)
+        if phase is not None and phase != self._current:
+            self._switch(phase)
+
+    def stdout(self, line: str) -> None:
+        self.feed(line)
+
+    def stderr(self, line: str) -> None:
+        self.feed(line)
+
+    def _switch(self, phase: Union[None, str]) -> None:
+
+        now = time.monotonic()
+        self._phases.append(
+            BuildPhase(
+                name=self._current,
+                run=self._run,
+                started=self._current_start,
+                duration=now - self._current_start_monotonic,
+            )
+        )
+        if phase is None:
+            return
+
+        self._current = phase
+        self._current_start = time.time()
+        self._current_start_monotonic = now
+        if self._on_phase is not None:
+            self._on_phase(phase, self._current_start)
+
+    def finish(self) -> List[BuildPhase]:
+        """Close the current phase, and return all phases."""
+
+        self._switch(None)
+        return self._phases
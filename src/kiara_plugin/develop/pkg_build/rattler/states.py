@@ -3,14 +3,27 @@ import os
 import platform
 from pathlib import Path
 from typing import Any, Dict, Mapping, Union
-from urllib.request import urlopen
+
+import structlog
 
 from kiara.utils.cli import terminal_print
-from kiara_plugin.develop.pkg_build.states import State
+from kiara_plugin.develop.pkg_build.states import State, create_file_fingerprint
+from kiara_plugin.develop.utils.downloads import download_file
+
+logger = structlog.getLogger()
+
+# the sha256 digests of the release binaries, per version and platform token, a
+# 'sha256' config value takes precedence (e.g. for other versions)
+RATTLER_BUILD_SHA256: Dict[str, Dict[str, str]] = {
+    "0.15.0": {},
+}
 
 
 class RattlerBuildAvailable(State):
 
+    def fingerprint(self, details: Mapping[str, Any]) -> Union[None, str]:
+        return create_file_fingerprint(details["rattler_build_bin"])
+
     def _check(self) -> Union[None, Mapping[str, Any]]:
 
         root_path: str = self.get_config("root_path")
@@ -67,18 +80,20 @@ class RattlerBuildAvailable(State):
         url = f"https://github.com/prefix-dev/rattler-build/releases/download/v{version}/rattler-build-{token}"
 
 
-        root_path: Path = self.get_config("root_path")
-        # bin_path = root_path / "bin" / "micromamba"
-        # bin_path.parent.mkdir(parents=True, exist_ok=True)
+        root_path: str = self.get_config("root_path")
+        try:
+            sha256 = self.get_config("sha256")
+        except Exception:
+            sha256 = None
+        if not sha256:
+            sha256 = RATTLER_BUILD_SHA256.get(version, {}).get(token, None)
+        if not sha256:
+            logger.warning("download.unverified", url=url, reason="no pinned sha256")
+
         terminal_print(f"Downloading rattler-build from '{url}'...")
 
         target_path = Path(os.path.join(root_path, "bin", "rattler-build"))
-        target_path.parent.mkdir(parents=True, exist_ok=True)
-
-        with urlopen(url) as response:  # noqa
-            with open(target_path, "wb") as f:  # open a file in write-binary mode
-                f.write(response.read())  # write the content to the file
-
+        download_file(url, target_path, sha256=sha256)
         os.chmod(target_path, 0o755)  # noqa
 
         current = self._check()
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""Concurrent builds of several (inter-dependent) packages."""
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, Set, Union
+
+import structlog
+from packaging.utils import canonicalize_name
+
+from kiara_plugin.develop.pkg_build.channel import LocalChannel
+from kiara_plugin.develop.pkg_build.conda.states import get_dependency_name
+from kiara_plugin.develop.pkg_build.models import PkgSpec, RattlerBuildPackageDetails
+from kiara_plugin.develop.utils.graph_utils import (
+    DependencyCycleException,
+    topological_order,
+)
+
+logger = structlog.getLogger()
+
+
+def create_build_graph(packages: Iterable[PkgSpec]) -> Dict[str, Set[str]]:
+    """Return the packages (by canonical name) each of the provided packages needs to be built after.
+
+    Only requirements (host and runtime) that are part of the provided packages
+    are considered.
+    """
+
+    pkgs = {str(canonicalize_name(pkg.pkg_name)): pkg for pkg in packages}
+    graph: Dict[str, Set[str]] = {}
+    for name, pkg in pkgs.items():
+        deps = set()
+        for req in pkg.host_requirements + pkg.pkg_requirements:
+            dep_name = str(canonicalize_name(get_dependency_name(req)))
+            if dep_name in pkgs.keys() and dep_name != name:
+                deps.add(dep_name)
+        graph[name] = deps
+    return graph
+
+
+class BuildScheduler(object):
+    """Builds packages in dependency order, building independent packages concurrently.
+
+    The 'build_func' is expected to publish every finished package to the local
+    channel right away (and to resolve against it), so packages that depend on it
+    can be built next. If a build fails, packages that depend on it are skipped.
+    """
+
+    def __init__(
+        self,
+        build_func: Callable[[PkgSpec], RattlerBuildPackageDetails],
+        channel: LocalChannel,
+        max_workers: int = 2,
+        on_event: Union[None, Callable[[str, str, Union[None, str]], None]] = None,
+    ) -> None:
+
+        self._build_func: Callable[[PkgSpec], RattlerBuildPackageDetails] = build_func
+        self._channel: LocalChannel = channel
+        self._max_workers: int = max_workers
+        self._on_event: Union[
+            None, Callable[[str, str, Union[None, str]], None]
+        ] = on_event
+
+    def _event(self, pkg_name: str, event: str, msg: Union[None, str] = None) -> None:
+
+        logger.debug("build.scheduler", pkg_name=pkg_name, build_event=event, msg=msg)
+        if self._on_event is not None:
+            self._on_event(pkg_name, event, msg)
+
+    def _build(self, package: PkgSpec) -> RattlerBuildPackageDetails:
+
+        return self._build_func(package)
+
+    def build(
+        self, packages: Iterable[PkgSpec]
+    ) -> Dict[str, Union[RattlerBuildPackageDetails, Exception]]:
+        """Build all packages, and return the build details (or error) per package name."""
+
+        pkgs: Dict[str, PkgSpec] = {}
+        for pkg in packages:
+            name = str(canonicalize_name(pkg.pkg_name))
+            if name in pkgs.keys():
+                raise Exception(
+                    f"Duplicate package '{pkg.pkg_name}': {pkgs[name].pkg_version}, {pkg.pkg_version}"
+                )
+            pkgs[name] = pkg
+        graph = create_build_graph(pkgs.values())
+        try:
+            order = topological_order(graph)
+        except DependencyCycleException as e:
+            raise Exception(f"Dependency cycle between packages: {', '.join(e.nodes)}")
+
+        self._channel.ensure_index()
+
+        results: Dict[str, Union[RattlerBuildPackageDetails, Exception]] = {}
+        running: Dict[Future, str] = {}
+        with ThreadPoolExecutor(
+            max_workers=self._max_workers, thread_name_prefix="pkg-build"
+        ) as executor:
+            while len(results) < len(order):
+                for name in order:
+                    if name in results.keys() or name in running.values():
+                        continue
+                    failed_deps = [
+                        d for d in graph[name] if isinstance(results.get(d), Exception)
+                    ]
+                    if failed_deps:
+                        msg = f"Dependency failed: {', '.join(sorted(failed_deps))}"
+                        results[name] = Exception(msg)
+                        self._event(pkgs[name].pkg_name, "skipped", msg)
+                    elif all(d in results.keys() for d in graph[name]):
+                        self._event(pkgs[name].pkg_name, "started")
+                        running[executor.submit(self._build, pkgs[name])] = name
+
+                if not running:
+                    continue
+
+                finished, _ = wait(running.keys(), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                        self._event(pkgs[name].pkg_name, "finished")
+                    except Exception as e:
+                        results[name] = e
+                        self._event(pkgs[name].pkg_name, "failed", str(e))
+
+        return {pkgs[name].pkg_name: results[name] for name in order}
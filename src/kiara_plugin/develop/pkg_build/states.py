@@ -1,20 +1,66 @@
 # -*- coding: utf-8 -*-
 import abc
-from typing import Any, Dict, Mapping, Union
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Set, Tuple, Union
+
+import structlog
+from pydantic import BaseModel, Field
+
+from kiara_plugin.develop.defaults import KIARA_DEV_STATES_CACHE_PATH
+from kiara_plugin.develop.utils.graph_utils import (
+    DependencyCycleException,
+    topological_order,
+)
+
+logger = structlog.getLogger()
+
+
+def create_file_fingerprint(*paths: Union[str, Path]) -> Union[None, str]:
+    """Create a fingerprint from the mtime and size of files, 'None' if one of them doesn't exist."""
+
+    tokens = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        tokens.append(f"{path}:{stat.st_mtime_ns}:{stat.st_size}")
+    return "|".join(tokens)
 
 
 class State(abc.ABC):
-    def __init__(self, state_id: str, **config):
+
+    # the ids of the states this state type depends on, if not specified per instance
+    DEFAULT_DEPENDENCIES: Tuple[str, ...] = ()
+
+    def __init__(
+        self, state_id: str, depends_on: Union[None, Iterable[str]] = None, **config
+    ):
 
         self._state_id: str = state_id
         self._config: Mapping[str, Any] = config
+        self._dependencies: Tuple[str, ...] = (
+            tuple(depends_on) if depends_on is not None else self.DEFAULT_DEPENDENCIES
+        )
         self._states: Union[None, "States"] = None
         self._state_details: Union[None, Mapping[str, None]] = None
+        self._lock = threading.RLock()
 
     @property
     def state_id(self):
         return self._state_id
 
+    @property
+    def dependencies(self) -> Tuple[str, ...]:
+        return self._dependencies
+
     def ensure_state(self, state_id: str):
 
         if self._states is None:
@@ -37,22 +83,56 @@ class State(abc.ABC):
             )
         return self._config[key]
 
+    @property
+    def cache_key(self) -> str:
+        return f"{self.__class__.__name__}:{self._state_id}"
+
+    @property
+    def config_hash(self) -> str:
+
+        config = json.dumps(self._config, sort_keys=True, default=str)
+        return hashlib.sha256(config.encode()).hexdigest()
+
+    def fingerprint(self, details: Mapping[str, Any]) -> Union[None, str]:
+        """Return a cheap-to-compute fingerprint of a resolved state.
+
+        Persisted details are only re-used if this fingerprint hasn't changed since
+        they were resolved. Returning 'None' means the state can't be cached (the default).
+        """
+
+        return None
+
     def resolve(self) -> Mapping[str, Any]:
 
+        with self._lock:
+            return self._resolve_locked()
+
+    def _resolve_locked(self) -> Mapping[str, Any]:
+
         if self._state_details is not None:
             return self._state_details
 
+        if self._states is not None:
+            cached = self._states.get_cached_details(self)
+            if cached is not None:
+                self._state_details = cached
+                return self._state_details
+
         self._state_details = self._resolve()
         if self._state_details is None:
             raise Exception(
                 f"No state details for: {self.__class__.__name__}. This is a bug."
             )
+        if self._states is not None:
+            self._states.cache_details(self, self._state_details)
         return self._state_details
 
     def purge(self):
 
         self._purge()
         self._state_details = None
+        if self._states is not None:
+            self._states.remove_cached_details(self)
 
     @abc.abstractmethod
     def _resolve(self) -> Mapping[str, Any]:
@@ -72,9 +152,92 @@ class State(abc.ABC):
 
 
 class States(object):
-    def __init__(self) -> None:
+    """A collection of states, whose resolved details are persisted between processes.
+
+    Persisted details are validated via the state's (cheap) fingerprint, and a hash of
+    its config, before they are used. The persisted file is read once per instance,
+    and only updated under a file lock (where supported), so concurrent processes
+    don't drop each other's entries.
+    """
+
+    def __init__(self, cache_path: Union[None, str, Path] = KIARA_DEV_STATES_CACHE_PATH) -> None:
 
         self._states: Dict[str, State] = {}
+        self._cache_path: Union[None, Path] = Path(cache_path) if cache_path else None
+        self._cache_lock = threading.Lock()
+        self._cache: Union[None, Dict[str, Any]] = None
+
+    @contextmanager
+    def _locked_cache(self) -> Iterator[Dict[str, Any]]:
+        """Serialize cache updates between threads and processes, and yield the current cache content."""
+
+        from kiara_plugin.develop.utils import lock_file
+
+        assert self._cache_path is not None
+        with self._cache_lock, lock_file(f"{self._cache_path}.lock"):
+            # re-read, so entries written by other processes in the meantime are kept
+            data = self._read_cache()
+            yield data
+            self._cache = data
+
+    def _read_cache(self) -> Dict[str, Any]:
+
+        if self._cache_path is None or not self._cache_path.is_file():
+            return {}
+        try:
+            with open(self._cache_path, "rt") as f:
+                data: Dict[str, Any] = json.load(f)
+            return data
+        except Exception as e:
+            logger.debug("states.cache.invalid", path=str(self._cache_path), reason=str(e))
+            return {}
+
+    def _write_cache(self, data: Mapping[str, Any]) -> None:
+
+        from kiara_plugin.develop.utils import write_file_atomic
+
+        if self._cache_path is None:
+            return
+        write_file_atomic(self._cache_path, json.dumps(data, indent=2, default=str))
+
+    def get_cached_details(self, state: State) -> Union[None, Mapping[str, Any]]:
+
+        with self._cache_lock:
+            if self._cache is None:
+                self._cache = self._read_cache()
+            entry = self._cache.get(state.cache_key, None)
+        if entry is None or entry.get("config_hash", None) != state.config_hash:
+            return None
+
+        details: Mapping[str, Any] = entry["details"]
+        fingerprint = state.fingerprint(details)
+        if fingerprint is None or fingerprint != entry.get("fingerprint", None):
+            logger.debug("states.cache.outdated", state_id=state.state_id)
+            return None
+        return details
+
+    def cache_details(self, state: State, details: Mapping[str, Any]) -> None:
+
+        fingerprint = state.fingerprint(details)
+        if fingerprint is None or self._cache_path is None:
+            return
+
+        with self._locked_cache() as data:
+            data[state.cache_key] = {
+                "config_hash": state.config_hash,
+                "fingerprint": fingerprint,
+                "details": details,
+            }
+            self._write_cache(data)
+
+    def remove_cached_details(self, state: State) -> None:
+
+        if self._cache_path is None:
+            return
+
+        with self._locked_cache() as data:
+            if data.pop(state.cache_key, None) is not None:
+                self._write_cache(data)
 
     def add_state(self, state: State):
 
@@ -96,3 +259,126 @@ class States(object):
 
     def get_state_details(self, state_id: str) -> Mapping[str, Any]:
         return self._states[state_id].get_details()
+
+    def _create_graph(
+        self, state_ids: Union[None, Iterable[str]] = None
+    ) -> Dict[str, Tuple[str, ...]]:
+        """Return the (transitive) dependencies of the provided states, as an adjacency map."""
+
+        pending = list(state_ids) if state_ids is not None else list(self._states.keys())
+        graph: Dict[str, Tuple[str, ...]] = {}
+        while pending:
+            state_id = pending.pop()
+            if state_id in graph.keys():
+                continue
+            if state_id not in self._states.keys():
+                raise Exception(f"Unknown state: {state_id}")
+            graph[state_id] = self._states[state_id].dependencies
+            pending.extend(graph[state_id])
+
+        # make sure there are no cycles
+        try:
+            topological_order(graph)
+        except DependencyCycleException as e:
+            raise Exception(f"Dependency cycle between states: {', '.join(e.nodes)}")
+        return graph
+
+    def resolve_all(
+        self, parallel: int = 1, state_ids: Union[None, Iterable[str]] = None
+    ) -> "StatesResolution":
+        """Resolve states (default: all), and their dependencies.
+
+        States whose dependencies are resolved are resolved concurrently, on up to
+        'parallel' threads. If a state fails, states that depend on it are skipped,
+        and a 'StatesResolutionException' is raised once all other states are done.
+        """
+
+        graph = self._create_graph(state_ids)
+
+        durations: Dict[str, float] = {}
+        errors: Dict[str, Exception] = {}
+        done: Set[str] = set()
+        running: Dict[Future, str] = {}
+
+        def _resolve(state_id: str) -> float:
+            start = time.monotonic()
+            self._states[state_id].resolve()
+            return time.monotonic() - start
+
+        with ThreadPoolExecutor(
+            max_workers=parallel, thread_name_prefix="state-resolve"
+        ) as executor:
+            while len(done) < len(graph):
+                for state_id, deps in graph.items():
+                    if state_id in done or state_id in running.values():
+                        continue
+                    failed_deps = [d for d in deps if d in errors.keys()]
+                    if failed_deps:
+                        errors[state_id] = Exception(
+                            f"Dependency failed: {', '.join(failed_deps)}"
+                        )
+                        done.add(state_id)
+                    elif all(d in done for d in deps):
+                        running[executor.submit(_resolve, state_id)] = state_id
+
+                if not running:
+                    continue
+
+                finished, _ = wait(running.keys(), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    state_id = running.pop(future)
+                    done.add(state_id)
+                    try:
+                        durations[state_id] = future.result()
+                    except Exception as e:
+                        logger.debug("states.resolve.failed", state_id=state_id, reason=str(e))
+                        errors[state_id] = e
+
+        if errors:
+            raise StatesResolutionException(errors=errors)
+
+        # the critical path is the chain of dependencies with the longest total duration
+        finish: Dict[str, float] = {}
+        previous: Dict[str, Union[None, str]] = {}
+        for state_id in topological_order(graph):
+            deps = graph[state_id]
+            slowest = max(deps, key=lambda d: finish[d]) if deps else None
+            previous[state_id] = slowest
+            finish[state_id] = durations[state_id] + (finish[slowest] if slowest else 0.0)
+
+        critical_path: List[str] = []
+        current: Union[None, str] = max(finish.keys(), key=lambda k: finish[k], default=None)
+        total = finish[current] if current else 0.0
+        while current is not None:
+            critical_path.insert(0, current)
+            current = previous[current]
+
+        return StatesResolution(
+            durations=durations,
+            critical_path=critical_path,
+            critical_path_duration=total,
+        )
+
+
+class StatesResolution(BaseModel):
+
+    durations: Dict[str, float] = Field(
+        description="The time it took to resolve each state (in seconds)."
+    )
+    critical_path: List[str] = Field(
+        description="The chain of dependent states that took the longest to resolve."
+    )
+    critical_path_duration: float = Field(
+        description="The total duration of the critical path (in seconds)."
+    )
+
+
+class StatesResolutionException(Exception):
+    def __init__(self, errors: Mapping[str, Exception]):
+        self._errors: Mapping[str, Exception] = errors
+        msg = "; ".join(f"{k}: {v}" for k, v in errors.items())
+        super().__init__(f"Failed to resolve state(s): {msg}")
+
+    @property
+    def errors(self) -> Mapping[str, Exception]:
+        return self._errors
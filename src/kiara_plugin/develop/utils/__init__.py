@@ -1,58 +1,290 @@
 # -*- coding: utf-8 -*-
 # helper function, from: https://gist.github.com/thelinuxkid/5114777
+import asyncio
+import codecs
+import inspect
 import os
+import re
 import selectors
+import signal
 import subprocess
+import tempfile
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
 from pathlib import Path
 from subprocess import Popen
-from typing import TYPE_CHECKING, Callable, Generator, Union
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    Callable,
+    Deque,
+    Dict,
+    Generator,
+    Iterator,
+    List,
+    TextIO,
+    Tuple,
+    Union,
+)
+
+from kiara_plugin.develop.utils.resource_usage import wait_for_process
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # type: ignore
 
 if TYPE_CHECKING:
-    from kiara_plugin.develop.pkg_build.models import RunDetails
+    from kiara_plugin.develop.pkg_build.models import ResourceUsage, RunDetails
+
+STDOUT = "stdout"
+STDERR = "stderr"
+
+OUTPUT_CHUNK_SIZE = 64 * 1024
+LINE_ENDINGS = re.compile(r"\r\n|\r|\n")
+
+
+class LineSplitter(object):
+    """Decodes a byte stream incrementally, and splits it into lines.
+
+    Multi-byte characters and CRLF line endings that are split across chunks are
+    handled correctly.
+    """
+
+    def __init__(self, encoding: str = "utf-8") -> None:
+
+        self._decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        self._pending: str = ""
+
+    def feed(self, data: bytes, final: bool = False) -> List[str]:
+
+        text = self._pending + self._decoder.decode(data, final=final)
+        # a trailing CR might be the first half of a CRLF
+        hold = ""
+        if not final and text.endswith("\r"):
+            hold = "\r"
+            text = text[:-1]
+
+        lines = LINE_ENDINGS.split(text)
+        self._pending = lines.pop() + hold
+        if final and self._pending:
+            lines.append(self._pending)
+            self._pending = ""
+        return lines
+
+
+def pump_output(
+    proc: Popen, chunk_size: int = OUTPUT_CHUNK_SIZE, encoding: str = "utf-8"
+) -> Generator[Tuple[str, str], None, None]:
+    """Read the stdout and stderr of a process, and yield (stream, line) tuples.
+
+    The pipes are read in large, non-blocking chunks directly from their file
+    descriptors, so the child process is never slowed down by a slow reader. The
+    stream is either 'STDOUT' or 'STDERR'.
+    """
+
+    sel = selectors.DefaultSelector()
+    splitters: Dict[int, Tuple[str, LineSplitter]] = {}
+    for stream, pipe in ((STDOUT, proc.stdout), (STDERR, proc.stderr)):
+        if pipe is None:
+            continue
+        fd = pipe.fileno()
+        os.set_blocking(fd, False)
+        sel.register(fd, selectors.EVENT_READ)
+        splitters[fd] = (stream, LineSplitter(encoding=encoding))
+
+    try:
+        while sel.get_map():
+            for key, _ in sel.select():
+                fd = key.fd  # type: ignore
+                stream, splitter = splitters[fd]
+                try:
+                    data = os.read(fd, chunk_size)
+                except BlockingIOError:
+                    continue
+
+                if not data:
+                    sel.unregister(fd)
+                    for line in splitter.feed(b"", final=True):
+                        yield stream, line
+                    continue
 
-newlines = ["\n", "\r\n", "\r"]
+                for line in splitter.feed(data):
+                    yield stream, line
+    finally:
+        sel.close()
 
 
 def unbuffered(
     proc: Popen, stdout_prefix: str = "", stderr_prefix: str = ""
 ) -> Generator[str, None, None]:
+    """Yield the output lines of a process, with a prefix per stream.
 
-    sel = selectors.DefaultSelector()
-    sel.register(proc.stdout, selectors.EVENT_READ)  # type: ignore
-    sel.register(proc.stderr, selectors.EVENT_READ)  # type: ignore
-    current_stdout = ""
-    current_stderr = ""
+    Kept for backwards compatibility, use 'pump_output' instead.
+    """
 
-    stdout_finished = False
-    stderr_finished = False
+    for stream, line in pump_output(proc):
+        if stream == STDOUT:
+            yield stdout_prefix + line
+        else:
+            yield stderr_prefix + line
 
-    while True:
-        for key, _ in sel.select():
-            data = key.fileobj.read(1)  # type: ignore
-            if not data:
-                if key.fileobj == proc.stdout:
-                    stdout_finished = True
-                else:
-                    stderr_finished = True
 
-                if stdout_finished and stderr_finished:
-                    break
+def write_file_atomic(path: Union[str, Path], content: Union[str, bytes]) -> None:
+    """Write a file via a temporary file in the same folder, so readers never see partial content."""
 
-            if key.fileobj is proc.stdout:
-                if data in newlines:
-                    yield stdout_prefix + current_stdout
-                    current_stdout = ""
-                else:
-                    current_stdout += data
-            elif data in newlines:
-                yield stderr_prefix + current_stderr
-                current_stderr = ""
-            else:
-                current_stderr += data
-        else:
-            continue
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    handle, temp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(handle, "wb" if isinstance(content, bytes) else "wt") as f:
+            f.write(content)
+        os.replace(temp_path, path)
+    except Exception:
+        os.unlink(temp_path)
+        raise
+
+
+@contextmanager
+def lock_file(
+    path: Union[str, Path], shared: bool = False, blocking: bool = True
+) -> Iterator[bool]:
+    """Hold a lock on a (lock) file, to serialize work between processes.
+
+    The lock is exclusive, unless 'shared' is set. If 'blocking' is not set, this
+    doesn't wait for other holders of the lock, and yields whether the lock was
+    acquired. The lock is only taken where 'fcntl' is available. Threads of the same
+    process need to be serialized by the caller.
+    """
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "wb") as f:
+        if fcntl is None:
+            yield True
+            return
+        flags = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+        if not blocking:
+            flags |= fcntl.LOCK_NB
+        try:
+            fcntl.flock(f, flags)
+        except BlockingIOError:
+            yield False
+            return
+        yield True
+
+
+class OutputCapture(object):
+    """Keeps the last lines of a stream in memory, and (optionally) writes all of it to a log file.
 
-        break
+    Arguments:
+        max_size: the maximum number of characters to keep in memory, 'None' for no limit
+        log_file: a path to write the full stream to
+    """
+
+    def __init__(
+        self,
+        max_size: Union[None, int] = None,
+        log_file: Union[None, str, Path] = None,
+    ) -> None:
+
+        self._max_size: Union[None, int] = max_size
+        self._lines: Deque[str] = deque()
+        self._size: int = 0
+        self._truncated: bool = False
+        self._log_file: Union[None, Path] = None
+        self._log: Union[None, TextIO] = None
+        if log_file is not None:
+            self._log_file = Path(log_file)
+            self._log_file.parent.mkdir(parents=True, exist_ok=True)
+            self._log = open(
+                self._log_file, "wt", encoding="utf-8", buffering=OUTPUT_CHUNK_SIZE
+            )
+
+    @property
+    def log_file(self) -> Union[None, str]:
+        return self._log_file.as_posix() if self._log_file else None
+
+    @property
+    def truncated(self) -> bool:
+        return self._truncated
+
+    def append(self, line: str) -> None:
+
+        if self._log is not None:
+            self._log.write(line)
+            self._log.write("\n")
+
+        self._lines.append(line)
+        self._size += len(line) + 1
+        if self._max_size is None:
+            return
+        while self._size > self._max_size and len(self._lines) > 1:
+            self._size -= len(self._lines.popleft()) + 1
+            self._truncated = True
+
+    def text(self) -> str:
+        return "\n".join(self._lines)
+
+    def close(self) -> None:
+
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+
+def create_output_captures(
+    cmd: str,
+    log_dir: Union[None, str, Path] = None,
+    log_name: Union[None, str] = None,
+    buffer_size: Union[None, int] = None,
+) -> Tuple[OutputCapture, OutputCapture]:
+    """Create the stdout and stderr captures for a command, see 'execute' for the arguments."""
+
+    from kiara_plugin.develop.defaults import KIARA_DEV_OUTPUT_BUFFER_SIZE
+
+    if log_dir is None:
+        return OutputCapture(max_size=buffer_size), OutputCapture(max_size=buffer_size)
+
+    if log_name is None:
+        log_name = os.path.basename(cmd)
+    if buffer_size is None:
+        buffer_size = KIARA_DEV_OUTPUT_BUFFER_SIZE
+    return (
+        OutputCapture(
+            max_size=buffer_size, log_file=Path(log_dir) / f"{log_name}.stdout.log"
+        ),
+        OutputCapture(
+            max_size=buffer_size, log_file=Path(log_dir) / f"{log_name}.stderr.log"
+        ),
+    )
+
+
+def create_run_details(
+    cmd: str,
+    args: List[str],
+    exit_code: int,
+    stdout_output: OutputCapture,
+    stderr_output: OutputCapture,
+    resource_usage: Union[None, "ResourceUsage"] = None,
+) -> "RunDetails":
+
+    from kiara_plugin.develop.pkg_build.models import RunDetails
+
+    return RunDetails(
+        cmd=cmd,
+        args=args,
+        exit_code=exit_code,
+        stdout=stdout_output.text(),
+        stderr=stderr_output.text(),
+        stdout_file=stdout_output.log_file,
+        stderr_file=stderr_output.log_file,
+        truncated=stdout_output.truncated or stderr_output.truncated,
+        resource_usage=resource_usage,
+    )
 
 
 class ExecutionException(Exception):
@@ -72,46 +304,59 @@ def execute(
     stderr_callback: Union[Callable, None] = None,
     cwd: Union[None, str, Path] = None,
     env_vars: Union[None, dict] = None,
+    log_dir: Union[None, str, Path] = None,
+    log_name: Union[None, str] = None,
+    buffer_size: Union[None, int] = None,
 ) -> "RunDetails":
+    """Run a command, and capture its output.
 
-    from kiara_plugin.develop.pkg_build.models import RunDetails
+    If 'log_dir' is set, the full output is written to '<log_name>.stdout.log' and
+    '<log_name>.stderr.log' in that folder, and only the last 'buffer_size'
+    characters (default: 'KIARA_DEV_OUTPUT_BUFFER_SIZE') of each stream are kept in
+    memory. Otherwise, all output is kept, unless 'buffer_size' is set.
+    """
 
-    stdout_output = []
-    stderr_output = []
     _args = list(args)
 
+    stdout_output, stderr_output = create_output_captures(
+        cmd, log_dir=log_dir, log_name=log_name, buffer_size=buffer_size
+    )
+
     process_env_vars = os.environ.copy()
     if env_vars:
         process_env_vars.update(env_vars)
 
+    start_time = time.monotonic()
     with subprocess.Popen(
         [cmd,*_args],
         shell=False,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
-        universal_newlines=True,
         cwd=cwd,
         env=process_env_vars
     ) as proc:
-        for line in unbuffered(proc, stdout_prefix="o-", stderr_prefix="e-"):
-            if line.startswith("o-"):
-                _line = line[2:]
-                if stdout_callback:
-                    stdout_callback(_line)
-                stdout_output.append(_line)
-            elif line.startswith("e-"):
-                _line = line[2:]
-                if stderr_callback:
-                    stderr_callback(_line)
-                stderr_output.append(_line)
-
-        proc.wait()
-        run_details = RunDetails(
-            cmd=cmd,
-            args=_args,
-            exit_code=proc.returncode,
-            stdout="\n".join(stdout_output),
-            stderr="\n".join(stderr_output),
+        try:
+            for stream, line in pump_output(proc):
+                if stream == STDOUT:
+                    if stdout_callback:
+                        stdout_callback(line)
+                    stdout_output.append(line)
+                else:
+                    if stderr_callback:
+                        stderr_callback(line)
+                    stderr_output.append(line)
+        finally:
+            stdout_output.close()
+            stderr_output.close()
+
+        resource_usage = wait_for_process(proc, start_time=start_time)
+        run_details = create_run_details(
+            cmd,
+            _args,
+            proc.returncode,
+            stdout_output,
+            stderr_output,
+            resource_usage=resource_usage,
         )
 
     if run_details.exit_code != 0:
@@ -119,3 +364,294 @@ def execute(
             f"Failed to run command '{cmd} {' '.join(args)}'", run_details=run_details
         )
     return run_details
+
+
+def _wait_in_thread(proc: Popen, start_time: float) -> "asyncio.Future[ResourceUsage]":
+    """Wait for (and reap) a process in a dedicated thread, see 'wait_for_process'.
+
+    The process is not started via asyncio, so the asyncio child watcher doesn't
+    reap it before its resource usage is read.
+    """
+
+    loop = asyncio.get_running_loop()
+    future: "asyncio.Future[ResourceUsage]" = loop.create_future()
+
+    def _set_result(result: Union["ResourceUsage", BaseException]) -> None:
+        if future.done():
+            return
+        if isinstance(result, BaseException):
+            future.set_exception(result)
+        else:
+            future.set_result(result)
+
+    def _wait() -> None:
+        result: Union[ResourceUsage, BaseException]
+        try:
+            result = wait_for_process(proc, start_time=start_time)
+        except BaseException as e:
+            result = e
+        loop.call_soon_threadsafe(_set_result, result)
+
+    threading.Thread(target=_wait, name=f"wait-{proc.pid}", daemon=True).start()
+    return future
+
+
+async def _connect_reader(
+    pipe: Any,
+) -> Tuple[asyncio.BaseTransport, asyncio.StreamReader]:
+
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    transport, _ = await loop.connect_read_pipe(
+        lambda: asyncio.StreamReaderProtocol(reader), pipe
+    )
+    return transport, reader
+
+
+async def _kill_process_group(
+    proc: Popen,
+    waiter: "asyncio.Future[ResourceUsage]",
+    grace_period: float = 5.0,
+) -> None:
+    """Terminate a process (and all its children), kill it if it doesn't exit within the grace period."""
+
+    if waiter.done():
+        return
+
+    def _signal(sig: int) -> None:
+        try:
+            if hasattr(os, "killpg"):
+                os.killpg(proc.pid, sig)
+            else:
+                proc.send_signal(sig)
+        except ProcessLookupError:
+            pass
+
+    _signal(signal.SIGTERM)
+    try:
+        await asyncio.wait_for(asyncio.shield(waiter), timeout=grace_period)
+    except asyncio.TimeoutError:
+        _signal(signal.SIGKILL if hasattr(signal, "SIGKILL") else signal.SIGTERM)
+        await waiter
+
+
+async def execute_async(
+    cmd: str,
+    *args: str,
+    stdout_callback: Union[Callable, None] = None,
+    stderr_callback: Union[Callable, None] = None,
+    cwd: Union[None, str, Path] = None,
+    env_vars: Union[None, dict] = None,
+    log_dir: Union[None, str, Path] = None,
+    log_name: Union[None, str] = None,
+    buffer_size: Union[None, int] = None,
+    timeout: Union[None, float] = None,
+    semaphore: Union[None, asyncio.Semaphore] = None,
+) -> "RunDetails":
+    """Run a command in a subprocess, without blocking the event loop.
+
+    Works like 'execute', but callbacks can also be coroutine functions. The command
+    is started in its own process group, which is killed if the timeout is reached or
+    the task is cancelled. If a semaphore is provided, it is held while the command runs.
+    """
+
+    if semaphore is not None:
+        async with semaphore:
+            return await execute_async(
+                cmd,
+                *args,
+                stdout_callback=stdout_callback,
+                stderr_callback=stderr_callback,
+                cwd=cwd,
+                env_vars=env_vars,
+                log_dir=log_dir,
+                log_name=log_name,
+                buffer_size=buffer_size,
+                timeout=timeout,
+            )
+
+    _args = list(args)
+
+    process_env_vars = os.environ.copy()
+    if env_vars:
+        process_env_vars.update(env_vars)
+
+    stdout_output, stderr_output = create_output_captures(
+        cmd, log_dir=log_dir, log_name=log_name, buffer_size=buffer_size
+    )
+
+    async def _pump(
+        reader: asyncio.StreamReader,
+        capture: OutputCapture,
+        callback: Union[Callable, None],
+    ) -> None:
+
+        splitter = LineSplitter()
+        while True:
+            data = await reader.read(OUTPUT_CHUNK_SIZE)
+            for line in splitter.feed(data, final=not data):
+                capture.append(line)
+                if callback:
+                    result = callback(line)
+                    if inspect.isawaitable(result):
+                        await result
+            if not data:
+                break
+
+    start_time = time.monotonic()
+    proc = Popen(
+        [cmd, *_args],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        cwd=cwd,
+        env=process_env_vars,
+        start_new_session=True,
+    )
+    waiter = _wait_in_thread(proc, start_time=start_time)
+    transports: List[asyncio.BaseTransport] = []
+
+    timed_out = False
+    try:
+        stdout_transport, stdout_reader = await _connect_reader(proc.stdout)
+        transports.append(stdout_transport)
+        stderr_transport, stderr_reader = await _connect_reader(proc.stderr)
+        transports.append(stderr_transport)
+
+        async def _run() -> None:
+
+            await asyncio.gather(
+                _pump(stdout_reader, stdout_output, stdout_callback),
+                _pump(stderr_reader, stderr_output, stderr_callback),
+            )
+            await asyncio.shield(waiter)
+
+        try:
+            await asyncio.wait_for(_run(), timeout=timeout)
+        except asyncio.TimeoutError:
+            timed_out = True
+            await _kill_process_group(proc, waiter)
+    except BaseException:
+        # cancelled (or failed) at any point after the process was started
+        await asyncio.shield(_kill_process_group(proc, waiter))
+        raise
+    finally:
+        for transport in transports:
+            transport.close()
+        # pipes that were never connected to a transport
+        for pipe in (proc.stdout, proc.stderr):
+            if pipe is not None and not pipe.closed:
+                pipe.close()
+        stdout_output.close()
+        stderr_output.close()
+
+    resource_usage = waiter.result()
+    run_details = create_run_details(
+        cmd,
+        _args,
+        proc.returncode,  # type: ignore
+        stdout_output,
+        stderr_output,
+        resource_usage=resource_usage,
+    )
+
+    if timed_out:
+        raise ExecutionException(
+            f"Timeout ({timeout}s) running command '{cmd} {' '.join(args)}'",
+            run_details=run_details,
+        )
+    if run_details.exit_code != 0:
+        raise ExecutionException(
+            f"Failed to run command '{cmd} {' '.join(args)}'", run_details=run_details
+        )
+    return run_details
+
+
+class MultiplexedExecution(object):
+    """Runs several commands concurrently, and merges their output into one labelled stream.
+
+    Usage:
+
+        execution = MultiplexedExecution(max_concurrency=4)
+        execution.add("build-a", "rattler-build", "build", ...)
+        execution.add("build-b", "rattler-build", "build", ...)
+        async for label, stream, line in execution.stream():
+            ...
+        execution.results  # label -> RunDetails or exception
+    """
+
+    def __init__(
+        self, max_concurrency: Union[None, int] = None, queue_size: int = 1024
+    ) -> None:
+
+        if max_concurrency is None:
+            max_concurrency = os.cpu_count() or 1
+        self._max_concurrency: int = max_concurrency
+        self._queue_size: int = queue_size
+        self._commands: Dict[str, Tuple[str, Tuple[str, ...], Dict[str, Any]]] = {}
+        self._results: Dict[str, Union["RunDetails", Exception]] = {}
+
+    def add(self, label: str, cmd: str, *args: str, **kwargs: Any) -> None:
+        """Add a command, 'kwargs' are forwarded to 'execute_async'."""
+
+        if label in self._commands.keys():
+            raise Exception(f"Duplicate command label: {label}")
+        self._commands[label] = (cmd, args, kwargs)
+
+    @property
+    def results(self) -> Dict[str, Union["RunDetails", Exception]]:
+        return self._results
+
+    async def stream(self) -> AsyncIterator[Tuple[str, str, str]]:
+        """Run all commands, and yield (label, stream, line) tuples until all of them finished."""
+
+        semaphore = asyncio.Semaphore(self._max_concurrency)
+        # a bounded queue, so slow consumers slow down the processes, instead of buffering
+        queue: "asyncio.Queue[Union[None, Tuple[str, str, str]]]" = asyncio.Queue(
+            maxsize=self._queue_size
+        )
+
+        async def _run(label: str, cmd: str, args: Tuple[str, ...], kwargs) -> None:
+
+            async def _stdout(line: str) -> None:
+                await queue.put((label, STDOUT, line))
+
+            async def _stderr(line: str) -> None:
+                await queue.put((label, STDERR, line))
+
+            try:
+                self._results[label] = await execute_async(
+                    cmd,
+                    *args,
+                    stdout_callback=_stdout,
+                    stderr_callback=_stderr,
+                    semaphore=semaphore,
+                    **kwargs,
+                )
+            except Exception as e:
+                self._results[label] = e
+
+        async def _run_all() -> None:
+
+            await asyncio.gather(
+                *(
+                    _run(label, cmd, args, kwargs)
+                    for label, (cmd, args, kwargs) in self._commands.items()
+                )
+            )
+            await queue.put(None)
+
+        runner = asyncio.ensure_future(_run_all())
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                yield item
+        finally:
+            # the consumer stopped early, or was cancelled: kill all processes
+            if not runner.done():
+                runner.cancel()
+                try:
+                    await runner
+                except asyncio.CancelledError:
+                    pass
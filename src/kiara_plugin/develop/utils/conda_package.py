@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""Conversion between the '.tar.bz2' and '.conda' package formats, without re-building a package.
+
+Both formats contain the same files: a '.tar.bz2' package is a single (bzip2
+compressed) tarball, a '.conda' package is an uncompressed zip file, containing a
+'metadata.json' file, and two zstd compressed tarballs, one for the 'info/' folder
+and one for everything else. Tar members are copied verbatim, so the metadata
+(incl. the file hashes in 'info/paths.json') of the converted package is identical.
+
+Writing/reading '.conda' packages requires the (optional) 'zstandard' package.
+"""
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import zipfile
+from pathlib import Path
+from typing import IO, Dict, Iterator, Tuple, Union
+
+import structlog
+
+logger = structlog.getLogger()
+
+CONDA_PACKAGE_EXTENSIONS: Dict[str, str] = {"tarbz2": ".tar.bz2", "conda": ".conda"}
+CONDA_PKG_FORMAT_VERSION = 2
+CONDA_ZSTD_LEVEL = 19
+
+
+def zstandard_available() -> bool:
+
+    try:
+        import zstandard  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def get_package_format(path: Union[str, Path]) -> str:
+
+    name = Path(path).name
+    for package_format, extension in CONDA_PACKAGE_EXTENSIONS.items():
+        if name.endswith(extension):
+            return package_format
+    raise Exception(f"Not a conda package: {path}")
+
+
+def get_package_stem(path: Union[str, Path]) -> str:
+    """Return the file name of a package, without its extension (e.g. 'kiara-0.5.0-py_0')."""
+
+    name = Path(path).name
+    return name[: -len(CONDA_PACKAGE_EXTENSIONS[get_package_format(path)])]
+
+
+def _copy_members(
+    source: tarfile.TarFile,
+) -> Iterator[Tuple[tarfile.TarInfo, Union[None, IO[bytes]]]]:
+
+    for info in source:
+        yield info, source.extractfile(info) if info.isfile() else None
+
+
+def _write_tar_bz2(source_path: Path, target: IO[bytes]) -> None:
+
+    import zstandard
+
+    with zipfile.ZipFile(source_path) as zf, tarfile.open(
+        fileobj=target, mode="w|bz2"
+    ) as tar_out:
+        names = zf.namelist()
+        # 'info/' first, like conda-build does
+        for prefix in ("info-", "pkg-"):
+            for name in names:
+                if not (name.startswith(prefix) and name.endswith(".tar.zst")):
+                    continue
+                with zf.open(name) as f:
+                    reader = zstandard.ZstdDecompressor().stream_reader(f)
+                    with tarfile.open(fileobj=reader, mode="r|") as tar_in:
+                        for info, fileobj in _copy_members(tar_in):
+                            tar_out.addfile(info, fileobj)
+
+
+def _write_conda(source_path: Path, target: IO[bytes], stem: str, temp_dir: str) -> None:
+
+    import zstandard
+
+    # the members are read once, and split into both inner tarballs at the same time
+    inner_paths = {
+        "info": os.path.join(temp_dir, f"info-{stem}.tar.zst"),
+        "pkg": os.path.join(temp_dir, f"pkg-{stem}.tar.zst"),
+    }
+    files = {k: open(v, "wb") for k, v in inner_paths.items()}
+    try:
+        # a compressor can't be used for two streams at the same time
+        writers = {
+            k: zstandard.ZstdCompressor(
+                level=CONDA_ZSTD_LEVEL, threads=-1
+            ).stream_writer(f, closefd=False)
+            for k, f in files.items()
+        }
+        tars = {k: tarfile.open(fileobj=w, mode="w|") for k, w in writers.items()}
+        with tarfile.open(source_path, mode="r|bz2") as tar_in:
+            for info, fileobj in _copy_members(tar_in):
+                key = "info" if info.name.startswith("info/") else "pkg"
+                tars[key].addfile(info, fileobj)
+        for key in tars.keys():
+            tars[key].close()
+            writers[key].close()
+    finally:
+        for f in files.values():
+            f.close()
+
+    with zipfile.ZipFile(target, mode="w", compression=zipfile.ZIP_STORED) as zf:
+        zf.writestr(
+            "metadata.json",
+            json.dumps({"conda_pkg_format_version": CONDA_PKG_FORMAT_VERSION}),
+        )
+        for key in ("pkg", "info"):
+            zf.write(inner_paths[key], arcname=os.path.basename(inner_paths[key]))
+
+
+def transcode_package(
+    source: Union[str, Path], package_format: str, target_dir: Union[None, str, Path] = None
+) -> Path:
+    """Convert a conda package into another format, and return the path of the new package.
+
+    The new package is written next to the source package (or into 'target_dir'),
+    and only moved into place once it is complete.
+    """
+
+    source = Path(source)
+    source_format = get_package_format(source)
+    if package_format not in CONDA_PACKAGE_EXTENSIONS.keys():
+        raise Exception(
+            f"Invalid package format '{package_format}', allowed: {', '.join(CONDA_PACKAGE_EXTENSIONS.keys())}"
+        )
+
+    stem = get_package_stem(source)
+    target_dir = Path(target_dir) if target_dir is not None else source.parent
+    target_dir.mkdir(parents=True, exist_ok=True)
+    target = target_dir / f"{stem}{CONDA_PACKAGE_EXTENSIONS[package_format]}"
+
+    if package_format == source_format:
+        if target != source:
+            shutil.copy2(source, target)
+        return target
+
+    with tempfile.TemporaryDirectory(dir=target_dir, prefix=".transcode.") as temp_dir:
+        temp_target = os.path.join(temp_dir, target.name)
+        with open(temp_target, "wb") as f:
+            if package_format == "conda":
+                _write_conda(source, f, stem=stem, temp_dir=temp_dir)
+            else:
+                _write_tar_bz2(source, f)
+        os.replace(temp_target, target)
+
+    logger.debug(
+        "conda_package.transcoded", source=source.as_posix(), target=target.as_posix()
+    )
+    return target
+
+
+def read_package_file(path: Union[str, Path], member: str) -> bytes:
+    """Read a single file (e.g. 'info/index.json') from a conda package, in either format."""
+
+    path = Path(path)
+    if get_package_format(path) == "tarbz2":
+        with tarfile.open(path, mode="r|bz2") as tar:
+            for info in tar:
+                if info.name == member and info.isfile():
+                    return tar.extractfile(info).read()  # type: ignore
+        raise Exception(f"No file '{member}' in package: {path}")
+
+    import zstandard
+
+    prefix = "info-" if member.startswith("info/") else "pkg-"
+    with zipfile.ZipFile(path) as zf:
+        for name in zf.namelist():
+            if not (name.startswith(prefix) and name.endswith(".tar.zst")):
+                continue
+            with zf.open(name) as f:
+                reader = zstandard.ZstdDecompressor().stream_reader(f)
+                with tarfile.open(fileobj=reader, mode="r|") as tar:
+                    for info in tar:
+                        if info.name == member and info.isfile():
+                            return tar.extractfile(info).read()  # type: ignore
+    raise Exception(f"No file '{member}' in package: {path}")
@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+"""Transitive dependency resolution for Python packages published on PyPI."""
+from typing import Any, Dict, Iterable, List, Mapping, Set, Tuple, Union, cast
+
+from packaging.markers import default_environment
+from packaging.requirements import InvalidRequirement, Requirement
+from packaging.utils import canonicalize_name
+from pydantic import BaseModel, Field
+
+from kiara_plugin.develop.utils.graph_utils import (
+    DependencyCycleException,
+    topological_order,
+)
+from kiara_plugin.develop.utils.pypi import (
+    PyPiMetadataFetcher,
+    get_pypi_metadata_fetcher,
+)
+from kiara_plugin.develop.utils.releases import ReleaseIndex
+
+
+def create_node_id(pkg_name: str, version: str, extras: Iterable[str]) -> str:
+
+    _extras = sorted(extras)
+    if _extras:
+        return f"{canonicalize_name(pkg_name)}[{','.join(_extras)}]=={version}"
+    else:
+        return f"{canonicalize_name(pkg_name)}=={version}"
+
+
+class DependencyNode(BaseModel):
+
+    pkg_name: str = Field(description="The (canonical) package name.")
+    pkg_version: str = Field(description="The resolved package version.")
+    extras: List[str] = Field(
+        description="The extras this package is required with.", default_factory=list
+    )
+    requirements: List[str] = Field(
+        description="The requirements that apply to this package, with the selected extras.",
+        default_factory=list,
+    )
+    dependencies: List[str] = Field(
+        description="The ids of the nodes this package depends on.",
+        default_factory=list,
+    )
+
+    @property
+    def node_id(self) -> str:
+        return create_node_id(self.pkg_name, self.pkg_version, self.extras)
+
+
+class DependencyGraph(object):
+    """The transitive closure of the requirements of one or several packages.
+
+    Every (name, version, extras) combination is resolved only once, and all the
+    packages of one level of the graph are fetched in parallel.
+    """
+
+    def __init__(
+        self,
+        fetcher: Union[None, PyPiMetadataFetcher] = None,
+        marker_environment: Union[None, Mapping[str, str]] = None,
+        allow_prereleases: bool = False,
+    ) -> None:
+
+        if fetcher is None:
+            fetcher = get_pypi_metadata_fetcher()
+        self._fetcher: PyPiMetadataFetcher = fetcher
+
+        env: Dict[str, str] = dict(cast(Mapping[str, str], default_environment()))
+        if marker_environment:
+            env.update(marker_environment)
+        self._marker_environment: Dict[str, str] = env
+        self._allow_prereleases: bool = allow_prereleases
+
+        self._nodes: Dict[str, DependencyNode] = {}
+        self._roots: List[str] = []
+        self._selected_versions: Dict[Tuple[str, str], str] = {}
+
+    @property
+    def nodes(self) -> Mapping[str, DependencyNode]:
+        return self._nodes
+
+    @property
+    def roots(self) -> List[DependencyNode]:
+        return [self._nodes[r] for r in self._roots]
+
+    def get_node(self, node_id: str) -> DependencyNode:
+        return self._nodes[node_id]
+
+    def resolve(
+        self,
+        pkg_name: str,
+        version: Union[str, None] = None,
+        extras: Union[None, Iterable[str]] = None,
+    ) -> DependencyNode:
+        """Resolve the dependency tree for a package that is published on PyPI."""
+
+        pkg_data = self._fetcher.get(pkg_name=pkg_name, version=version)
+        return self.resolve_metadata(pkg_data["info"], extras=extras)
+
+    def resolve_metadata(
+        self, pkg_metadata: Mapping[str, Any], extras: Union[None, Iterable[str]] = None
+    ) -> DependencyNode:
+        """Resolve the dependency tree, starting with already retrieved package metadata.
+
+        This can be used for local projects, by passing in the result of 'get_pkg_metadata_from_project_folder'.
+        """
+
+        node = self._create_node(pkg_metadata, extras=extras or [])
+        if node.node_id not in self._nodes.keys():
+            self._nodes[node.node_id] = node
+            self._expand([(node.node_id, r) for r in self._parse_reqs(node)])
+        else:
+            node = self._nodes[node.node_id]
+
+        if node.node_id not in self._roots:
+            self._roots.append(node.node_id)
+        return node
+
+    def _parse_reqs(self, node: DependencyNode) -> List[Requirement]:
+
+        result = []
+        for r in node.requirements:
+            try:
+                result.append(Requirement(r))
+            except InvalidRequirement as e:
+                raise Exception(
+                    f"Can't parse requirement '{r}' of package '{node.pkg_name}': {e}"
+                )
+        return result
+
+    def _applies(self, req: Requirement, extras: Iterable[str]) -> bool:
+
+        if req.marker is None:
+            return True
+
+        for extra in list(extras) or [""]:
+            env = dict(self._marker_environment)
+            env["extra"] = extra
+            if req.marker.evaluate(env):
+                return True
+        return False
+
+    def _create_node(
+        self, pkg_metadata: Mapping[str, Any], extras: Iterable[str]
+    ) -> DependencyNode:
+
+        _extras = sorted(extras)
+        reqs = []
+        for r in pkg_metadata.get("requires_dist", None) or []:
+            try:
+                req = Requirement(r)
+            except InvalidRequirement as e:
+                raise Exception(
+                    f"Can't parse requirement '{r}' of package '{pkg_metadata['name']}': {e}"
+                )
+            if self._applies(req, _extras):
+                reqs.append(r)
+
+        return DependencyNode(
+            pkg_name=canonicalize_name(pkg_metadata["name"]),
+            pkg_version=pkg_metadata["version"],
+            extras=_extras,
+            requirements=reqs,
+        )
+
+    def _select_version(self, req: Requirement, pkg_data: Mapping[str, Any]) -> str:
+
+        name = canonicalize_name(req.name)
+        spec_key = (name, str(req.specifier))
+        if spec_key in self._selected_versions.keys():
+            return self._selected_versions[spec_key]
+
+        # the version in the 'info' section is not necessarily the latest stable,
+        # not yanked release (depending on the metadata backend)
+        index = ReleaseIndex.from_pkg_data(pkg_data)
+        match: Union[None, str]
+        if not req.specifier:
+            match = index.latest(include_prereleases=self._allow_prereleases)
+        else:
+            match = index.latest_matching(
+                req.specifier, include_prereleases=self._allow_prereleases
+            )
+        if match is None:
+            raise Exception(f"No release of '{req.name}' matches: {req.specifier}")
+
+        self._selected_versions[spec_key] = match
+        return match
+
+    def _expand(self, pending: List[Tuple[str, Requirement]]) -> None:
+
+        while pending:
+
+            # select a version for every requirement of this level, this needs the full
+            # release list for every package
+            latest_data = self._fetcher.get_many(
+                {(r.name, None) for _, r in pending}
+            )
+
+            edges: List[Tuple[str, str]] = []
+            new_nodes: Dict[str, Tuple[str, str, List[str]]] = {}
+            for parent_id, req in pending:
+                pkg_data = latest_data[(req.name, None)]
+                version = self._select_version(req, pkg_data)
+                extras = sorted(req.extras)
+                node_id = create_node_id(req.name, version, extras)
+                edges.append((parent_id, node_id))
+                if node_id not in self._nodes.keys():
+                    new_nodes[node_id] = (req.name, version, extras)
+
+            # then fetch the metadata of all new nodes in parallel
+            pinned_data = self._fetcher.get_many(
+                {
+                    (name, version)
+                    for name, version, _ in new_nodes.values()
+                    if latest_data[(name, None)]["info"]["version"] != version
+                }
+            )
+
+            next_pending: List[Tuple[str, Requirement]] = []
+            for node_id, (name, version, extras) in new_nodes.items():
+                pkg_data = pinned_data.get((name, version), latest_data[(name, None)])
+                node = self._create_node(pkg_data["info"], extras=extras)
+                # some packages normalize their version string differently
+                node.pkg_version = version
+                self._nodes[node_id] = node
+                next_pending.extend((node_id, r) for r in self._parse_reqs(node))
+
+            for parent_id, node_id in edges:
+                parent = self._nodes[parent_id]
+                if node_id not in parent.dependencies:
+                    parent.dependencies.append(node_id)
+
+            pending = next_pending
+
+    def packages(self) -> Dict[str, str]:
+        """Return all packages in this graph, with their resolved version."""
+
+        return {n.pkg_name: n.pkg_version for n in self._nodes.values()}
+
+    def package_dependencies(self) -> Dict[str, Set[str]]:
+        """Return the dependencies of every package, with all extras merged.
+
+        Self-references (which are common for packages that have an extra that
+        combines several other extras) are ignored.
+        """
+
+        result: Dict[str, Set[str]] = {}
+        for node in self._nodes.values():
+            deps = result.setdefault(node.pkg_name, set())
+            for dep_id in node.dependencies:
+                dep_name = self._nodes[dep_id].pkg_name
+                if dep_name != node.pkg_name:
+                    deps.add(dep_name)
+        return result
+
+    def find_cycles(self) -> List[List[str]]:
+        """Return all dependency cycles between packages (strongly connected components)."""
+
+        graph = self.package_dependencies()
+        index: Dict[str, int] = {}
+        lowlink: Dict[str, int] = {}
+        stack: List[str] = []
+        on_stack: Set[str] = set()
+        cycles: List[List[str]] = []
+
+        for start in sorted(graph.keys()):
+            if start in index.keys():
+                continue
+
+            # iterative version of Tarjan's algorithm, to not run into recursion limits
+            work: List[Tuple[str, Iterable[str]]] = [(start, iter(sorted(graph[start])))]
+            index[start] = lowlink[start] = len(index)
+            stack.append(start)
+            on_stack.add(start)
+            while work:
+                node, children = work[-1]
+                child = next(children, None)  # type: ignore
+                if child is not None:
+                    if child not in index.keys():
+                        index[child] = lowlink[child] = len(index)
+                        stack.append(child)
+                        on_stack.add(child)
+                        work.append((child, iter(sorted(graph[child]))))
+                    elif child in on_stack:
+                        lowlink[node] = min(lowlink[node], index[child])
+                    continue
+
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+
+                if lowlink[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    if len(component) > 1:
+                        cycles.append(sorted(component))
+
+        return cycles
+
+    def topological_order(self) -> List[str]:
+        """Return all packages, ordered so that every package comes after its dependencies."""
+
+        try:
+            return topological_order(self.package_dependencies())
+        except DependencyCycleException:
+            cycles = self.find_cycles()
+            raise Exception(
+                f"Can't determine build order, dependency cycle(s) detected: {cycles}"
+            )
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""Streaming, resumable and checksum-verified downloads."""
+import hashlib
+import os
+import shutil
+import tarfile
+import tempfile
+from pathlib import Path
+from typing import Union
+
+import httpx
+import structlog
+
+logger = structlog.getLogger()
+
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_MAX_ATTEMPTS = 5
+
+
+def get_partial_path(target: Path) -> Path:
+    """Return the path an (interrupted) download of 'target' is kept at."""
+
+    return target.parent / f".{target.name}.part"
+
+
+def _hash_file(path: Union[str, Path]) -> "hashlib._Hash":
+
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(DOWNLOAD_CHUNK_SIZE):
+            sha.update(chunk)
+    return sha
+
+
+def get_file_sha256(path: Union[str, Path]) -> str:
+    """Return the (hex) sha256 digest of a file, read in chunks."""
+
+    return _hash_file(path).hexdigest()
+
+
+def download_file(
+    url: str,
+    target: Union[str, Path],
+    sha256: Union[None, str] = None,
+    client: Union[None, httpx.Client] = None,
+    max_attempts: int = DOWNLOAD_MAX_ATTEMPTS,
+) -> Path:
+    """Download a file in chunks, and move it into place once it is complete (and verified).
+
+    Data is written to a '.part' file next to the target. If the connection breaks,
+    or a previous process was interrupted, the download is resumed from there, using
+    an HTTP 'Range' request (if the server doesn't support those, it starts over).
+    If a 'sha256' digest is provided, and the download doesn't match it, the partial
+    file is removed and an exception is raised. The digest is computed while the
+    data is written, only the already downloaded part of a resumed download is read
+    again.
+    """
+
+    if client is None:
+        from kiara_plugin.develop.utils.pypi import get_http_client
+
+        client = get_http_client()
+
+    target = Path(target)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    partial = get_partial_path(target)
+
+    # the digest of the first 'hashed' bytes of the partial file
+    sha = hashlib.sha256()
+    hashed = 0
+
+    attempt = 0
+    while True:
+        attempt += 1
+        offset = partial.stat().st_size if partial.exists() else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        try:
+            with client.stream("GET", url, headers=headers) as response:
+                if response.status_code == 416:
+                    # the partial file is already complete (or invalid), verified below
+                    if sha256 is not None and hashed != offset:
+                        sha, hashed = _hash_file(partial), offset
+                else:
+                    response.raise_for_status()
+                    resumed = response.status_code == 206
+                    if offset and not resumed:
+                        logger.debug("download.restart", url=url, offset=offset)
+                    if not resumed:
+                        sha, hashed = hashlib.sha256(), 0
+                    elif sha256 is not None and hashed != offset:
+                        # left over by another process, or by an interrupted write
+                        sha, hashed = _hash_file(partial), offset
+                    with open(partial, "ab" if resumed else "wb") as f:
+                        # chunks as they arrive, so an interruption loses as little as possible
+                        for chunk in response.iter_bytes():
+                            f.write(chunk)
+                            sha.update(chunk)
+                            hashed += len(chunk)
+            break
+        except httpx.TransportError as e:
+            if attempt >= max_attempts:
+                raise
+            logger.debug("download.interrupted", url=url, attempt=attempt, reason=str(e))
+
+    if sha256 is not None:
+        digest = sha.hexdigest()
+        if digest != sha256.lower():
+            os.unlink(partial)
+            raise Exception(
+                f"Invalid sha256 digest for '{url}': expected {sha256.lower()}, got {digest}"
+            )
+
+    os.replace(partial, target)
+    logger.debug("download.finished", url=url, path=target.as_posix())
+    return target
+
+
+def extract_tar_member(
+    archive: Union[str, Path], member: str, target: Union[str, Path]
+) -> Path:
+    """Extract a single file from a (compressed) tar archive, without reading the whole archive into memory.
+
+    The archive is read as a stream, and the file is moved into place once it is complete.
+    """
+
+    target = Path(target)
+    target.parent.mkdir(parents=True, exist_ok=True)
+
+    with tarfile.open(archive, mode="r|*") as tar:
+        for info in tar:
+            name = info.name[2:] if info.name.startswith("./") else info.name
+            if name != member or not info.isfile():
+                continue
+
+            source = tar.extractfile(info)
+            if source is None:
+                break
+            handle, temp_path = tempfile.mkstemp(
+                dir=target.parent, prefix=f".{target.name}."
+            )
+            try:
+                with os.fdopen(handle, "wb") as f:
+                    shutil.copyfileobj(source, f, DOWNLOAD_CHUNK_SIZE)
+                os.chmod(temp_path, info.mode & 0o777)
+                os.replace(temp_path, target)
+            except Exception:
+                os.unlink(temp_path)
+                raise
+            return target
+
+    raise Exception(f"No file '{member}' in archive: {archive}")
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""Helpers for (dependency) graphs, given as a map of each node to the nodes it depends on."""
+import heapq
+from typing import Dict, Iterable, List, Mapping, Set
+
+
+class DependencyCycleException(Exception):
+    """Raised if there is no valid order for the nodes of a graph."""
+
+    def __init__(self, nodes: Iterable[str]):
+
+        self.nodes: List[str] = sorted(nodes)
+        super().__init__(f"Dependency cycle between: {', '.join(self.nodes)}")
+
+
+def topological_order(graph: Mapping[str, Iterable[str]]) -> List[str]:
+    """Return all nodes of a graph, ordered so that every node comes after its dependencies.
+
+    Of the nodes that are ready at the same time, the alphabetically first one comes
+    first, so the order is stable. Dependencies that are not nodes of the graph are
+    ignored. If there is a cycle, a 'DependencyCycleException' with all nodes that
+    could not be ordered (the cycle(s), and the nodes that depend on them) is raised.
+    """
+
+    remaining: Dict[str, int] = {}
+    dependents: Dict[str, List[str]] = {node: [] for node in graph.keys()}
+    for node, deps in graph.items():
+        _deps: Set[str] = {d for d in deps if d in dependents.keys()}
+        remaining[node] = len(_deps)
+        for dep in _deps:
+            dependents[dep].append(node)
+
+    ready = [node for node, count in remaining.items() if not count]
+    heapq.heapify(ready)
+    order: List[str] = []
+    while ready:
+        node = heapq.heappop(ready)
+        order.append(node)
+        for other in dependents[node]:
+            remaining[other] -= 1
+            if not remaining[other]:
+                heapq.heappush(ready, other)
+
+    if len(order) != len(remaining):
+        raise DependencyCycleException(set(remaining.keys()) - set(order))
+    return order
@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+"""Normalization of free-form license strings and trove classifiers to SPDX ids."""
+import difflib
+import json
+import os
+import re
+import threading
+from typing import Dict, Iterable, Tuple, Union
+
+import structlog
+
+from kiara_plugin.develop.defaults import KIARA_DEV_LICENSE_INDEX_PATH
+
+logger = structlog.getLogger()
+
+# common free-form license strings that can't be derived from the SPDX ids, strings
+# that don't say which version of a license is meant (e.g. 'BSD', 'GPL') are left out
+LICENSE_ALIASES: Dict[str, str] = {
+    "mit license": "MIT",
+    "the mit license": "MIT",
+    "expat": "MIT",
+    "new bsd": "BSD-3-Clause",
+    "new bsd license": "BSD-3-Clause",
+    "modified bsd": "BSD-3-Clause",
+    "bsd-3": "BSD-3-Clause",
+    "3-clause bsd": "BSD-3-Clause",
+    "simplified bsd": "BSD-2-Clause",
+    "bsd-2": "BSD-2-Clause",
+    "2-clause bsd": "BSD-2-Clause",
+    "apache 2": "Apache-2.0",
+    "apache 2.0": "Apache-2.0",
+    "apache license 2.0": "Apache-2.0",
+    "apache license, version 2.0": "Apache-2.0",
+    "apache software license 2.0": "Apache-2.0",
+    "asl 2": "Apache-2.0",
+    "gplv2": "GPL-2.0-only",
+    "gplv2+": "GPL-2.0-or-later",
+    "gplv3": "GPL-3.0-only",
+    "gplv3+": "GPL-3.0-or-later",
+    "lgplv2": "LGPL-2.1-only",
+    "lgplv2+": "LGPL-2.1-or-later",
+    "lgplv3": "LGPL-3.0-only",
+    "lgplv3+": "LGPL-3.0-or-later",
+    "agplv3": "AGPL-3.0-only",
+    "agplv3+": "AGPL-3.0-or-later",
+    "mpl 2": "MPL-2.0",
+    "mpl 2.0": "MPL-2.0",
+    "mozilla public license 2.0": "MPL-2.0",
+    "mozilla public license 2.0 (mpl 2.0)": "MPL-2.0",
+    "psf": "PSF-2.0",
+    "psf license": "PSF-2.0",
+    "python software foundation license": "PSF-2.0",
+    "isc license": "ISC",
+    "isc license (iscl)": "ISC",
+    "public domain": "LicenseRef-Public-Domain",
+    "the unlicense (unlicense)": "Unlicense",
+    "cc0 1.0 universal (cc0 1.0) public domain dedication": "CC0-1.0",
+    "zope public license": "ZPL-2.1",
+    "eclipse public license 2.0 (epl-2.0)": "EPL-2.0",
+    "gnu general public license v2 (gplv2)": "GPL-2.0-only",
+    "gnu general public license v2 or later (gplv2+)": "GPL-2.0-or-later",
+    "gnu general public license v3 (gplv3)": "GPL-3.0-only",
+    "gnu general public license v3 or later (gplv3+)": "GPL-3.0-or-later",
+    "gnu lesser general public license v2 (lgplv2)": "LGPL-2.1-only",
+    "gnu lesser general public license v2 or later (lgplv2+)": "LGPL-2.1-or-later",
+    "gnu lesser general public license v3 (lgplv3)": "LGPL-3.0-only",
+    "gnu lesser general public license v3 or later (lgplv3+)": "LGPL-3.0-or-later",
+    "gnu affero general public license v3": "AGPL-3.0-only",
+    "gnu affero general public license v3 or later (agplv3+)": "AGPL-3.0-or-later",
+}
+
+# license names without a version, which are never mapped to a (guessed) version
+UNVERSIONED_LICENSE_KEYS = ["agpl", "apache", "bsd", "gpl", "lgpl", "mpl"]
+
+LICENSE_FAMILIES: Dict[str, str] = {
+    "AGPL": "AGPL",
+    "LGPL": "LGPL",
+    "GPL-2": "GPL2",
+    "GPL-3": "GPL3",
+    "GPL": "GPL",
+    "BSD": "BSD",
+    "0BSD": "BSD",
+    "MIT": "MIT",
+    "APACHE": "APACHE",
+    "PSF": "PSF",
+    "PYTHON": "PSF",
+    "MPL": "MOZILLA",
+    "CC0": "PUBLIC-DOMAIN",
+    "UNLICENSE": "PUBLIC-DOMAIN",
+    "CC-": "CC",
+    "LICENSEREF-PUBLIC-DOMAIN": "PUBLIC-DOMAIN",
+}
+
+# bump if the way aliases are created changes, to invalidate persisted indexes
+LICENSE_INDEX_VERSION = 2
+
+EXPRESSION_OPERATORS = re.compile(r"\s+(AND|OR|WITH)\s+", re.IGNORECASE)
+INVALID_LICENSE_REF_CHARS = re.compile(r"[^A-Za-z0-9.\-]+")
+NUMBERS = re.compile(r"\d+")
+
+
+def create_alias_key(license: str) -> str:
+    return re.sub(r"[^a-z0-9+]+", "-", license.strip().lower()).strip("-")
+
+
+def get_license_family(spdx_id: str) -> Union[None, str]:
+    """Return the conda license family for a (single) SPDX license id."""
+
+    _id = spdx_id.upper()
+    for prefix, family in LICENSE_FAMILIES.items():
+        if _id.startswith(prefix):
+            return family
+    if _id.startswith("LICENSEREF-"):
+        return "OTHER"
+    return None
+
+
+class LicenseIndex(object):
+    """A lookup table of license aliases to SPDX ids.
+
+    The table is built from the license index that comes with 'license_expression'
+    once, and persisted to the dev cache folder. Lookups are a dict access, with a
+    fuzzy match as fallback for strings that don't match any alias exactly (only
+    for aliases with the same version numbers, a typo must not change a version).
+    """
+
+    def __init__(self, aliases: Dict[str, str]) -> None:
+
+        self._aliases: Dict[str, str] = aliases
+        self._fuzzy_matches: Dict[str, Union[None, str]] = {}
+
+    @classmethod
+    def create(cls) -> "LicenseIndex":
+
+        from license_expression import get_license_index
+
+        aliases: Dict[str, str] = {}
+        for item in get_license_index():
+            spdx_id = item.get("spdx_license_key", None)
+            if not spdx_id or item.get("is_exception", False):
+                continue
+            if spdx_id.startswith("LicenseRef-"):
+                continue
+            aliases.setdefault(create_alias_key(spdx_id), spdx_id)
+            aliases.setdefault(create_alias_key(item["license_key"]), spdx_id)
+            for other in item.get("other_spdx_license_keys", []):
+                if not other.startswith("LicenseRef-"):
+                    aliases.setdefault(create_alias_key(other), spdx_id)
+
+        for alias, spdx_id in LICENSE_ALIASES.items():
+            aliases[create_alias_key(alias)] = spdx_id
+        for key in UNVERSIONED_LICENSE_KEYS:
+            aliases.pop(key, None)
+
+        return cls(aliases=aliases)
+
+    @classmethod
+    def load(cls, path: str = KIARA_DEV_LICENSE_INDEX_PATH) -> "LicenseIndex":
+        """Load the persisted index, or create (and persist) it if it doesn't exist or is outdated."""
+
+        from importlib.metadata import version
+
+        le_version = version("license-expression")
+
+        if os.path.isfile(path):
+            try:
+                with open(path, "rt") as f:
+                    data = json.load(f)
+                if (
+                    data.get("license_expression_version", None) == le_version
+                    and data.get("version", None) == LICENSE_INDEX_VERSION
+                ):
+                    return cls(aliases=data["aliases"])
+            except Exception as e:
+                logger.debug("license_index.invalid", path=path, reason=str(e))
+
+        index = cls.create()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wt") as f:
+            json.dump(
+                {
+                    "version": LICENSE_INDEX_VERSION,
+                    "license_expression_version": le_version,
+                    "aliases": index._aliases,
+                },
+                f,
+            )
+        os.replace(temp_path, path)
+        return index
+
+    def lookup(self, license: str, fuzzy: bool = True) -> Union[None, str]:
+        """Return the SPDX id for a single license string, or 'None' if it can't be determined."""
+
+        key = create_alias_key(license)
+        spdx_id = self._aliases.get(key, None)
+        if spdx_id is None:
+            stripped = re.sub(r"(^the-|-licen[cs]e$)", "", key)
+            spdx_id = self._aliases.get(stripped, None)
+        if spdx_id is not None or not fuzzy:
+            return spdx_id
+
+        if key not in self._fuzzy_matches.keys():
+            numbers = NUMBERS.findall(key)
+            candidates = [
+                a for a in self._aliases.keys() if NUMBERS.findall(a) == numbers
+            ]
+            matches = difflib.get_close_matches(key, candidates, n=1, cutoff=0.9)
+            self._fuzzy_matches[key] = self._aliases[matches[0]] if matches else None
+        return self._fuzzy_matches[key]
+
+    def lookup_expression(self, license: str) -> Union[None, str]:
+        """Normalize every license in an SPDX-like expression (e.g. 'MIT or Apache 2.0')."""
+
+        tokens = EXPRESSION_OPERATORS.split(license.strip())
+        if len(tokens) == 1:
+            return None
+
+        result = []
+        for idx, token in enumerate(tokens):
+            if idx % 2 == 1:
+                result.append(token.upper())
+                continue
+            # exceptions (after 'WITH') are kept as they are
+            if idx > 0 and tokens[idx - 1].upper() == "WITH":
+                result.append(token.strip())
+                continue
+            spdx_id = self.lookup(token.strip("() "), fuzzy=False)
+            if spdx_id is None:
+                return None
+            result.append(spdx_id)
+        return " ".join(result)
+
+    def normalize(
+        self, license: Union[None, str], classifiers: Union[None, Iterable[str]] = None
+    ) -> Tuple[str, Union[None, str]]:
+        """Return the SPDX license (expression), and conda license family for a package.
+
+        If the license string can't be mapped, the 'License ::' trove classifiers
+        are tried. As a last resort, a 'LicenseRef-' id is created from the license
+        string.
+        """
+
+        if license and "\n" not in license.strip():
+            spdx_id = self.lookup(license, fuzzy=False)
+            if spdx_id:
+                return spdx_id, get_license_family(spdx_id)
+            expression = self.lookup_expression(license)
+            if expression:
+                return expression, None
+
+        for classifier in classifiers or []:
+            if not classifier.startswith("License ::"):
+                continue
+            spdx_id = self.lookup(classifier.split("::")[-1])
+            if spdx_id:
+                return spdx_id, get_license_family(spdx_id)
+
+        if license and "\n" not in license.strip():
+            spdx_id = self.lookup(license, fuzzy=True)
+            if spdx_id:
+                return spdx_id, get_license_family(spdx_id)
+
+        if not license:
+            license = "unknown"
+        else:
+            license = license.strip().splitlines()[0]
+        license_ref = INVALID_LICENSE_REF_CHARS.sub("-", license).strip("-")
+        return f"LicenseRef-{license_ref}", "OTHER"
+
+
+_LICENSE_INDEX: Union[None, LicenseIndex] = None
+_LICENSE_INDEX_LOCK = threading.Lock()
+
+
+def get_license_index() -> LicenseIndex:
+    """Return the process-wide license index."""
+
+    global _LICENSE_INDEX
+    with _LICENSE_INDEX_LOCK:
+        if _LICENSE_INDEX is None:
+            _LICENSE_INDEX = LicenseIndex.load()
+        return _LICENSE_INDEX
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""Rendering of (potentially very verbose) command output to the terminal."""
+import sys
+import threading
+import time
+from collections import deque
+from typing import Deque, List, TextIO, Tuple, Union
+
+from rich.console import Console, Group, RenderableType
+from rich.live import Live
+from rich.text import Text
+
+from kiara.utils.cli import terminal_print
+
+
+def default_stdout_print(msg):
+    terminal_print(f"[green]stdout[/green]: {msg}")
+
+
+def default_stderr_print(msg):
+    terminal_print(f"[red]stderr[/red]: {msg}")
+
+
+class OutputRenderer(object):
+    """Renders the output of a running command, without doing any work per line beyond a list append.
+
+    On a terminal, a live display shows the last 'tail_lines' lines, the current phase
+    and progress, and the line counts. It is refreshed at most 'max_fps' times per
+    second, by rich's refresh thread. If the output is not a terminal, lines are
+    written as plain text, in batches.
+
+    Usage:
+
+        with OutputRenderer(title="Building 'kiara'") as renderer:
+            execute(..., stdout_callback=renderer.stdout, stderr_callback=renderer.stderr)
+    """
+
+    def __init__(
+        self,
+        title: str = "",
+        tail_lines: int = 20,
+        max_fps: float = 10.0,
+        console: Union[None, Console] = None,
+        plain_output: Union[None, TextIO] = None,
+    ) -> None:
+
+        self._title: str = title
+        self._console: Console = console if console is not None else Console()
+        self._max_fps: float = max_fps
+        self._live_mode: bool = plain_output is None and self._console.is_terminal
+        self._plain_output: TextIO = (
+            plain_output if plain_output is not None else sys.stdout
+        )
+
+        self._lock = threading.Lock()
+        self._tail: Deque[Tuple[str, str]] = deque(maxlen=tail_lines)
+        self._stdout_lines: int = 0
+        self._stderr_lines: int = 0
+        self._phase: Union[None, str] = None
+        self._progress: Union[None, str] = None
+        self._start_time: float = time.monotonic()
+
+        self._pending: List[str] = []
+        self._last_flush: float = 0.0
+        self._live: Union[None, Live] = None
+
+    def __enter__(self) -> "OutputRenderer":
+
+        self._start_time = time.monotonic()
+        if self._live_mode:
+            self._live = Live(
+                self,
+                console=self._console,
+                refresh_per_second=self._max_fps,
+                transient=False,
+            )
+            self._live.start()
+        elif self._title:
+            self._plain_output.write(f"{self._title}\n")
+        return self
+
+    def __exit__(self, *args) -> None:
+
+        if self._live is not None:
+            self._live.stop()
+            self._live = None
+        else:
+            self._flush()
+
+    def _add_line(self, stream: str, line: str) -> None:
+
+        with self._lock:
+            self._tail.append((stream, line))
+            if stream == "stdout":
+                self._stdout_lines += 1
+            else:
+                self._stderr_lines += 1
+
+        if self._live_mode:
+            return
+
+        self._pending.append(f"{stream}: {line}")
+        now = time.monotonic()
+        if now - self._last_flush >= 1.0 / self._max_fps:
+            self._flush(now)
+
+    def _flush(self, now: Union[None, float] = None) -> None:
+
+        if self._pending:
+            self._pending.append("")
+            self._plain_output.write("\n".join(self._pending))
+            self._plain_output.flush()
+            self._pending = []
+        self._last_flush = now if now is not None else time.monotonic()
+
+    def stdout(self, line: str) -> None:
+        self._add_line("stdout", line)
+
+    def stderr(self, line: str) -> None:
+        self._add_line("stderr", line)
+
+    def set_phase(self, phase: Union[None, str]) -> None:
+
+        self._phase = phase
+        if not self._live_mode and phase:
+            self._pending.append(f"--- {phase}")
+
+    def set_progress(self, progress: Union[None, str]) -> None:
+        self._progress = progress
+
+    def __rich__(self) -> RenderableType:
+
+        with self._lock:
+            tail = list(self._tail)
+            stdout_lines = self._stdout_lines
+            stderr_lines = self._stderr_lines
+
+        summary = Text()
+        if self._title:
+            summary.append(self._title, style="bold")
+            summary.append(" ")
+        if self._phase:
+            summary.append(f"[{self._phase}] ", style="cyan")
+        if self._progress:
+            summary.append(f"{self._progress} ")
+        summary.append(
+            f"({time.monotonic() - self._start_time:.0f}s, {stdout_lines} stdout / {stderr_lines} stderr lines)",
+            style="dim",
+        )
+
+        # plain 'Text' objects, no markup parsing of the command output
+        lines = [
+            Text(
+                line,
+                style="red" if stream == "stderr" else "",
+                no_wrap=True,
+                overflow="ellipsis",
+            )
+            for stream, line in tail
+        ]
+        return Group(summary, *lines)
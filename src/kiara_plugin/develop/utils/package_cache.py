@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""A persistent conda package (and repodata) cache, shared by all rattler-build and micromamba runs."""
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Mapping, Set, Tuple, Union
+
+import structlog
+
+from kiara_plugin.develop.defaults import (
+    KIARA_DEV_PACKAGE_CACHE_FOLDER,
+    KIARA_DEV_PACKAGE_CACHE_SIZE_LIMIT,
+    KIARA_DEV_REPODATA_CACHE_SIZE_LIMIT,
+)
+from kiara_plugin.develop.utils import lock_file
+
+logger = structlog.getLogger()
+
+# packages that were used this recently are never removed, they might still be in use
+PRUNE_MIN_AGE = 600
+# folders in the package caches that hold repodata, not packages
+REPODATA_FOLDERS = {"cache", "repodata"}
+# the (empty) files whose modification time records when a package was last used
+LAST_USED_FOLDER = ".last-used"
+# held (shared) while builds use the caches, and (exclusively) while they are pruned
+CACHE_LOCK_FILE = ".lock"
+PACKAGE_EXTENSIONS = (".tar.bz2", ".conda")
+
+
+def get_package_cache_env(
+    root: Union[str, Path] = KIARA_DEV_PACKAGE_CACHE_FOLDER,
+) -> Dict[str, str]:
+    """Return the environment variables that point rattler-build and micromamba to the shared caches.
+
+    The two tools use different cache layouts, so each gets its own sub-folder.
+    """
+
+    root = os.path.expanduser(root)
+    return {
+        "RATTLER_CACHE_DIR": os.path.join(root, "rattler"),
+        "CONDA_PKGS_DIRS": os.path.join(root, "conda"),
+    }
+
+
+def _get_package_dirs(root: Union[str, Path]) -> List[Path]:
+
+    env = get_package_cache_env(root)
+    return [Path(env["RATTLER_CACHE_DIR"]) / "pkgs", Path(env["CONDA_PKGS_DIRS"])]
+
+
+def _get_repodata_dirs(root: Union[str, Path]) -> List[Path]:
+
+    env = get_package_cache_env(root)
+    return [Path(env["RATTLER_CACHE_DIR"]) / "repodata", Path(env["CONDA_PKGS_DIRS"]) / "cache"]
+
+
+def _get_package_stem(name: str) -> str:
+
+    for extension in PACKAGE_EXTENSIONS:
+        if name.endswith(extension):
+            return name[: -len(extension)]
+    return name
+
+
+@contextmanager
+def package_cache_in_use(
+    root: Union[str, Path] = KIARA_DEV_PACKAGE_CACHE_FOLDER,
+) -> Iterator[None]:
+    """Mark the package caches as in use (by a build, or environment update), so they are not pruned meanwhile."""
+
+    with lock_file(Path(os.path.expanduser(root)) / CACHE_LOCK_FILE, shared=True):
+        yield
+
+
+def mark_packages_used(
+    packages: Iterable[str], root: Union[str, Path] = KIARA_DEV_PACKAGE_CACHE_FOLDER
+) -> None:
+    """Record that packages (as '<name>-<version>-<build>') were just used.
+
+    The access time of the cached packages themselves is not reliable ('noatime'
+    and 'relatime' mounts), and their modification time is the time they were
+    extracted.
+    """
+
+    folder = Path(os.path.expanduser(root)) / LAST_USED_FOLDER
+    folder.mkdir(parents=True, exist_ok=True)
+    for package in set(packages):
+        (folder / package).touch()
+
+
+def _get_last_used(entry: Path, markers: Mapping[str, float]) -> float:
+
+    stem = _get_package_stem(entry.name)
+    last_used = entry.lstat().st_mtime
+    # some package caches append a hash to the folder name
+    for key in (stem, stem.rsplit("-", 1)[0]):
+        if key in markers.keys():
+            return max(last_used, markers[key])
+    return last_used
+
+
+def _get_size(path: Path, seen: Set[Tuple[int, int]]) -> int:
+
+    paths = [path] if not path.is_dir() or path.is_symlink() else []
+    if not paths:
+        for folder, _, files in os.walk(path):
+            paths.extend(Path(folder) / f for f in files)
+
+    size = 0
+    for p in paths:
+        try:
+            stat = p.lstat()
+        except OSError:
+            continue
+        # extracted packages are hard-linked into environments, only count them once
+        if (stat.st_dev, stat.st_ino) in seen:
+            continue
+        seen.add((stat.st_dev, stat.st_ino))
+        size += stat.st_size
+    return size
+
+
+def _remove(path: Path) -> None:
+
+    if path.is_dir() and not path.is_symlink():
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        path.unlink(missing_ok=True)
+
+
+def _prune(
+    entries: List[Tuple[float, int, List[Path]]], max_size: int, min_age: float
+) -> int:
+    """Remove the least recently used entries (each one or several paths), until the rest is smaller than 'max_size'."""
+
+    total = sum(size for _, size, _ in entries)
+    freed = 0
+    now = time.time()
+    for last_used, size, paths in sorted(entries):
+        if total - freed <= max_size:
+            break
+        if now - last_used < min_age:
+            break
+        for path in paths:
+            _remove(path)
+        freed += size
+    return freed
+
+
+def prune_package_cache(
+    root: Union[str, Path] = KIARA_DEV_PACKAGE_CACHE_FOLDER,
+    max_size: int = KIARA_DEV_PACKAGE_CACHE_SIZE_LIMIT,
+    repodata_max_size: int = KIARA_DEV_REPODATA_CACHE_SIZE_LIMIT,
+    min_age: float = PRUNE_MIN_AGE,
+) -> int:
+    """Remove the least recently used packages and repodata, until the caches are smaller than their limits.
+
+    This is meant to be called once all builds of a run are finished. If the caches
+    are in use (by builds in other processes), nothing is removed. Returns the
+    number of bytes that were freed.
+    """
+
+    root = Path(os.path.expanduser(root))
+    with lock_file(root / CACHE_LOCK_FILE, blocking=False) as acquired:
+        if not acquired:
+            logger.debug("package_cache.prune_skipped", reason="cache in use")
+            return 0
+
+        markers: Dict[str, float] = {}
+        markers_folder = root / LAST_USED_FOLDER
+        if markers_folder.is_dir():
+            for marker in markers_folder.iterdir():
+                markers[marker.name] = marker.stat().st_mtime
+
+        seen: Set[Tuple[int, int]] = set()
+        entries: List[Tuple[float, int, List[Path]]] = []
+        for pkgs_dir in _get_package_dirs(root):
+            if not pkgs_dir.is_dir():
+                continue
+            for entry in pkgs_dir.iterdir():
+                if entry.name.startswith(".") or entry.name in REPODATA_FOLDERS:
+                    continue
+                if entry.name.endswith(".lock"):
+                    continue
+                paths = [entry, entry.parent / f"{entry.name}.lock"]
+                entries.append(
+                    (_get_last_used(entry, markers), _get_size(entry, seen), paths)
+                )
+        freed = _prune(entries, max_size=max_size, min_age=min_age)
+
+        # repodata files are rewritten whenever they are refreshed, a channel's
+        # files share the same name before the extension(s)
+        repodata: Dict[Tuple[Path, str], List[Path]] = {}
+        for repodata_dir in _get_repodata_dirs(root):
+            if not repodata_dir.is_dir():
+                continue
+            for f in repodata_dir.iterdir():
+                if f.is_file() and not f.name.startswith("."):
+                    repodata.setdefault((repodata_dir, f.name.split(".", 1)[0]), []).append(f)
+        repodata_entries = [
+            (
+                max(f.stat().st_mtime for f in files),
+                sum(f.stat().st_size for f in files),
+                files,
+            )
+            for files in repodata.values()
+        ]
+        freed_repodata = _prune(
+            repodata_entries, max_size=repodata_max_size, min_age=min_age
+        )
+
+        # markers of packages that are not in any cache anymore
+        cached: Set[str] = set()
+        for pkgs_dir in _get_package_dirs(root):
+            if not pkgs_dir.is_dir():
+                continue
+            for entry in pkgs_dir.iterdir():
+                stem = _get_package_stem(entry.name)
+                cached.update((stem, stem.rsplit("-", 1)[0]))
+        for name in markers.keys():
+            if name not in cached:
+                (markers_folder / name).unlink(missing_ok=True)
+
+    if freed or freed_repodata:
+        logger.debug(
+            "package_cache.pruned", freed=freed, freed_repodata=freed_repodata
+        )
+    return freed + freed_repodata
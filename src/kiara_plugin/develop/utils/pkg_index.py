@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+"""A local (sqlite) snapshot of PyPI package metadata, for offline spec generation."""
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Mapping, Tuple, Union
+
+from packaging.utils import canonicalize_name
+
+from kiara_plugin.develop.defaults import KIARA_DEV_PKG_INDEX_PATH
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS packages (
+    name TEXT PRIMARY KEY,
+    display_name TEXT NOT NULL,
+    latest_version TEXT NOT NULL,
+    synced REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS releases (
+    name TEXT NOT NULL,
+    version TEXT NOT NULL,
+    summary TEXT,
+    license TEXT,
+    home_page TEXT,
+    project_urls TEXT,
+    requires_python TEXT,
+    requires_dist TEXT,
+    classifiers TEXT,
+    PRIMARY KEY (name, version)
+);
+CREATE TABLE IF NOT EXISTS files (
+    name TEXT NOT NULL,
+    version TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    url TEXT NOT NULL,
+    packagetype TEXT NOT NULL,
+    sha256 TEXT,
+    requires_python TEXT,
+    yanked INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (name, filename)
+);
+CREATE INDEX IF NOT EXISTS files_name_version ON files (name, version);
+"""
+
+
+def parse_pkg_item(pkg: str) -> Tuple[str, Union[str, None]]:
+    """Split a 'name' or 'name==version' string."""
+
+    if "==" in pkg:
+        name, version = pkg.split("==", 1)
+        return name.strip(), version.strip()
+    return pkg.strip(), None
+
+
+def read_pkg_list_file(path: Union[str, Path]) -> List[str]:
+    """Read a file with one package (or 'name==version') per line, ignoring comments and empty lines."""
+
+    result = []
+    with open(os.path.expanduser(path), "rt") as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if line:
+                result.append(line)
+    return result
+
+
+class PackageIndex(object):
+    """A local index of PyPI package metadata, backed by sqlite.
+
+    The index contains the metadata of the latest release of every synced package
+    (plus any explicitly requested versions), and the file list (urls and digests)
+    of all their releases. Lookups return the same structure as the PyPI json API,
+    so they can be used wherever the result of 'get_all_pkg_data_from_pypi' is expected.
+    """
+
+    def __init__(self, db_path: Union[str, Path] = KIARA_DEV_PKG_INDEX_PATH) -> None:
+
+        self._db_path: Path = Path(os.path.expanduser(db_path))
+        self._local = threading.local()
+
+    @property
+    def db_path(self) -> Path:
+        return self._db_path
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+
+        conn: Union[None, sqlite3.Connection] = getattr(self._local, "conn", None)
+        if conn is None:
+            self._db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self._db_path.as_posix())
+            conn.executescript(SCHEMA)
+            # indexes created before classifiers were stored
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(releases)")}
+            if "classifiers" not in columns:
+                conn.execute("ALTER TABLE releases ADD COLUMN classifiers TEXT")
+            self._local.conn = conn
+        return conn
+
+    def sync(
+        self, pkgs: Iterable[str], fetcher: Union[None, Any] = None
+    ) -> Dict[str, List[str]]:
+        """Snapshot the PyPI metadata of the provided packages into this index.
+
+        Arguments:
+            pkgs: a list of package names, or 'name==version' strings
+            fetcher: the PyPiMetadataFetcher to use (defaults to the process-wide one)
+
+        Returns:
+            a map of package names to the versions whose full metadata was stored
+        """
+
+        from kiara_plugin.develop.utils.pypi import get_pypi_metadata_fetcher
+
+        if fetcher is None:
+            fetcher = get_pypi_metadata_fetcher()
+
+        items = [parse_pkg_item(p) for p in pkgs]
+        latest = fetcher.get_many({(name, None) for name, _ in items})
+        pinned = fetcher.get_many(
+            {
+                (name, version)
+                for name, version in items
+                if version and latest[(name, None)]["info"]["version"] != version
+            }
+        )
+
+        result: Dict[str, List[str]] = {}
+        with self.connection as conn:
+            for pkg_data in latest.values():
+                name = self._add_pkg_data(conn, pkg_data, is_latest=True)
+                result.setdefault(name, []).append(pkg_data["info"]["version"])
+            for pkg_data in pinned.values():
+                name = self._add_pkg_data(conn, pkg_data, is_latest=False)
+                result.setdefault(name, []).append(pkg_data["info"]["version"])
+
+        return result
+
+    def _add_pkg_data(
+        self, conn: sqlite3.Connection, pkg_data: Mapping[str, Any], is_latest: bool
+    ) -> str:
+
+        info = pkg_data["info"]
+        name = canonicalize_name(info["name"])
+        if is_latest:
+            conn.execute(
+                "INSERT OR REPLACE INTO packages VALUES (?, ?, ?, ?)",
+                (name, info["name"], info["version"], time.time()),
+            )
+
+        conn.execute(
+            "INSERT OR REPLACE INTO releases (name, version, summary, license, home_page, project_urls, requires_python, requires_dist, classifiers) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                name,
+                info["version"],
+                info.get("summary", None),
+                info.get("license", None),
+                info.get("home_page", None),
+                json.dumps(info.get("project_urls", None) or {}),
+                info.get("requires_python", None),
+                json.dumps(info.get("requires_dist", None) or []),
+                json.dumps(info.get("classifiers", None) or []),
+            ),
+        )
+
+        files = []
+        for version, release_files in pkg_data.get("releases", {}).items():
+            for f in release_files:
+                files.append(
+                    (
+                        name,
+                        version,
+                        f.get("filename", f["url"].rsplit("/", 1)[-1]),
+                        f["url"],
+                        f["packagetype"],
+                        f.get("digests", {}).get("sha256", None),
+                        f.get("requires_python", None),
+                        1 if f.get("yanked", False) else 0,
+                    )
+                )
+        conn.executemany(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?)", files
+        )
+        return name
+
+    def get_pkg_data(
+        self, pkg_name: str, version: Union[str, None, int, float] = None
+    ) -> Mapping[str, Any]:
+        """Return the package data in the format of the PyPI json API."""
+
+        name = canonicalize_name(pkg_name)
+        conn = self.connection
+
+        pkg_row = conn.execute(
+            "SELECT display_name, latest_version FROM packages WHERE name = ?", (name,)
+        ).fetchone()
+        if pkg_row is None:
+            raise Exception(f"Package '{pkg_name}' not in local index: {self._db_path}")
+
+        display_name, latest_version = pkg_row
+        _version = str(version) if version else latest_version
+
+        release_row = conn.execute(
+            "SELECT summary, license, home_page, project_urls, requires_python, requires_dist, classifiers FROM releases WHERE name = ? AND version = ?",
+            (name, _version),
+        ).fetchone()
+        if release_row is None:
+            raise Exception(
+                f"No metadata for version '{_version}' of package '{pkg_name}' in local index: {self._db_path}"
+            )
+
+        (
+            summary,
+            license,
+            home_page,
+            project_urls,
+            requires_python,
+            requires_dist,
+            classifiers,
+        ) = release_row
+        info = {
+            "name": display_name,
+            "version": _version,
+            "summary": summary,
+            "license": license,
+            "home_page": home_page,
+            "project_urls": json.loads(project_urls),
+            "requires_python": requires_python,
+            "requires_dist": json.loads(requires_dist) or None,
+            "classifiers": json.loads(classifiers) if classifiers else [],
+        }
+
+        releases: Dict[str, List[Dict[str, Any]]] = {}
+        for (
+            file_version,
+            filename,
+            url,
+            packagetype,
+            sha256,
+            file_requires_python,
+            yanked,
+        ) in conn.execute(
+            "SELECT version, filename, url, packagetype, sha256, requires_python, yanked FROM files WHERE name = ?",
+            (name,),
+        ):
+            releases.setdefault(file_version, []).append(
+                {
+                    "filename": filename,
+                    "url": url,
+                    "packagetype": packagetype,
+                    "digests": {"sha256": sha256} if sha256 else {},
+                    "requires_python": file_requires_python,
+                    "yanked": bool(yanked),
+                }
+            )
+
+        return {"info": info, "releases": releases}
+
+    def query(self, pattern: Union[str, None] = None) -> List[Dict[str, Any]]:
+        """List the packages in this index, optionally filtered by a (sql 'LIKE') name pattern."""
+
+        sql = "SELECT p.name, p.latest_version, p.synced, group_concat(r.version, ', ') FROM packages p JOIN releases r ON p.name = r.name"
+        params: Tuple[str, ...] = ()
+        if pattern:
+            sql += " WHERE p.name LIKE ?"
+            params = (canonicalize_name(pattern).replace("*", "%"),)
+        sql += " GROUP BY p.name ORDER BY p.name"
+
+        return [
+            {
+                "name": name,
+                "latest_version": latest_version,
+                "synced": synced,
+                "versions": versions.split(", "),
+            }
+            for name, latest_version, synced, versions in self.connection.execute(
+                sql, params
+            )
+        ]
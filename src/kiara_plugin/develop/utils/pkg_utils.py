@@ -1,23 +1,40 @@
 # -*- coding: utf-8 -*-
 import os
 from pathlib import Path
-from typing import Any, Dict, Iterable, Mapping, MutableMapping, Union
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    MutableMapping,
+    Set,
+    Tuple,
+    Union,
+)
 
-import httpx
+import structlog
+from packaging.utils import canonicalize_name
 
-from kiara.utils.cli import terminal_print
 from kiara_plugin.develop.pkg_build.models import (
     DEFAULT_HOST_DEPENDENCIES,
     PkgSpec,
 )
+from kiara_plugin.develop.utils.licenses import get_license_index
+from kiara_plugin.develop.utils.output_renderer import (  # noqa: F401
+    default_stderr_print,
+    default_stdout_print,
+)
+from kiara_plugin.develop.utils.pkg_index import parse_pkg_item
+from kiara_plugin.develop.utils.pypi import (
+    PyPiMetadataFetcher,
+    create_pkg_data_url,
+    get_http_client,
+    get_pypi_metadata_fetcher,
+)
+from kiara_plugin.develop.utils.releases import ReleaseIndex, check_requirements
 
-
-def default_stdout_print(msg):
-    terminal_print(f"[green]stdout[/green]: {msg}")
-
-
-def default_stderr_print(msg):
-    terminal_print(f"[red]stderr[/red]: {msg}")
+logger = structlog.getLogger()
 
 # def extract_reqs_from_metadata(
 #         pkg_metadata: Mapping[str, Any], extras: Union[None, Iterable[str]] = None
@@ -126,44 +143,53 @@ def get_pkg_metadata_from_pypi(
         result: Mapping[str, Any] = get_all_pkg_data_from_pypi(
             pkg_name=pkg_name, version=version, extras=extras
         )
-        _result: MutableMapping[str, Any] = result["info"]
-        _result["releases"] = result["releases"]
-        return _result
+        if not version:
+            # PyPI reports the latest upload, which might be a pre-release, or a
+            # backport to an older release line
+            latest = ReleaseIndex.from_pkg_data(result).latest()
+            if latest != result["info"]["version"]:
+                result = get_all_pkg_data_from_pypi(
+                    pkg_name=pkg_name, version=latest, extras=extras
+                )
+        return get_metadata_from_pkg_data(result)
+
+
+def get_metadata_from_pkg_data(pkg_data: Mapping[str, Any]) -> Mapping[str, Any]:
+
+    _result: MutableMapping[str, Any] = dict(pkg_data["info"])
+    _result["releases"] = pkg_data["releases"]
+    return _result
 
 
 def get_all_pkg_data_from_pypi(
         pkg_name: str,
         version: Union[str, None, int, float] = None,
         extras: Union[Iterable[str], None] = None,
+        use_cache: bool = True,
     ) -> Mapping[str, Any]:
 
-        if version:
-            url = f"https://pypi.org/pypi/{pkg_name}/{version}/json"
-        else:
-            url = f"https://pypi.org/pypi/{pkg_name}/json"
-
-        result = httpx.get(url)
-
-        if result.status_code >= 300:
-            raise Exception(
-                f"Could not retrieve information for package '{pkg_name}': {result.text}"
-            )
-
-        pkg_metadata: Mapping[str, Any] = result.json()
-        return pkg_metadata
+        if not use_cache:
+            url = create_pkg_data_url(pkg_name=pkg_name, version=version)
+            result = get_http_client().get(url)
+            if result.status_code >= 300:
+                raise Exception(
+                    f"Could not retrieve information for package '{pkg_name}': {result.text}"
+                )
+            return result.json()  # type: ignore
 
+        return get_pypi_metadata_fetcher().get(pkg_name=pkg_name, version=version)
 
-def extract_reqs_from_metadata(
-        pkg_metadata: Mapping[str, Any], extras: Union[None, Iterable[str]] = None
-    ) -> Dict[str, Dict[str, Any]]:
 
-        reqs = pkg_metadata.get("requires_dist", None)
+def parse_requires_dist(
+        reqs: Iterable[str], extras: Union[None, Iterable[str]] = None
+    ) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, List[str]]]:
+        """Parse a 'requires_dist' list, filtered by the provided extras.
 
-        if not reqs:
-            return {}
+        Returns a tuple with the parsed requirements, and a map of all required packages that themselves need extras.
+        """
 
         filtered_reqs: Dict[str, Dict[str, Any]] = {}
-        extras_reqs = {}
+        extras_reqs: Dict[str, List[str]] = {}
         for r in reqs:
             tokens = r.split(";")
             if len(tokens) == 1:
@@ -229,18 +255,52 @@ def extract_reqs_from_metadata(
                 assert pkg not in filtered_reqs.keys()
                 filtered_reqs[pkg] = {"version": ver, "condition": cond}
 
-        for extra_pkg, _extras in extras_reqs.items():
-            # version = filtered_reqs[extra_pkg]["version"]
+        return filtered_reqs, extras_reqs
+
+
+def extract_reqs_from_metadata(
+        pkg_metadata: Mapping[str, Any], extras: Union[None, Iterable[str]] = None
+    ) -> Dict[str, Dict[str, Any]]:
+
+        reqs = pkg_metadata.get("requires_dist", None)
+
+        if not reqs:
+            return {}
+
+        filtered_reqs, extras_reqs = parse_requires_dist(reqs, extras=extras)
+
+        # packages that are required with extras are resolved level by level, all
+        # packages of one level are fetched in parallel
+        fetcher: Union[None, PyPiMetadataFetcher] = None
+        seen: Set[Tuple[str, Tuple[str, ...]]] = set()
+        while extras_reqs:
+            if fetcher is None:
+                fetcher = get_pypi_metadata_fetcher()
             # TODO: figure out the right version if there's a condition
-            version = None
-            req_metadata = get_pkg_metadata_from_pypi(
-                pkg_name=extra_pkg, version=version
-            )
-            new_reqs = extract_reqs_from_metadata(req_metadata, extras=_extras)
-            for k, v in new_reqs.items():
-                if k in filtered_reqs.keys():
-                    continue
-                filtered_reqs[k] = v
+            futures = {
+                extra_pkg: fetcher.submit(pkg_name=extra_pkg, version=None)
+                for extra_pkg in extras_reqs.keys()
+            }
+
+            next_level: Dict[str, List[str]] = {}
+            for extra_pkg, _extras in extras_reqs.items():
+                seen.add((extra_pkg, tuple(sorted(_extras))))
+                req_metadata = get_metadata_from_pkg_data(futures[extra_pkg].result())
+                new_reqs, new_extras_reqs = parse_requires_dist(
+                    req_metadata.get("requires_dist", None) or [], extras=_extras
+                )
+                for k, v in new_reqs.items():
+                    if k in filtered_reqs.keys():
+                        continue
+                    filtered_reqs[k] = v
+
+                for k, e in new_extras_reqs.items():
+                    if (k, tuple(sorted(e))) in seen:
+                        continue
+                    next_level.setdefault(k, [])
+                    next_level[k].extend(x for x in e if x not in next_level[k])
+
+            extras_reqs = next_level
 
         fixed = {}
         for k in sorted(filtered_reqs.keys()):
@@ -284,41 +344,16 @@ def get_pkg_metadata_from_project_folder(
         project_path: str, force_version: Union[str, None] = None
     ) -> Mapping[str, Any]:
 
-    from build.util import project_wheel_metadata
-
-    wheel_data = project_wheel_metadata(project_path)
-
-    requires_dist = []
-
-    metadata = {}
-    for k, v in wheel_data.items():  # type: ignore
-
-        # if len(v) > 100:
-        #     val = str(v)[0:100] + "..."
-        # else:
-        #     val = str(v)
-        # print(f"- {k}: {val}")
-
-
-        if k == "License":
-            metadata["license"] = v
-        elif k == "Project-URL" and "homepage" in v:
-            metadata["home_page"] = v.split(",")[1].strip()
-        elif k == "Summary":
-            metadata["summary"] = v
-        elif k == "Name":
-            metadata["name"] = v
-        elif k == "Version":
-            metadata["version"] = v
-        elif k == "Requires-Dist":
-            requires_dist.append(v)
+    from kiara_plugin.develop.utils.project_metadata import read_project_metadata
 
+    metadata = read_project_metadata(project_path)
+    if force_version:
+        metadata["version"] = force_version
 
     metadata["releases"] = {}
     metadata["releases"][metadata["version"]] = [
         {"url": Path(project_path).absolute().as_posix(), "packagetype": "project_folder"}
     ]
-    metadata["requires_dist"] = requires_dist
 
     return metadata
 
@@ -385,6 +420,24 @@ def create_pkg_spec(
 
         requirements = extract_reqs_from_metadata(pkg_metadata=pkg_metadata)
 
+        if req_repl_dict:
+            pinned = [r for r in req_repl_dict.values() if r]
+            for check in check_requirements(pinned):
+                if check.error is not None:
+                    logger.warning(
+                        "pkg_spec.unchecked_requirement",
+                        pkg_name=pkg_metadata["name"],
+                        requirement=check.requirement,
+                        reason=check.error,
+                    )
+                elif check.latest_matching is None:
+                    logger.warning(
+                        "pkg_spec.unsatisfiable_requirement",
+                        pkg_name=pkg_metadata["name"],
+                        requirement=check.requirement,
+                        latest=check.latest,
+                    )
+
         req_list = []
         for k, v in requirements.items():
             if req_repl_dict and k in req_repl_dict.keys():
@@ -471,14 +524,10 @@ def create_pkg_spec(
         else:
             entry_points = {}
 
-        license = pkg_metadata.get("license")
-        enforce_spdx = True
-
-        if enforce_spdx:
-            from license_expression import get_spdx_licensing
-            licensing = get_spdx_licensing()
-            if license not in licensing.known_symbols.keys():
-                license = f"LicenseRef-{license}"
+        license, license_family = get_license_index().normalize(
+            pkg_metadata.get("license"),
+            classifiers=pkg_metadata.get("classifiers", None),
+        )
 
         spec_data = {
             "pkg_name": pkg_name,
@@ -492,6 +541,7 @@ def create_pkg_spec(
             "metadata": {
                 "home": home_page,
                 "license": license,
+                "license_family": license_family,
                 "summary": pkg_metadata.get("summary"),
                 "recipe_maintainers": recipe_maintainers,
             },
@@ -499,3 +549,85 @@ def create_pkg_spec(
             "entry_points": entry_points,
         }
         return PkgSpec(**spec_data)
+
+
+def parse_pkg_list(
+    lines: Iterable[str], base_dir: Union[None, str, Path] = None
+) -> List[Tuple[str, Union[str, None], Union[str, None]]]:
+    """Parse lines of the format 'name[==version] [patch_file]'.
+
+    Relative patch file paths are resolved against 'base_dir'.
+    """
+
+    result: List[Tuple[str, Union[str, None], Union[str, None]]] = []
+    for line in lines:
+        tokens = line.split()
+        if not tokens:
+            continue
+        if len(tokens) > 2:
+            raise Exception(f"Invalid package list item: {line}")
+
+        pkg, version = parse_pkg_item(tokens[0])
+
+        patch_file = None
+        if len(tokens) == 2:
+            patch_file = os.path.expanduser(tokens[1])
+            if base_dir and not os.path.isabs(patch_file):
+                patch_file = os.path.join(base_dir, patch_file)
+        result.append((pkg, version, patch_file))
+
+    return result
+
+
+def create_pkg_specs(
+    pkgs: Iterable[Tuple[str, Union[str, None], Union[None, Mapping[str, Any]]]],
+    max_workers: int = 8,
+) -> Dict[str, Union[PkgSpec, Exception]]:
+    """Create the specs for several packages concurrently.
+
+    All lookups share the process-wide PyPI fetcher (and its connection pool and
+    caches). Errors are returned per package instead of being raised. Every package
+    can only be in the list once (with any version).
+
+    Arguments:
+        pkgs: tuples of package name (or local project path), version, and patch data
+        max_workers: the number of specs that are created in parallel
+    """
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    pkgs = list(pkgs)
+    seen: Set[str] = set()
+    duplicates = []
+    for pkg, _, _ in pkgs:
+        path = os.path.realpath(os.path.expanduser(pkg))
+        key = path if os.path.isdir(path) else canonicalize_name(pkg)
+        if key in seen:
+            duplicates.append(pkg)
+        seen.add(key)
+    if duplicates:
+        raise Exception(f"Duplicate package(s) in list: {', '.join(duplicates)}")
+
+    def _create(
+        pkg: str,
+        version: Union[str, None],
+        patch_data: Union[None, Mapping[str, Any]],
+    ) -> PkgSpec:
+        pkg_metadata = get_pkg_metadata(pkg=pkg, version=version)
+        return create_pkg_spec(pkg_metadata=pkg_metadata, patch_data=patch_data)
+
+    result: Dict[str, Union[PkgSpec, Exception]] = {}
+    with ThreadPoolExecutor(
+        max_workers=max_workers, thread_name_prefix="pkg-spec"
+    ) as executor:
+        futures = {
+            pkg: executor.submit(_create, pkg, version, patch_data)
+            for pkg, version, patch_data in pkgs
+        }
+        for pkg, future in futures.items():
+            try:
+                result[pkg] = future.result()
+            except Exception as e:
+                result[pkg] = e
+
+    return result
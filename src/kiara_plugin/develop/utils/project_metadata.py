@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""Read the metadata of local Python projects, without a full build if possible."""
+import hashlib
+import os
+import subprocess
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Union
+
+import structlog
+from diskcache import Cache
+from packaging.requirements import Requirement
+from packaging.utils import canonicalize_name
+
+from kiara_plugin.develop.defaults import KIARA_DEV_PROJECT_METADATA_CACHE_FOLDER
+
+try:
+    import tomllib  # type: ignore
+except ImportError:
+    import tomli as tomllib  # type: ignore
+
+logger = structlog.getLogger()
+
+PROJECT_METADATA_FILES = ["pyproject.toml", "setup.cfg", "setup.py"]
+SETUPTOOLS_SCM_CONFIG_KEYS = [
+    "version_scheme",
+    "local_scheme",
+    "tag_regex",
+    "fallback_version",
+    "parentdir_prefix_version",
+    "normalize",
+]
+
+_PROJECT_METADATA_CACHE: Union[None, Cache] = None
+
+
+def get_project_metadata_cache() -> Cache:
+
+    global _PROJECT_METADATA_CACHE
+    if _PROJECT_METADATA_CACHE is None:
+        _PROJECT_METADATA_CACHE = Cache(KIARA_DEV_PROJECT_METADATA_CACHE_FOLDER)
+    return _PROJECT_METADATA_CACHE
+
+
+def get_git_head(project_path: Union[str, Path]) -> Union[None, str]:
+
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "HEAD"],  # noqa: S607
+            cwd=project_path,
+            capture_output=True,
+            text=True,
+            check=False,
+        )
+    except FileNotFoundError:
+        return None
+
+    if result.returncode != 0:
+        return None
+    return result.stdout.strip()
+
+
+def get_scm_version(project_path: Union[str, Path], scm_config: Mapping[str, Any]) -> str:
+    """Compute the version of a project via setuptools_scm, without building it."""
+
+    from setuptools_scm import get_version
+
+    config = {k: v for k, v in scm_config.items() if k in SETUPTOOLS_SCM_CONFIG_KEYS}
+    version: str = get_version(root=Path(project_path).as_posix(), **config)
+    return version
+
+
+def _create_requires_dist(project: Mapping[str, Any]) -> List[str]:
+    """Create the 'Requires-Dist' entries of a project, normalized like a build backend writes them."""
+
+    requires_dist = [str(Requirement(dep)) for dep in project.get("dependencies", [])]
+    for _extra, deps in project.get("optional-dependencies", {}).items():
+        # extra names are normalized in core metadata (PEP 685)
+        extra = canonicalize_name(_extra)
+        for dep in deps:
+            req = Requirement(dep)
+            marker = req.marker
+            req.marker = None
+            if marker is not None:
+                dep = f'{req}; ({marker}) and extra == "{extra}"'
+            else:
+                dep = f'{req}; extra == "{extra}"'
+            requires_dist.append(str(Requirement(dep)))
+    return requires_dist
+
+
+def read_static_project_metadata(
+    project_path: Union[str, Path]
+) -> Union[None, Dict[str, Any]]:
+    """Read the PEP 621 '[project]' table of a project, if all necessary metadata is static.
+
+    The only dynamic field that is supported is 'version', if it is managed by
+    setuptools_scm. In all other cases, 'None' is returned, and the project needs
+    to be built to get at its metadata.
+    """
+
+    pyproject_file = Path(project_path) / "pyproject.toml"
+    if not pyproject_file.is_file():
+        return None
+
+    with open(pyproject_file, "rb") as f:
+        pyproject = tomllib.load(f)
+
+    project = pyproject.get("project", None)
+    if not project or "name" not in project.keys():
+        return None
+
+    dynamic = set(project.get("dynamic", []))
+    if dynamic - {"version"}:
+        logger.debug(
+            "project_metadata.dynamic", path=str(project_path), fields=sorted(dynamic)
+        )
+        return None
+
+    if "version" in dynamic:
+        scm_config = pyproject.get("tool", {}).get("setuptools_scm", None)
+        if scm_config is None:
+            return None
+        version = get_scm_version(project_path, scm_config)
+    else:
+        version = project["version"]
+
+    license = project.get("license", None)
+    if isinstance(license, Mapping):
+        if "text" not in license.keys():
+            # license files are only resolved by the build backend
+            return None
+        license = license["text"]
+
+    home_page = None
+    for url_type, url in project.get("urls", {}).items():
+        if url_type.lower() == "homepage":
+            home_page = url
+            break
+
+    metadata: Dict[str, Any] = {
+        "name": project["name"],
+        "version": version,
+        "summary": project.get("description", None),
+        "requires_dist": _create_requires_dist(project),
+        "classifiers": project.get("classifiers", []),
+    }
+    if license:
+        metadata["license"] = license
+    if home_page:
+        metadata["home_page"] = home_page
+    return metadata
+
+
+def read_built_project_metadata(project_path: Union[str, Path]) -> Dict[str, Any]:
+    """Build the project's wheel metadata with its build backend, in an isolated environment."""
+
+    from build.util import project_wheel_metadata
+
+    wheel_data = project_wheel_metadata(project_path)
+
+    requires_dist = []
+    classifiers = []
+
+    metadata: Dict[str, Any] = {}
+    for k, v in wheel_data.items():  # type: ignore
+
+        if k == "License":
+            metadata["license"] = v
+        elif k == "Project-URL" and "homepage" in v:
+            metadata["home_page"] = v.split(",")[1].strip()
+        elif k == "Summary":
+            metadata["summary"] = v
+        elif k == "Name":
+            metadata["name"] = v
+        elif k == "Version":
+            metadata["version"] = v
+        elif k == "Requires-Dist":
+            requires_dist.append(v)
+        elif k == "Classifier":
+            classifiers.append(v)
+
+    metadata["requires_dist"] = requires_dist
+    metadata["classifiers"] = classifiers
+    return metadata
+
+
+def create_project_fingerprint(project_path: Union[str, Path]) -> str:
+    """Hash the project metadata files and the current git HEAD."""
+
+    sha = hashlib.sha256()
+    for file_name in PROJECT_METADATA_FILES:
+        path = Path(project_path) / file_name
+        sha.update(file_name.encode())
+        if path.is_file():
+            sha.update(path.read_bytes())
+
+    git_head = get_git_head(project_path)
+    sha.update((git_head or "").encode())
+    return sha.hexdigest()
+
+
+def read_project_metadata(
+    project_path: Union[str, Path], use_cache: bool = True
+) -> Dict[str, Any]:
+    """Read the metadata of a local project.
+
+    Static PEP 621 metadata is read directly from 'pyproject.toml'. Otherwise the
+    project is built, and the result is cached under a fingerprint of its metadata
+    files and git HEAD.
+    """
+
+    project_path = os.path.realpath(os.path.expanduser(project_path))
+
+    metadata = read_static_project_metadata(project_path)
+    if metadata is not None:
+        return metadata
+
+    if not use_cache:
+        return read_built_project_metadata(project_path)
+
+    key = f"{project_path}#{create_project_fingerprint(project_path)}"
+    cache = get_project_metadata_cache()
+    cached: Union[None, Dict[str, Any]] = cache.get(key, default=None)
+    if cached is not None:
+        return cached
+
+    metadata = read_built_project_metadata(project_path)
+    cache.set(key, metadata)
+    return metadata
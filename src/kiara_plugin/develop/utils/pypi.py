@@ -0,0 +1,550 @@
+# -*- coding: utf-8 -*-
+"""Cached access to the PyPI metadata API."""
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from email.parser import BytesHeaderParser
+from email.policy import compat32
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Tuple,
+    Union,
+)
+
+import httpx
+import structlog
+from diskcache import Cache
+from packaging.utils import (
+    InvalidSdistFilename,
+    InvalidWheelFilename,
+    canonicalize_name,
+    parse_sdist_filename,
+    parse_wheel_filename,
+)
+from packaging.version import Version
+
+from kiara_plugin.develop.defaults import (
+    KIARA_DEV_PYPI_CACHE_FOLDER,
+    KIARA_DEV_PYPI_CACHE_SIZE_LIMIT,
+    KIARA_DEV_PYPI_CACHE_TTL,
+    KIARA_DEV_PYPI_MAX_CONNECTIONS,
+    KIARA_DEV_PYPI_METADATA_BACKEND,
+)
+from kiara_plugin.develop.utils.releases import ReleaseIndex
+
+if TYPE_CHECKING:
+    from kiara_plugin.develop.utils.pkg_index import PackageIndex
+
+logger = structlog.getLogger()
+
+PYPI_BASE_URL = "https://pypi.org"
+SIMPLE_API_CONTENT_TYPE = "application/vnd.pypi.simple.v1+json"
+
+_HTTP_CLIENT: Union[None, httpx.Client] = None
+_HTTP_CLIENT_LOCK = threading.Lock()
+
+
+def get_http_client() -> httpx.Client:
+    """Return the process-wide http client, which keeps connections alive between requests."""
+
+    global _HTTP_CLIENT
+    with _HTTP_CLIENT_LOCK:
+        if _HTTP_CLIENT is None:
+            _HTTP_CLIENT = httpx.Client(
+                follow_redirects=True,
+                timeout=httpx.Timeout(30.0),
+                limits=httpx.Limits(
+                    max_connections=KIARA_DEV_PYPI_MAX_CONNECTIONS,
+                    max_keepalive_connections=KIARA_DEV_PYPI_MAX_CONNECTIONS,
+                ),
+            )
+        return _HTTP_CLIENT
+
+
+def create_pkg_data_url(
+    pkg_name: str, version: Union[str, None, int, float] = None
+) -> str:
+
+    if version:
+        return f"{PYPI_BASE_URL}/pypi/{pkg_name}/{version}/json"
+    else:
+        return f"{PYPI_BASE_URL}/pypi/{pkg_name}/json"
+
+
+class FetchStats(object):
+    """Counters for the requests made against PyPI."""
+
+    def __init__(self) -> None:
+
+        self._lock = threading.Lock()
+        self.requests: int = 0
+        self.cache_hits: int = 0
+        self.bytes_transferred: int = 0
+        self.parse_time: float = 0.0
+
+    def record(
+        self,
+        bytes_transferred: int = 0,
+        parse_time: float = 0.0,
+        cache_hit: Union[None, bool] = None,
+    ) -> None:
+
+        with self._lock:
+            if cache_hit is True:
+                self.cache_hits += 1
+            elif cache_hit is False:
+                self.requests += 1
+            self.bytes_transferred += bytes_transferred
+            self.parse_time += parse_time
+
+    def to_dict(self) -> Dict[str, Any]:
+
+        return {
+            "requests": self.requests,
+            "cache_hits": self.cache_hits,
+            "bytes_transferred": self.bytes_transferred,
+            "parse_time": self.parse_time,
+        }
+
+
+def create_cache_key(url: str, headers: Union[None, Mapping[str, str]] = None) -> str:
+    """Return the cache key of a response, responses to the same url but different headers are cached separately."""
+
+    return url if not headers else f"{url}#{sorted(headers.items())}"
+
+
+def parse_json_response(response: httpx.Response) -> Any:
+    return json.loads(response.content)
+
+
+def parse_core_metadata(content: bytes) -> Dict[str, Any]:
+    """Parse a (PEP 658) core metadata file into the format of the 'info' section of the PyPI json API."""
+
+    msg = BytesHeaderParser(policy=compat32).parsebytes(content)
+
+    project_urls: Dict[str, str] = {}
+    for project_url in msg.get_all("Project-URL") or []:
+        label, _, url = project_url.partition(",")
+        project_urls[label.strip()] = url.strip()
+
+    home_page = msg.get("Home-page", None)
+    if not home_page:
+        for label, url in project_urls.items():
+            if label.lower() in ["homepage", "home"]:
+                home_page = url
+                break
+
+    return {
+        "name": msg["Name"],
+        "version": msg["Version"],
+        "summary": msg.get("Summary", None),
+        "license": msg.get("License-Expression", None) or msg.get("License", None),
+        "home_page": home_page,
+        "project_urls": project_urls,
+        "requires_python": msg.get("Requires-Python", None),
+        "requires_dist": msg.get_all("Requires-Dist") or None,
+        "classifiers": msg.get_all("Classifier") or [],
+    }
+
+
+class PyPiMetadataCache(object):
+    """A persistent, revalidating cache for PyPI json responses.
+
+    Entries are stored together with the 'ETag' and 'Last-Modified' headers of the
+    response they came from. Once an entry is older than 'ttl' seconds, it is
+    revalidated with a conditional request, which usually results in a cheap
+    '304 Not Modified'. Entries for pinned versions are never revalidated, since
+    the metadata of a published release does not change. If the cache grows beyond
+    'size_limit' bytes, the least recently used entries are evicted.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = KIARA_DEV_PYPI_CACHE_FOLDER,
+        ttl: int = KIARA_DEV_PYPI_CACHE_TTL,
+        size_limit: int = KIARA_DEV_PYPI_CACHE_SIZE_LIMIT,
+    ) -> None:
+
+        self._cache_dir: str = cache_dir
+        self._ttl: int = ttl
+        self.stats: FetchStats = FetchStats()
+        self._cache: Cache = Cache(
+            cache_dir,
+            size_limit=size_limit,
+            eviction_policy="least-recently-used",
+        )
+
+    @property
+    def ttl(self) -> int:
+        return self._ttl
+
+    def _fetch(self, url: str, headers: Mapping[str, str]) -> httpx.Response:
+        return get_http_client().get(url, headers=headers)
+
+    def get_json(
+        self,
+        url: str,
+        pinned: bool = False,
+        headers: Union[None, Mapping[str, str]] = None,
+    ) -> Mapping[str, Any]:
+        """Retrieve the (json) content of the provided url, using the cache if possible.
+
+        Arguments:
+            url: the url to retrieve
+            pinned: whether the url refers to an immutable resource (e.g. a specific release), in which case a cached entry never expires
+            headers: additional request headers
+        """
+
+        result: Mapping[str, Any] = self.get_content(
+            url, pinned=pinned, headers=headers, parse=parse_json_response
+        )
+        return result
+
+    def get_content(
+        self,
+        url: str,
+        pinned: bool = False,
+        headers: Union[None, Mapping[str, str]] = None,
+        parse: Callable[[httpx.Response], Any] = parse_json_response,
+    ) -> Any:
+        """Retrieve the content of the provided url, using the cache if possible.
+
+        The 'parse' callable turns the response into the data that is cached and returned.
+        """
+
+        key = create_cache_key(url, headers=headers)
+        entry: Union[None, Dict[str, Any]] = self._cache.get(key, default=None)
+        now = time.time()
+
+        if entry is not None:
+            if pinned or now - entry["fetched"] < self._ttl:
+                self.stats.record(cache_hit=True)
+                return entry["data"]
+
+        request_headers = dict(headers) if headers else {}
+        if entry is not None:
+            if entry.get("etag"):
+                request_headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                request_headers["If-Modified-Since"] = entry["last_modified"]
+
+        try:
+            response = self._fetch(url, headers=request_headers)
+        except httpx.HTTPError as e:
+            if entry is None:
+                raise e
+            logger.debug("pypi.cache.stale", url=url, reason=str(e))
+            return entry["data"]
+
+        self.stats.record(
+            bytes_transferred=response.num_bytes_downloaded, cache_hit=False
+        )
+        if response.status_code == 304 and entry is not None:
+            entry["fetched"] = now
+            self._cache.set(key, entry)
+            return entry["data"]
+
+        if response.status_code >= 300:
+            raise Exception(f"Could not retrieve '{url}': {response.text}")
+
+        start = time.perf_counter()
+        data = parse(response)
+        parse_time = time.perf_counter() - start
+        self.stats.record(parse_time=parse_time)
+        logger.debug(
+            "pypi.fetched",
+            url=url,
+            bytes=response.num_bytes_downloaded,
+            parse_time=parse_time,
+        )
+
+        self._cache.set(
+            key,
+            {
+                "data": data,
+                "etag": response.headers.get("etag", None),
+                "last_modified": response.headers.get("last-modified", None),
+                "fetched": now,
+            },
+        )
+        return data
+
+    def invalidate(self, url: str) -> None:
+        """Remove all cached responses for an url, regardless of the request headers they were fetched with."""
+
+        # see 'create_cache_key'
+        prefix = f"{url}#"
+        for key in list(self._cache.iterkeys()):
+            if key == url or (isinstance(key, str) and key.startswith(prefix)):
+                self._cache.delete(key)
+
+    def purge(self) -> None:
+        self._cache.clear()
+
+
+def _parse_simple_index_response(response: httpx.Response) -> Any:
+
+    content_type = response.headers.get("content-type", "")
+    if not content_type.startswith(SIMPLE_API_CONTENT_TYPE):
+        raise Exception(f"Simple index does not support json (content type: {content_type}).")
+    return json.loads(response.content)
+
+
+def _releases_from_simple_index(
+    index: Mapping[str, Any]
+) -> Tuple[Dict[str, List[Dict[str, Any]]], Dict[str, str]]:
+    """Sort the files of a (PEP 691) simple index page into releases.
+
+    Returns the releases in the format of the PyPI json API, as well as a map of
+    wheel urls to the sha256 digest of their (PEP 658) core metadata file.
+    """
+
+    releases: Dict[str, List[Dict[str, Any]]] = {}
+    metadata_files: Dict[str, str] = {}
+    for file_data in index.get("files", []):
+        filename: str = file_data["filename"]
+        try:
+            if filename.endswith(".whl"):
+                _, version, _, _ = parse_wheel_filename(filename)
+                packagetype = "bdist_wheel"
+            else:
+                _, version = parse_sdist_filename(filename)
+                packagetype = "sdist"
+        except (InvalidSdistFilename, InvalidWheelFilename):
+            continue
+
+        releases.setdefault(str(version), []).append(
+            {
+                "filename": filename,
+                "url": file_data["url"],
+                "packagetype": packagetype,
+                "digests": file_data.get("hashes", {}),
+                "requires_python": file_data.get("requires-python", None),
+                "yanked": bool(file_data.get("yanked", False)),
+            }
+        )
+
+        core_metadata = file_data.get(
+            "core-metadata", file_data.get("data-dist-info-metadata", False)
+        )
+        if packagetype == "bdist_wheel" and core_metadata:
+            if isinstance(core_metadata, Mapping):
+                metadata_files[file_data["url"]] = core_metadata.get("sha256", "")
+            else:
+                metadata_files[file_data["url"]] = ""
+
+    return releases, metadata_files
+
+
+def get_pkg_data_from_simple_index(
+    pkg_name: str,
+    version: Union[str, None, int, float] = None,
+    cache: Union[None, PyPiMetadataCache] = None,
+) -> Mapping[str, Any]:
+    """Retrieve package data via the simple json API (PEP 691) and core metadata files (PEP 658).
+
+    Only the metadata of the selected release is downloaded, instead of the full
+    json API document. The result has the same format as the json API response,
+    limited to the fields the spec generation needs.
+    """
+
+    if cache is None:
+        cache = get_pypi_metadata_cache()
+
+    index = cache.get_content(
+        f"{PYPI_BASE_URL}/simple/{canonicalize_name(pkg_name)}/",
+        headers={"Accept": SIMPLE_API_CONTENT_TYPE},
+        parse=_parse_simple_index_response,
+    )
+    releases, metadata_files = _releases_from_simple_index(index)
+
+    if version:
+        _version = str(Version(str(version)))
+    else:
+        _version = ReleaseIndex(pkg_name, releases).latest()
+
+    if _version not in releases.keys():
+        raise Exception(f"No release '{_version}' for package '{pkg_name}'.")
+
+    wheel_urls = [
+        f["url"] for f in releases[_version] if f["url"] in metadata_files.keys()
+    ]
+    if not wheel_urls:
+        raise Exception(
+            f"No core metadata file available for release '{_version}' of package '{pkg_name}'."
+        )
+    wheel_url = wheel_urls[0]
+    expected_digest = metadata_files[wheel_url]
+
+    def _parse(response: httpx.Response) -> Any:
+        if expected_digest:
+            digest = hashlib.sha256(response.content).hexdigest()
+            if digest != expected_digest:
+                raise Exception(f"Invalid digest for core metadata file: {wheel_url}")
+        return parse_core_metadata(response.content)
+
+    info = dict(cache.get_content(f"{wheel_url}.metadata", pinned=True, parse=_parse))
+    info["version"] = _version
+    return {"info": info, "releases": releases}
+
+
+class PyPiMetadataFetcher(object):
+    """Fetches PyPI package data concurrently, on a bounded thread pool.
+
+    Requests for the same package name and version that are submitted while a
+    previous one is still in flight share the same future.
+    """
+
+    def __init__(
+        self,
+        cache: PyPiMetadataCache,
+        max_workers: int = KIARA_DEV_PYPI_MAX_CONNECTIONS,
+        backend: str = KIARA_DEV_PYPI_METADATA_BACKEND,
+        pkg_index_path: Union[None, str] = None,
+    ) -> None:
+
+        if backend not in ["simple", "json", "index"]:
+            raise Exception(
+                f"Invalid PyPI metadata backend '{backend}', must be 'simple', 'json' or 'index'."
+            )
+
+        self._cache: PyPiMetadataCache = cache
+        self._backend: str = backend
+        self._pkg_index_path: Union[None, str] = pkg_index_path
+        self._pkg_index: Union[None, "PackageIndex"] = None
+        self._executor: ThreadPoolExecutor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="pypi-fetch"
+        )
+        self._in_flight: Dict[Tuple[str, str], Future] = {}
+        self._lock = threading.Lock()
+
+    def _fetch(
+        self, pkg_name: str, version: Union[str, None, int, float]
+    ) -> Mapping[str, Any]:
+
+        if self._backend == "index":
+            from kiara_plugin.develop.utils.pkg_index import PackageIndex
+
+            if self._pkg_index is None:
+                if self._pkg_index_path:
+                    self._pkg_index = PackageIndex(self._pkg_index_path)
+                else:
+                    self._pkg_index = PackageIndex()
+            return self._pkg_index.get_pkg_data(pkg_name=pkg_name, version=version)
+
+        if self._backend == "simple":
+            try:
+                return get_pkg_data_from_simple_index(
+                    pkg_name=pkg_name, version=version, cache=self._cache
+                )
+            except Exception as e:
+                logger.debug(
+                    "pypi.simple_index.fallback", pkg_name=pkg_name, reason=str(e)
+                )
+
+        url = create_pkg_data_url(pkg_name=pkg_name, version=version)
+        try:
+            return self._cache.get_json(url, pinned=bool(version))
+        except Exception as e:
+            raise Exception(
+                f"Could not retrieve information for package '{pkg_name}': {e}"
+            )
+
+    @property
+    def backend(self) -> str:
+        return self._backend
+
+    def shutdown(self) -> None:
+        """Stop accepting new requests, requests that are already in flight still finish."""
+
+        self._executor.shutdown(wait=False)
+
+    def submit(
+        self, pkg_name: str, version: Union[str, None, int, float] = None
+    ) -> "Future[Mapping[str, Any]]":
+
+        key = (canonicalize_name(pkg_name), str(version) if version else "")
+        with self._lock:
+            future = self._in_flight.get(key, None)
+            if future is not None:
+                return future
+
+            future = self._executor.submit(self._fetch, pkg_name, version)
+            self._in_flight[key] = future
+
+        def _done(_: Future) -> None:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+        future.add_done_callback(_done)
+        return future
+
+    def get(
+        self, pkg_name: str, version: Union[str, None, int, float] = None
+    ) -> Mapping[str, Any]:
+        return self.submit(pkg_name=pkg_name, version=version).result()
+
+    def get_many(
+        self, pkgs: Iterable[Tuple[str, Union[str, None, int, float]]]
+    ) -> Dict[Tuple[str, Union[str, None, int, float]], Mapping[str, Any]]:
+        """Fetch the data for several (name, version) tuples in parallel."""
+
+        futures = {
+            (pkg_name, version): self.submit(pkg_name=pkg_name, version=version)
+            for pkg_name, version in pkgs
+        }
+        return {k: f.result() for k, f in futures.items()}
+
+
+_PYPI_METADATA_CACHE: Union[None, PyPiMetadataCache] = None
+_PYPI_METADATA_FETCHER: Union[None, PyPiMetadataFetcher] = None
+_PYPI_METADATA_LOCK = threading.Lock()
+
+
+def get_pypi_metadata_cache() -> PyPiMetadataCache:
+    """Return the process-wide PyPI metadata cache."""
+
+    global _PYPI_METADATA_CACHE
+    with _PYPI_METADATA_LOCK:
+        if _PYPI_METADATA_CACHE is None:
+            _PYPI_METADATA_CACHE = PyPiMetadataCache()
+        return _PYPI_METADATA_CACHE
+
+
+def get_pypi_metadata_fetcher() -> PyPiMetadataFetcher:
+    """Return the process-wide PyPI metadata fetcher."""
+
+    global _PYPI_METADATA_FETCHER
+    cache = get_pypi_metadata_cache()
+    with _PYPI_METADATA_LOCK:
+        if _PYPI_METADATA_FETCHER is None:
+            _PYPI_METADATA_FETCHER = PyPiMetadataFetcher(cache=cache)
+        return _PYPI_METADATA_FETCHER
+
+
+def set_pypi_metadata_backend(
+    backend: str, pkg_index_path: Union[None, str] = None
+) -> PyPiMetadataFetcher:
+    """Replace the process-wide PyPI metadata fetcher with one that uses the specified backend.
+
+    The 'pkg_index_path' is the local package index database the 'index' backend
+    uses (defaults to the default index location).
+    """
+
+    global _PYPI_METADATA_FETCHER
+    cache = get_pypi_metadata_cache()
+    with _PYPI_METADATA_LOCK:
+        if _PYPI_METADATA_FETCHER is not None:
+            _PYPI_METADATA_FETCHER.shutdown()
+        _PYPI_METADATA_FETCHER = PyPiMetadataFetcher(
+            cache=cache, backend=backend, pkg_index_path=pkg_index_path
+        )
+        return _PYPI_METADATA_FETCHER
@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+"""Per-package release indexes, for fast version selection and requirement checks."""
+import re
+import threading
+from concurrent.futures import Future
+from typing import Any, Dict, Iterable, List, Mapping, Sequence, Tuple, Union
+
+from packaging.requirements import InvalidRequirement, Requirement
+from packaging.specifiers import SpecifierSet
+from packaging.utils import canonicalize_name
+from packaging.version import InvalidVersion, Version
+from pydantic import BaseModel, Field
+
+# packages that are commonly pinned in conda recipes, but are not on PyPI
+CONDA_ONLY_PKGS = [
+    "python",
+    "python_abi",
+    "r-base",
+    "nodejs",
+    "libgcc-ng",
+    "libstdcxx-ng",
+]
+
+
+def is_conda_only_pkg(pkg_name: str) -> bool:
+    """Return whether a package is only available on conda (R packages, and a few others)."""
+
+    name = canonicalize_name(pkg_name)
+    if name.startswith("r-"):
+        return True
+    return name in (canonicalize_name(p) for p in CONDA_ONLY_PKGS)
+
+
+class ReleaseIndex(object):
+    """The releases of a package, parsed and sorted (newest first) once.
+
+    Yanked releases (PEP 592) are only considered if explicitly requested, or if a
+    requirement pins them exactly.
+    """
+
+    def __init__(
+        self, pkg_name: str, releases: Mapping[str, Sequence[Mapping[str, Any]]]
+    ):
+
+        self._pkg_name: str = pkg_name
+        versions: List[Tuple[Version, str, bool]] = []
+        for version_str, files in releases.items():
+            try:
+                version = Version(version_str)
+            except InvalidVersion:
+                continue
+            yanked = bool(files) and all(f.get("yanked", False) for f in files)
+            versions.append((version, version_str, yanked))
+
+        versions.sort(key=lambda x: x[0], reverse=True)
+        self._versions: List[Tuple[Version, str, bool]] = versions
+
+    @classmethod
+    def from_pkg_data(cls, pkg_data: Mapping[str, Any]) -> "ReleaseIndex":
+        return cls(pkg_data["info"]["name"], pkg_data.get("releases", {}))
+
+    @property
+    def pkg_name(self) -> str:
+        return self._pkg_name
+
+    def versions(
+        self, include_yanked: bool = False, include_prereleases: bool = False
+    ) -> List[str]:
+        """Return all matching versions, newest first."""
+
+        return [
+            version_str
+            for version, version_str, yanked in self._versions
+            if (include_yanked or not yanked)
+            and (include_prereleases or not version.is_prerelease)
+        ]
+
+    def is_yanked(self, version: str) -> bool:
+
+        _version = Version(version)
+        for v, _, yanked in self._versions:
+            if v == _version:
+                return yanked
+        raise Exception(f"No release '{version}' for package '{self._pkg_name}'.")
+
+    def latest(self, include_prereleases: bool = False) -> str:
+        """Return the newest (not yanked) release.
+
+        If there is no stable release, pre-releases are considered too.
+        """
+
+        fallback = None
+        for version, version_str, yanked in self._versions:
+            if yanked:
+                continue
+            if not version.is_prerelease or include_prereleases:
+                return version_str
+            if fallback is None:
+                fallback = version_str
+
+        if fallback is None:
+            raise Exception(f"No (unyanked) releases for package '{self._pkg_name}'.")
+        return fallback
+
+    def latest_matching(
+        self,
+        spec: Union[str, SpecifierSet],
+        include_prereleases: Union[None, bool] = None,
+    ) -> Union[None, str]:
+        """Return the newest release that matches a version specifier, or 'None'.
+
+        Pre-releases are only included if the specifier itself mentions one, unless
+        'include_prereleases' is set.
+        """
+
+        if isinstance(spec, str):
+            spec = SpecifierSet(spec)
+
+        for version, version_str, yanked in self._versions:
+            if yanked:
+                continue
+            if spec.contains(version, prereleases=include_prereleases):
+                return version_str
+
+        # yanked releases are still valid for exact pins
+        if any(s.operator in ["==", "==="] for s in spec):
+            for version, version_str, yanked in self._versions:
+                if yanked and spec.contains(version, prereleases=True):
+                    return version_str
+        return None
+
+
+_RELEASE_INDEXES: Dict[str, ReleaseIndex] = {}
+_RELEASE_INDEXES_LOCK = threading.Lock()
+
+
+def get_release_indexes(
+    pkg_names: Iterable[str], fetcher: Union[None, Any] = None
+) -> Dict[str, Union[ReleaseIndex, Exception]]:
+    """Return the release indexes of several packages, fetching missing ones in parallel.
+
+    Indexes are cached for the lifetime of the process. Packages whose data can't
+    be retrieved map to the exception that was raised.
+    """
+
+    from kiara_plugin.develop.utils.pypi import get_pypi_metadata_fetcher
+
+    if fetcher is None:
+        fetcher = get_pypi_metadata_fetcher()
+
+    result: Dict[str, Union[ReleaseIndex, Exception]] = {}
+    futures: Dict[str, Future] = {}
+    for pkg_name in pkg_names:
+        name = canonicalize_name(pkg_name)
+        with _RELEASE_INDEXES_LOCK:
+            index = _RELEASE_INDEXES.get(name, None)
+        if index is not None:
+            result[pkg_name] = index
+        else:
+            futures[pkg_name] = fetcher.submit(pkg_name=pkg_name, version=None)
+
+    for pkg_name, future in futures.items():
+        try:
+            index = ReleaseIndex.from_pkg_data(future.result())
+        except Exception as e:
+            result[pkg_name] = e
+            continue
+        with _RELEASE_INDEXES_LOCK:
+            _RELEASE_INDEXES[canonicalize_name(pkg_name)] = index
+        result[pkg_name] = index
+
+    return result
+
+
+def get_release_index(pkg_name: str, fetcher: Union[None, Any] = None) -> ReleaseIndex:
+
+    index = get_release_indexes([pkg_name], fetcher=fetcher)[pkg_name]
+    if isinstance(index, Exception):
+        raise index
+    return index
+
+
+def create_requirement(req: str) -> Requirement:
+    """Parse a requirement in either PEP 508 ('pkg>=1.0') or conda ('pkg >=1.0') format."""
+
+    req = req.strip()
+    if " " in req and not any(c in req for c in ";@"):
+        name, spec = req.split(" ", 1)
+        spec = spec.replace(" ", "")
+        # conda treats a bare version as a prefix match
+        if spec and spec[0].isdigit():
+            spec = f"=={spec}" if "*" in spec else f"=={spec}.*"
+        req = f"{name}{spec}"
+    return Requirement(req)
+
+
+class RequirementCheck(BaseModel):
+
+    requirement: str = Field(description="The requirement that was checked.")
+    pkg_name: str = Field(description="The name of the required package.")
+    latest: Union[None, str] = Field(
+        description="The latest release of the package.", default=None
+    )
+    latest_matching: Union[None, str] = Field(
+        description="The latest release that satisfies the requirement.", default=None
+    )
+    error: Union[None, str] = Field(
+        description="The reason the package releases could not be retrieved.",
+        default=None,
+    )
+
+    @property
+    def satisfiable(self) -> bool:
+        return self.error is None and self.latest_matching is not None
+
+
+def check_requirements(
+    requirements: Iterable[str], fetcher: Union[None, Any] = None
+) -> List[RequirementCheck]:
+    """Check which releases satisfy each requirement, with one (parallel) lookup per package.
+
+    Requirements that can't be parsed, or that refer to packages which are not on
+    PyPI, are not checked, the returned item contains the reason as 'error'.
+    """
+
+    requirements = list(requirements)
+    checks: Dict[str, RequirementCheck] = {}
+    reqs = []
+    for req_str in requirements:
+        try:
+            req = create_requirement(req_str)
+        except InvalidRequirement as e:
+            pkg_name = re.split(r"[\s<>=!~\[;@]", req_str.strip(), maxsplit=1)[0]
+            checks[req_str] = RequirementCheck(
+                requirement=req_str,
+                pkg_name=pkg_name,
+                error=f"Can't parse requirement: {e}",
+            )
+            continue
+        if is_conda_only_pkg(req.name):
+            checks[req_str] = RequirementCheck(
+                requirement=req_str, pkg_name=req.name, error="Not a PyPI package."
+            )
+            continue
+        reqs.append((req_str, req))
+
+    indexes = get_release_indexes({req.name for _, req in reqs}, fetcher=fetcher)
+
+    for req_str, req in reqs:
+        index = indexes[req.name]
+        if isinstance(index, Exception):
+            checks[req_str] = RequirementCheck(
+                requirement=req_str, pkg_name=req.name, error=str(index)
+            )
+            continue
+        try:
+            latest = index.latest()
+        except Exception as e:
+            checks[req_str] = RequirementCheck(
+                requirement=req_str, pkg_name=req.name, error=str(e)
+            )
+            continue
+        checks[req_str] = RequirementCheck(
+            requirement=req_str,
+            pkg_name=req.name,
+            latest=latest,
+            latest_matching=index.latest_matching(req.specifier),
+        )
+
+    return [checks[r] for r in dict.fromkeys(requirements)]
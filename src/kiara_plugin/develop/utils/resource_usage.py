@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""Resource accounting for child processes, via 'os.wait4' and '/proc'."""
+import os
+import sys
+import time
+from subprocess import Popen
+from typing import TYPE_CHECKING, Dict, Union
+
+if TYPE_CHECKING:
+    from kiara_plugin.develop.pkg_build.models import ResourceUsage
+
+# 'ru_maxrss' is in kilobytes on Linux, in bytes on macOS
+MAX_RSS_FACTOR = 1 if sys.platform == "darwin" else 1024
+
+
+def read_proc_io(pid: int) -> Dict[str, int]:
+    """Read the I/O counters of a process from '/proc/<pid>/io', if available."""
+
+    try:
+        with open(f"/proc/{pid}/io", "rt") as f:
+            lines = f.readlines()
+    except OSError:
+        return {}
+
+    result = {}
+    for line in lines:
+        key, _, value = line.partition(":")
+        result[key.strip()] = int(value)
+    return result
+
+
+def create_resource_usage(
+    wall_time: float,
+    io: Dict[str, int],
+    user_time: Union[None, float] = None,
+    system_time: Union[None, float] = None,
+    max_rss: Union[None, int] = None,
+) -> "ResourceUsage":
+
+    from kiara_plugin.develop.pkg_build.models import ResourceUsage
+
+    return ResourceUsage(
+        wall_time=wall_time,
+        user_time=user_time,
+        system_time=system_time,
+        max_rss=max_rss,
+        read_bytes=io.get("read_bytes", None),
+        write_bytes=io.get("write_bytes", None),
+        read_chars=io.get("rchar", None),
+        write_chars=io.get("wchar", None),
+    )
+
+
+def wait_for_process(proc: Popen, start_time: float) -> "ResourceUsage":
+    """Wait for a process to exit, reap it, and return its resource usage.
+
+    The process is waited for without being reaped first ('WNOWAIT'), so its '/proc'
+    entry can still be read. Afterwards, 'os.wait4' reaps it and provides CPU times
+    and the maximum RSS.
+    """
+
+    io: Dict[str, int] = {}
+    if hasattr(os, "waitid"):
+        try:
+            os.waitid(os.P_PID, proc.pid, os.WEXITED | os.WNOWAIT)
+            io = read_proc_io(proc.pid)
+        except ChildProcessError:
+            pass
+
+    if not hasattr(os, "wait4") or proc.returncode is not None:
+        proc.wait()
+        return create_resource_usage(time.monotonic() - start_time, io=io)
+
+    try:
+        _, status, rusage = os.wait4(proc.pid, 0)
+    except ChildProcessError:
+        proc.wait()
+        return create_resource_usage(time.monotonic() - start_time, io=io)
+
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    return create_resource_usage(
+        time.monotonic() - start_time,
+        io=io,
+        user_time=rusage.ru_utime,
+        system_time=rusage.ru_stime,
+        max_rss=rusage.ru_maxrss * MAX_RSS_FACTOR,
+    )
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""A content-addressed store for package source archives."""
+import os
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Set, Union
+
+import structlog
+
+from kiara_plugin.develop.defaults import KIARA_DEV_SOURCE_CACHE_FOLDER
+from kiara_plugin.develop.utils import write_file_atomic
+from kiara_plugin.develop.utils.downloads import download_file, get_file_sha256
+
+if TYPE_CHECKING:
+    from kiara_plugin.develop.pkg_build.models import PkgSpec
+
+logger = structlog.getLogger()
+
+# records the state of the cached file when its digest was last checked
+VERIFIED_STAMP_FILE = ".verified"
+
+
+def _create_stamp(path: Path) -> str:
+
+    stat = path.stat()
+    return f"{path.name} {stat.st_size} {stat.st_mtime_ns}"
+
+
+class SourceCache(object):
+    """Stores downloaded source archives under their sha256 digest.
+
+    Files are kept at '<root>/<sha256[:2]>/<sha256>/<file_name>', the original file
+    name is preserved so build tools can still detect the archive type. Downloads are
+    resumable, and only moved into place once the digest matches. The size and
+    modification time of a verified file are recorded next to it, files that were
+    changed since (e.g. truncated) are verified again, and downloaded again if they
+    don't match their digest anymore.
+    """
+
+    def __init__(self, root: Union[str, Path] = KIARA_DEV_SOURCE_CACHE_FOLDER) -> None:
+
+        self._root: Path = Path(os.path.expanduser(root))
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+        self._verified: Set[Path] = set()
+
+    @property
+    def root(self) -> Path:
+        return self._root
+
+    def _get_lock(self, sha256: str) -> threading.Lock:
+
+        with self._locks_lock:
+            return self._locks.setdefault(sha256, threading.Lock())
+
+    def get_path(self, sha256: str) -> Union[None, Path]:
+        """Return the path to the cached file with the provided digest, or 'None'."""
+
+        folder = self._root / sha256[:2] / sha256
+        if not folder.is_dir():
+            return None
+        for f in folder.iterdir():
+            # hidden files are partial downloads
+            if not f.is_file() or f.name.startswith("."):
+                continue
+            if f in self._verified:
+                return f
+            stamp_file = folder / VERIFIED_STAMP_FILE
+            if not stamp_file.is_file() or stamp_file.read_text() != _create_stamp(f):
+                if get_file_sha256(f) != sha256:
+                    logger.debug(
+                        "source_cache.invalid", path=f.as_posix(), sha256=sha256
+                    )
+                    f.unlink()
+                    continue
+                self._mark_verified(f)
+            self._verified.add(f)
+            return f
+        return None
+
+    def _mark_verified(self, path: Path) -> None:
+
+        write_file_atomic(path.parent / VERIFIED_STAMP_FILE, _create_stamp(path))
+        self._verified.add(path)
+
+    def fetch(self, url: str, sha256: str) -> Path:
+        """Return the local path for the provided source, downloading it if necessary."""
+
+        sha256 = sha256.lower()
+        with self._get_lock(sha256):
+            path = self.get_path(sha256)
+            if path is not None:
+                logger.debug("source_cache.hit", url=url, sha256=sha256)
+                return path
+
+            folder = self._root / sha256[:2] / sha256
+            folder.mkdir(parents=True, exist_ok=True)
+            file_name = url.split("?", 1)[0].rsplit("/", 1)[-1]
+            path = download_file(url, folder / file_name, sha256=sha256)
+            self._mark_verified(path)
+
+            logger.debug("source_cache.downloaded", url=url, sha256=sha256)
+            return path
+
+    def get_source_url(self, package: "PkgSpec") -> Union[None, str]:
+        """Return a 'file://' url to the cached source of a package, if it is a (hashed) remote archive."""
+
+        if not package.pkg_hash or package.pkg_is_local:
+            return None
+        if not package.pkg_url.startswith(("https://", "http://")):
+            return None
+        if "{{" in package.pkg_url:
+            return None
+
+        return self.fetch(package.pkg_url, package.pkg_hash).absolute().as_uri()
+
+
+_SOURCE_CACHE: Union[None, SourceCache] = None
+
+
+def get_source_cache() -> SourceCache:
+
+    global _SOURCE_CACHE
+    if _SOURCE_CACHE is None:
+        _SOURCE_CACHE = SourceCache()
+    return _SOURCE_CACHE
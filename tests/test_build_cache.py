@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for build fingerprints, and the build cache."""
+
+from kiara_plugin.develop.pkg_build.build_cache import (
+    BuildCache,
+    create_build_fingerprint,
+    create_tree_hash,
+)
+from kiara_plugin.develop.pkg_build.models import PkgSpec, RattlerBuildPackageDetails
+
+
+def create_spec(**kwargs):
+
+    data = {
+        "pkg_name": "kiara",
+        "pkg_version": "0.5.0",
+        "pkg_url": "https://files/kiara-0.5.0.tar.gz",
+        "pkg_hash": "0" * 64,
+        "metadata": {
+            "home": "https://dharpa.org",
+            "license": "MPL-2.0",
+            "summary": "kiara",
+            "recipe_maintainers": [],
+        },
+    }
+    data.update(kwargs)
+    return PkgSpec(**data)
+
+
+def test_tree_hash(tmp_path):
+
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "module.py").write_text("x = 1")
+    first = create_tree_hash(tmp_path)
+
+    (tmp_path / ".git").mkdir()
+    (tmp_path / ".git" / "index").write_text("changed")
+    (tmp_path / "dist").mkdir()
+    (tmp_path / "dist" / "kiara.whl").write_text("changed")
+    assert create_tree_hash(tmp_path) == first
+
+    (tmp_path / "src" / "module.py").write_text("x = 2")
+    second = create_tree_hash(tmp_path)
+    assert second != first
+
+    # only build output folders in the project root are ignored
+    (tmp_path / "src" / "build").mkdir()
+    (tmp_path / "src" / "build" / "module.py").write_text("x = 1")
+    assert create_tree_hash(tmp_path) != second
+
+
+def test_build_fingerprint():
+
+    def fingerprint(package, channels=("conda-forge",)):
+        return create_build_fingerprint(
+            package,
+            recipe=package.create_rattler_build_recipe(),
+            build_tool_version="0.15.0",
+            channels=channels,
+            python_version="3.11",
+            package_formats=["tarbz2"],
+        )
+
+    first = fingerprint(create_spec())
+    assert fingerprint(create_spec()) == first
+    assert fingerprint(create_spec(pkg_hash="1" * 64)) != first
+    assert fingerprint(create_spec(), channels=["dharpa"]) != first
+
+
+def test_build_cache(tmp_path):
+
+    artifact = tmp_path / "build" / "kiara-0.5.0-py_0.tar.bz2"
+    artifact.parent.mkdir()
+    artifact.write_bytes(b"package")
+    recipe_file = tmp_path / "recipe" / "recipe.yaml"
+    recipe_file.parent.mkdir()
+    recipe_file.write_text("recipe")
+
+    cache = BuildCache(tmp_path / "cache")
+    assert cache.get("abc") is None
+
+    details = RattlerBuildPackageDetails(
+        run_details=[],
+        base_dir=tmp_path.as_posix(),
+        build_dir=artifact.parent.as_posix(),
+        meta_file=recipe_file.as_posix(),
+        package=create_spec(),
+        build_artifacts=[artifact.as_posix()],
+    )
+    cache.store("abc", details)
+
+    # the build folder is wiped by the next build
+    artifact.unlink()
+    cached = cache.get("abc")
+    assert cached.build_fingerprint == "abc"
+    assert [p.split("/")[-1] for p in cached.build_artifacts] == [artifact.name]
+    assert open(cached.build_artifacts[0], "rb").read() == b"package"
+
+    # the build folder (incl. the recipe) is gone, the details would point nowhere
+    recipe_file.unlink()
+    assert cache.get("abc") is None
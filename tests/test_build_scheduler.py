@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for the multi-package build scheduler, and the local channel it publishes to."""
+
+import io
+import json
+import tarfile
+import threading
+
+import pytest
+
+from kiara_plugin.develop.pkg_build.channel import LocalChannel
+from kiara_plugin.develop.pkg_build.models import PkgSpec, RattlerBuildPackageDetails
+from kiara_plugin.develop.pkg_build.scheduler import BuildScheduler, create_build_graph
+
+
+def create_spec(name, requirements):
+
+    return PkgSpec(
+        pkg_name=name,
+        pkg_version="1.0.0",
+        pkg_url=f"https://files/{name}-1.0.0.tar.gz",
+        pkg_hash="0" * 64,
+        pkg_requirements=requirements,
+        metadata={
+            "home": "https://dharpa.org",
+            "license": "MPL-2.0",
+            "summary": name,
+            "recipe_maintainers": [],
+        },
+    )
+
+
+def create_artifact(folder, name):
+
+    artifact = folder / f"{name}-1.0.0-py_0.tar.bz2"
+    artifact.parent.mkdir(exist_ok=True)
+    index = json.dumps({"name": name, "version": "1.0.0", "subdir": "noarch"})
+    with tarfile.open(artifact, "w:bz2") as tar:
+        info = tarfile.TarInfo("info/index.json")
+        info.size = len(index)
+        tar.addfile(info, io.BytesIO(index.encode()))
+    return artifact
+
+
+SPECS = [
+    create_spec("kiara", ["python >=3.8"]),
+    create_spec("kiara_plugin.core_types", ["kiara >=1.0.0"]),
+    create_spec("kiara_plugin.tabular", ["kiara-plugin.core-types", "pandas"]),
+    create_spec("kiara_plugin.network_analysis", ["kiara_plugin.tabular"]),
+    create_spec("kiara_plugin.onboarding", ["kiara"]),
+]
+
+
+def test_build_graph():
+
+    graph = create_build_graph(SPECS)
+    assert graph["kiara"] == set()
+    assert graph["kiara-plugin-tabular"] == {"kiara-plugin-core-types"}
+    assert graph["kiara-plugin-onboarding"] == {"kiara"}
+
+
+def test_build_packages(tmp_path):
+
+    channel = LocalChannel(tmp_path / "channel")
+    lock = threading.Lock()
+    built = []
+
+    def build(pkg):
+
+        # all dependencies must already be in the channel
+        repodata = json.loads((channel.path / "noarch" / "repodata.json").read_text())
+        available = {r["name"] for r in repodata["packages"].values()}
+        with lock:
+            built.append((pkg.pkg_name, available))
+
+        if pkg.pkg_name == "kiara_plugin.tabular":
+            raise Exception("build failed")
+
+        artifact = create_artifact(tmp_path / "build", pkg.pkg_name)
+        # like 'RattlerBuildEnvMgmt.build_package', publish to the local channel
+        channel.add_packages([artifact])
+
+        return RattlerBuildPackageDetails(
+            run_details=[],
+            base_dir=tmp_path.as_posix(),
+            build_dir=tmp_path.as_posix(),
+            meta_file="recipe.yaml",
+            package=pkg,
+            build_artifacts=[artifact.as_posix()],
+        )
+
+    results = BuildScheduler(build, channel=channel, max_workers=2).build(SPECS)
+
+    available = dict(built)
+    assert available["kiara_plugin.core_types"] == {"kiara"}
+    assert "kiara_plugin.core_types" in available["kiara_plugin.tabular"]
+    assert "kiara_plugin.network_analysis" not in available
+
+    assert isinstance(results["kiara_plugin.tabular"], Exception)
+    assert isinstance(results["kiara_plugin.network_analysis"], Exception)
+    assert isinstance(results["kiara_plugin.onboarding"], RattlerBuildPackageDetails)
+    assert (channel.path / "noarch" / "kiara_plugin.onboarding-1.0.0-py_0.tar.bz2").is_file()
+
+
+def test_channel_index_is_incremental(tmp_path):
+
+    channel = LocalChannel(tmp_path / "channel")
+    channel.add_packages([create_artifact(tmp_path, "kiara")])
+
+    # existing records are not re-created when new packages are added
+    repodata_file = channel.path / "noarch" / "repodata.json"
+    repodata = json.loads(repodata_file.read_text())
+    repodata["packages"]["kiara-1.0.0-py_0.tar.bz2"]["marker"] = True
+    repodata_file.write_text(json.dumps(repodata))
+
+    channel.add_packages([create_artifact(tmp_path, "kiara_plugin.core_types")])
+    repodata = json.loads(repodata_file.read_text())
+    assert repodata["packages"]["kiara-1.0.0-py_0.tar.bz2"]["marker"]
+    assert repodata["packages"]["kiara_plugin.core_types-1.0.0-py_0.tar.bz2"]["name"] == "kiara_plugin.core_types"
+
+    # a full re-index picks up all packages in the folder
+    assert sorted(channel.index("noarch")["packages"].keys()) == [
+        "kiara-1.0.0-py_0.tar.bz2",
+        "kiara_plugin.core_types-1.0.0-py_0.tar.bz2",
+    ]
+
+
+def test_duplicate_packages_are_rejected(tmp_path):
+
+    scheduler = BuildScheduler(
+        build_func=lambda spec: None, channel=LocalChannel(tmp_path / "channel")
+    )
+    with pytest.raises(Exception, match="Duplicate package"):
+        scheduler.build([create_spec("kiara", []), create_spec("Kiara", [])])
+
+
+FAKE_RATTLER_BUILD = """#!{python}
+import shutil, sys
+from pathlib import Path
+
+args = sys.argv[1:]
+channels = [args[i + 1] for i, a in enumerate(args) if a == "--channel"]
+local = Path(channels[0][len("file://"):])
+if not (local / "noarch" / "repodata.json").is_file():
+    print(f"invalid channel: {{channels[0]}}", file=sys.stderr)
+    sys.exit(1)
+if "--render-only" in args:
+    print("[]")
+    sys.exit(0)
+output_dir = Path(args[args.index("--output-dir") + 1]) / "noarch"
+output_dir.mkdir(parents=True)
+shutil.copy2("{artifact}", output_dir)
+"""
+
+
+def test_build_package_with_fresh_local_channel(tmp_path, monkeypatch):
+
+    import sys
+
+    from kiara_plugin.develop.pkg_build import rattler
+    from kiara_plugin.develop.pkg_build.build_cache import BuildCache
+    from kiara_plugin.develop.utils import package_cache
+
+    artifact = create_artifact(tmp_path / "artifacts", "kiara")
+    bin_path = tmp_path / "rattler-build"
+    bin_path.write_text(
+        FAKE_RATTLER_BUILD.format(python=sys.executable, artifact=artifact.as_posix())
+    )
+    bin_path.chmod(0o755)
+
+    cache_root = tmp_path / "pkgs"
+    monkeypatch.setattr(rattler, "KIARA_DEV_CACHE_FOLDER", tmp_path.as_posix())
+    monkeypatch.setattr(rattler, "BuildCache", lambda: BuildCache(tmp_path / "builds"))
+    monkeypatch.setattr(
+        rattler, "get_package_cache_env", lambda: package_cache.get_package_cache_env(cache_root)
+    )
+    monkeypatch.setattr(
+        rattler, "package_cache_in_use", lambda: package_cache.package_cache_in_use(cache_root)
+    )
+    monkeypatch.setattr(
+        rattler,
+        "mark_packages_used",
+        lambda pkgs: package_cache.mark_packages_used(pkgs, root=cache_root),
+    )
+
+    class NoSourceCache(object):
+        def get_source_url(self, package):
+            return None
+
+    monkeypatch.setattr(rattler, "get_source_cache", NoSourceCache)
+
+    mgmt = rattler.RattlerBuildEnvMgmt()
+    monkeypatch.setattr(
+        mgmt, "get_state_details", lambda _: {"rattler_build_bin": bin_path.as_posix()}
+    )
+
+    channel = LocalChannel(tmp_path / "channel")
+    details = mgmt.build_package(
+        create_spec("kiara", []),
+        package_formats="tarbz2",
+        show_output=False,
+        local_channel=channel,
+        use_local_channel=True,
+    )
+
+    assert [r.resource_usage is not None for r in details.run_details] == [True, True]
+    assert (channel.path / "noarch" / "kiara-1.0.0-py_0.tar.bz2").is_file()
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for the conversion between conda package formats."""
+
+import io
+import json
+import tarfile
+
+import pytest
+
+from kiara_plugin.develop.utils.conda_package import (
+    read_package_file,
+    transcode_package,
+    zstandard_available,
+)
+
+FILES = {
+    "info/index.json": json.dumps({"name": "kiara", "version": "0.5.0"}).encode(),
+    "info/paths.json": json.dumps({"paths": [{"_path": "site-packages/kiara/__init__.py"}]}).encode(),
+    "site-packages/kiara/__init__.py": b"print('kiara')\n" * 1000,
+}
+
+
+def read_members(path):
+
+    result = {}
+    for name in FILES.keys():
+        result[name] = read_package_file(path, name)
+    return result
+
+
+@pytest.mark.skipif(not zstandard_available(), reason="'zstandard' not installed")
+def test_transcode_roundtrip(tmp_path):
+
+    source = tmp_path / "kiara-0.5.0-py_0.tar.bz2"
+    with tarfile.open(source, "w:bz2") as tar:
+        for name, content in FILES.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            tar.addfile(info, io.BytesIO(content))
+
+    conda_pkg = transcode_package(source, "conda")
+    assert conda_pkg.name == "kiara-0.5.0-py_0.conda"
+    assert read_members(conda_pkg) == FILES
+
+    back = transcode_package(conda_pkg, "tarbz2", target_dir=tmp_path / "out")
+    assert read_members(back) == FILES
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for the transitive dependency graph."""
+
+import pytest
+
+from kiara_plugin.develop.utils.dependency_graph import DependencyGraph
+from kiara_plugin.develop.utils.pypi import PyPiMetadataFetcher
+
+PACKAGES = {
+    "app": {"1.0": ["lib-a>=1.0", "lib-b[extra]"]},
+    "lib-a": {"1.0": [], "2.0": ["lib-c"]},
+    "lib-b": {"1.0": ["lib-a<2", "lib-c; extra == 'extra'"]},
+    "lib-c": {"1.0": []},
+}
+
+
+class FakeFetcher(PyPiMetadataFetcher):
+    def __init__(self, packages, yanked=()):
+        super().__init__(cache=None, max_workers=2)  # type: ignore
+        self.packages = packages
+        self.yanked = set(yanked)
+
+    def _fetch(self, pkg_name, version):
+        releases = self.packages[pkg_name]
+        if not version:
+            version = max(releases.keys())
+        return {
+            "info": {
+                "name": pkg_name,
+                "version": version,
+                "requires_dist": releases[version],
+            },
+            "releases": {
+                v: [{"yanked": (pkg_name, v) in self.yanked}] for v in releases.keys()
+            },
+        }
+
+
+def test_dependency_graph_order():
+
+    graph = DependencyGraph(fetcher=FakeFetcher(PACKAGES))
+    root = graph.resolve("app")
+
+    assert root.pkg_version == "1.0"
+    assert graph.find_cycles() == []
+
+    order = graph.topological_order()
+    assert order[-1] == "app"
+    assert order.index("lib-c") < order.index("lib-b")
+
+    # lib-a is required twice, with different version constraints
+    versions = {n.pkg_version for n in graph.nodes.values() if n.pkg_name == "lib-a"}
+    assert versions == {"1.0", "2.0"}
+
+
+def test_dependency_graph_cycles():
+
+    packages = {"x": {"1.0": ["y"]}, "y": {"1.0": ["x"]}}
+    graph = DependencyGraph(fetcher=FakeFetcher(packages))
+    graph.resolve("x")
+
+    assert graph.find_cycles() == [["x", "y"]]
+    with pytest.raises(Exception):
+        graph.topological_order()
+
+
+def test_unpinned_requirements_skip_prereleases_and_yanked_releases():
+
+    # the 'info' section of the unpinned package data refers to '3.0a1'
+    packages = {
+        "app": {"1.0": ["lib"]},
+        "lib": {"1.0": [], "2.0": [], "3.0a1": []},
+    }
+    graph = DependencyGraph(
+        fetcher=FakeFetcher(packages, yanked=[("lib", "2.0")])
+    )
+    graph.resolve("app")
+
+    assert graph.packages() == {"app": "1.0", "lib": "1.0"}
+
+    graph = DependencyGraph(fetcher=FakeFetcher(packages), allow_prereleases=True)
+    graph.resolve("app")
+
+    assert graph.packages()["lib"] == "3.0a1"
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for resumable, checksum-verified downloads, against a local http server."""
+
+import hashlib
+import io
+import tarfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import ClassVar, List, Union
+
+import httpx
+import pytest
+
+from kiara_plugin.develop.utils.downloads import (
+    download_file,
+    extract_tar_member,
+    get_partial_path,
+)
+
+CONTENT = bytes(range(256)) * 4096
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+
+    # the number of bytes to send before dropping the connection, per request
+    cut_offs: ClassVar[List[int]] = []
+    ranges: ClassVar[List[Union[None, str]]] = []
+
+    def do_GET(self):
+
+        start = 0
+        range_header = self.headers.get("Range")
+        RangeHandler.ranges.append(range_header)
+        if range_header:
+            start = int(range_header.split("=")[1].rstrip("-"))
+        data = CONTENT[start:]
+
+        self.send_response(206 if start else 200)
+        self.send_header("Content-Length", str(len(data)))
+        if start:
+            self.send_header(
+                "Content-Range", f"bytes {start}-{len(CONTENT) - 1}/{len(CONTENT)}"
+            )
+        self.end_headers()
+
+        if RangeHandler.cut_offs:
+            self.wfile.write(data[: RangeHandler.cut_offs.pop(0)])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture()
+def server_url():
+
+    RangeHandler.cut_offs = []
+    RangeHandler.ranges = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/file.bin"
+    server.shutdown()
+
+
+def test_download_resumes(tmp_path, server_url):
+
+    RangeHandler.cut_offs = [100_000, 300_000]
+    target = tmp_path / "file.bin"
+    sha256 = hashlib.sha256(CONTENT).hexdigest()
+
+    with httpx.Client() as client:
+        download_file(server_url, target, sha256=sha256, client=client)
+
+    assert target.read_bytes() == CONTENT
+    assert RangeHandler.ranges == [None, "bytes=100000-", "bytes=400000-"]
+    assert not get_partial_path(target).exists()
+
+
+def test_download_resumes_partial_file_of_previous_run(tmp_path, server_url):
+
+    target = tmp_path / "file.bin"
+    get_partial_path(target).write_bytes(CONTENT[:200_000])
+    sha256 = hashlib.sha256(CONTENT).hexdigest()
+
+    with httpx.Client() as client:
+        download_file(server_url, target, sha256=sha256, client=client)
+
+    assert target.read_bytes() == CONTENT
+    assert RangeHandler.ranges == ["bytes=200000-"]
+
+    # a corrupted prefix is detected too
+    get_partial_path(target).write_bytes(b"x" * 200_000)
+    target.unlink()
+    with httpx.Client() as client, pytest.raises(Exception):
+        download_file(server_url, target, sha256=sha256, client=client)
+    assert not target.exists()
+
+
+def test_download_invalid_digest(tmp_path, server_url):
+
+    target = tmp_path / "file.bin"
+    with httpx.Client() as client, pytest.raises(Exception):
+        download_file(server_url, target, sha256="0" * 64, client=client)
+
+    assert not target.exists()
+    assert not get_partial_path(target).exists()
+
+
+def test_extract_tar_member(tmp_path):
+
+    archive = tmp_path / "archive.tar.bz2"
+    with tarfile.open(archive, "w:bz2") as tar:
+        info = tarfile.TarInfo("bin/tool")
+        info.size = len(CONTENT)
+        info.mode = 0o755
+        tar.addfile(info, io.BytesIO(CONTENT))
+
+    target = extract_tar_member(archive, "bin/tool", tmp_path / "bin" / "tool")
+    assert target.read_bytes() == CONTENT
+    assert target.stat().st_mode & 0o777 == 0o755
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for running sub-processes."""
+
+import asyncio
+import sys
+import time
+
+import pytest
+
+from kiara_plugin.develop import utils
+from kiara_plugin.develop.utils import (
+    ExecutionException,
+    LineSplitter,
+    MultiplexedExecution,
+    execute,
+    execute_async,
+)
+
+
+def test_line_splitter_chunk_boundaries():
+
+    data = "äb\r\nc\rd\ne".encode("utf-8")
+    splitter = LineSplitter()
+
+    lines = []
+    for i in range(len(data)):
+        lines.extend(splitter.feed(data[i : i + 1]))
+    lines.extend(splitter.feed(b"", final=True))
+
+    assert lines == ["äb", "c", "d", "e"]
+
+
+def test_execute_streams():
+
+    stdout = []
+    script = "import sys; print('out'); print('err', file=sys.stderr); print('last', end='')"
+    result = execute(sys.executable, "-c", script, stdout_callback=stdout.append)
+
+    assert stdout == ["out", "last"]
+    assert result.stdout == "out\nlast"
+    assert result.stderr == "err"
+
+
+def test_execute_spills_to_log_files(tmp_path):
+
+    script = "for i in range(10000): print(f'line {i}')"
+    result = execute(
+        sys.executable, "-c", script, log_dir=tmp_path, log_name="test", buffer_size=100
+    )
+
+    assert result.truncated
+    assert len(result.stdout) <= 100
+    assert result.stdout_file == (tmp_path / "test.stdout.log").as_posix()
+    assert result.tail(3) == ["line 9997", "line 9998", "line 9999"]
+    assert result.tail(50)[0] == "line 9950"
+    assert result.grep(r"line 12\d\d$") == [f"line {i}" for i in range(1200, 1300)]
+    assert len(result.read_output().split("\n")) == 10000
+
+
+def test_execute_async_timeout_kills_process_group():
+
+    # the child process would keep the pipes open if it wasn't killed
+    script = "import subprocess, sys, time; subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)']); time.sleep(30)"
+
+    start = time.monotonic()
+    with pytest.raises(ExecutionException) as e:
+        asyncio.run(execute_async(sys.executable, "-c", script, timeout=0.5))
+
+    assert time.monotonic() - start < 10
+    assert e.value.run_details.exit_code != 0
+    assert e.value.run_details.resource_usage.wall_time < 10
+
+
+def test_execute_async_cancelled_while_starting(monkeypatch):
+
+    procs = []
+    wait_in_thread = utils._wait_in_thread
+
+    def _wait(proc, start_time):
+        procs.append(proc)
+        return wait_in_thread(proc, start_time=start_time)
+
+    async def _never_connected(pipe):
+        await asyncio.sleep(30)
+
+    monkeypatch.setattr(utils, "_wait_in_thread", _wait)
+    monkeypatch.setattr(utils, "_connect_reader", _never_connected)
+
+    async def run():
+        task = asyncio.create_task(
+            execute_async(sys.executable, "-c", "import time; time.sleep(30)")
+        )
+        await asyncio.sleep(0.5)
+        task.cancel()
+        await task
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(run())
+
+    (proc,) = procs
+    assert proc.returncode is not None
+    assert proc.stdout.closed and proc.stderr.closed
+
+
+def test_multiplexed_execution():
+
+    async def run():
+        execution = MultiplexedExecution(max_concurrency=2)
+        for label in ["a", "b", "c"]:
+            execution.add(label, sys.executable, "-c", f"print('{label}1'); print('{label}2')")
+        execution.add("fail", sys.executable, "-c", "import sys; sys.exit(3)")
+
+        lines = [item async for item in execution.stream()]
+        return lines, execution.results
+
+    lines, results = asyncio.run(run())
+
+    assert sorted(lines) == sorted(
+        (label, "stdout", f"{label}{i}") for label in "abc" for i in (1, 2)
+    )
+    assert results["a"].stdout == "a1\na2"
+    assert results["fail"].run_details.exit_code == 3
+
+
+def test_execute_resource_usage(tmp_path):
+
+    script = f"open({str(tmp_path / 'out')!r}, 'wb').write(b'x' * 1000000); sum(range(2000000))"
+    result = execute(sys.executable, "-c", script)
+
+    usage = result.resource_usage
+    assert usage.wall_time > 0
+    assert usage.user_time > 0
+    assert usage.max_rss > 1024 * 1024
+    if sys.platform == "linux":
+        assert usage.write_chars >= 1000000
+
+
+
+def test_execute_async_resource_usage():
+
+    script = "sum(range(2000000))"
+    result = asyncio.run(execute_async(sys.executable, "-c", script))
+
+    usage = result.resource_usage
+    assert usage.user_time > 0
+    assert usage.max_rss > 1024 * 1024
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for the (dependency) graph helpers."""
+
+import pytest
+
+from kiara_plugin.develop.utils.graph_utils import (
+    DependencyCycleException,
+    topological_order,
+)
+
+
+def test_topological_order():
+
+    graph = {"app": {"lib-b", "lib-a"}, "lib-a": set(), "lib-b": {"lib-a"}, "cli": set()}
+
+    assert topological_order(graph) == ["cli", "lib-a", "lib-b", "app"]
+
+
+def test_topological_order_cycle():
+
+    graph = {"x": ["y"], "y": ["x"], "z": ["x"], "other": []}
+
+    with pytest.raises(DependencyCycleException) as e:
+        topological_order(graph)
+
+    assert e.value.nodes == ["x", "y", "z"]
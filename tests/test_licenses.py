@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for the license normalization."""
+
+import pytest
+
+from kiara_plugin.develop.utils.licenses import LicenseIndex
+
+
+@pytest.fixture(scope="module")
+def license_index() -> LicenseIndex:
+    return LicenseIndex.create()
+
+
+@pytest.mark.parametrize(
+    "license, classifiers, expected",
+    [
+        ("MIT", None, ("MIT", "MIT")),
+        ("The MIT License", None, ("MIT", "MIT")),
+        ("Apache 2.0", None, ("Apache-2.0", "APACHE")),
+        ("apache-2.0", None, ("Apache-2.0", "APACHE")),
+        ("GPLv3+", None, ("GPL-3.0-or-later", "GPL3")),
+        ("MPL 2.0", None, ("MPL-2.0", "MOZILLA")),
+        ("MIT or Apache 2.0", None, ("MIT OR Apache-2.0", None)),
+        # typos are corrected, version numbers are not
+        ("Apache Licence 2.0", None, ("Apache-2.0", "APACHE")),
+        ("gpl-4.0-only", None, ("LicenseRef-gpl-4.0-only", "OTHER")),
+        # no specific license
+        ("Public Domain", None, ("LicenseRef-Public-Domain", "PUBLIC-DOMAIN")),
+        ("BSD", None, ("LicenseRef-BSD", "OTHER")),
+        ("GPL", None, ("LicenseRef-GPL", "OTHER")),
+        (
+            None,
+            ["License :: OSI Approved :: BSD License"],
+            ("LicenseRef-unknown", "OTHER"),
+        ),
+        # classifiers, if the license string can't be mapped
+        (
+            "see LICENSE file",
+            ["License :: OSI Approved :: MIT License"],
+            ("MIT", "MIT"),
+        ),
+        (
+            None,
+            ["License :: Public Domain"],
+            ("LicenseRef-Public-Domain", "PUBLIC-DOMAIN"),
+        ),
+        (
+            "Copyright (c) 2023\nAll rights reserved.",
+            None,
+            ("LicenseRef-Copyright-c-2023", "OTHER"),
+        ),
+        (None, None, ("LicenseRef-unknown", "OTHER")),
+    ],
+)
+def test_normalize(license_index, license, classifiers, expected):
+
+    assert license_index.normalize(license, classifiers=classifiers) == expected
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for spec-based detection and incremental updates of mamba environments."""
+
+import os
+import stat
+
+from kiara_plugin.develop.pkg_build.conda.states import (
+    MambaEnvironment,
+    get_dependency_name,
+)
+from kiara_plugin.develop.pkg_build.states import State, States
+
+# records its arguments, and creates the environment prefix
+FAKE_MICROMAMBA = """#!/bin/sh
+echo "$@" >> "{log}"
+while [ "$#" -gt 0 ]; do
+    if [ "$1" = "-p" ]; then mkdir -p "$2/conda-meta"; touch "$2/conda-meta/history"; fi
+    shift
+done
+"""
+
+
+class FakeMicroMamba(State):
+    def _resolve(self):
+        return {"micromamba_bin": self.get_config("path")}
+
+    def _purge(self):
+        pass
+
+
+def create_states(tmp_path, dependencies, channels=("conda-forge",)):
+
+    bin_path = tmp_path / "micromamba"
+    bin_path.write_text(FAKE_MICROMAMBA.format(log=tmp_path / "calls.log"))
+    bin_path.chmod(bin_path.stat().st_mode | stat.S_IEXEC)
+
+    states = States(cache_path=None)
+    states.add_state(FakeMicroMamba("micromamba_available", path=bin_path.as_posix()))
+    states.add_state(
+        MambaEnvironment(
+            "env",
+            env_name="env",
+            channels=list(channels),
+            dependencies=dependencies,
+            mamba_prefix=(tmp_path / "envs").as_posix(),
+        )
+    )
+    return states
+
+
+def get_calls(tmp_path):
+
+    calls = (tmp_path / "calls.log").read_text().splitlines()
+    os.unlink(tmp_path / "calls.log")
+    return [c.split(" --yes")[0] for c in calls]
+
+
+def test_dependency_name():
+
+    assert get_dependency_name("python==3.9") == "python"
+    assert get_dependency_name("conda-forge::boa >=0.15") == "boa"
+
+
+def test_incremental_update(tmp_path):
+
+    create_states(tmp_path, ["python==3.9", "boa"]).resolve("env")
+    assert get_calls(tmp_path) == ["create -c conda-forge boa python==3.9"]
+
+    # unchanged spec: detected from the filesystem, no micromamba calls
+    create_states(tmp_path, ["boa", "python==3.9"]).resolve("env")
+    assert not (tmp_path / "calls.log").exists()
+
+    create_states(tmp_path, ["python==3.10", "pip"]).resolve("env")
+    assert get_calls(tmp_path) == [
+        "remove boa",
+        "install -c conda-forge pip python==3.10",
+    ]
+
+    # changed channels re-create the environment
+    create_states(tmp_path, ["python==3.10", "pip"], channels=["dharpa"]).resolve("env")
+    assert get_calls(tmp_path) == ["create -c dharpa pip python==3.10"]
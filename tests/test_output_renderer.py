@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for the command output renderer."""
+
+import io
+
+from rich.console import Console
+
+from kiara_plugin.develop.utils.output_renderer import OutputRenderer
+
+
+def test_plain_output():
+
+    output = io.StringIO()
+    with OutputRenderer(title="build", plain_output=output) as renderer:
+        renderer.stdout("[red]not markup[/red]")
+        renderer.stderr("error")
+
+    assert output.getvalue() == "build\nstdout: [red]not markup[/red]\nstderr: error\n"
+
+
+def test_live_output_tail():
+
+    console = Console(file=io.StringIO(), force_terminal=True, width=80)
+    with OutputRenderer(title="build", tail_lines=3, console=console) as renderer:
+        renderer.set_phase("packaging")
+        for i in range(100):
+            renderer.stdout(f"line {i}")
+
+    output = console.file.getvalue()
+    assert "[packaging]" in output
+    assert "100 stdout" in output
+    assert "line 99" in output
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for the size limit of the shared package cache."""
+
+import os
+import time
+
+from kiara_plugin.develop.pkg_build.rattler import get_resolved_packages
+from kiara_plugin.develop.utils.package_cache import (
+    get_package_cache_env,
+    mark_packages_used,
+    package_cache_in_use,
+    prune_package_cache,
+)
+
+
+def create_package(pkgs_dir, name, age):
+
+    folder = pkgs_dir / name
+    (folder / "info").mkdir(parents=True)
+    (folder / "info" / "index.json").write_bytes(b"x" * 1000)
+    # the modification time of an extracted package is the time it was extracted
+    extracted = time.time() - age
+    os.utime(folder, (extracted, extracted))
+    return folder
+
+
+def test_prune_package_cache(tmp_path):
+
+    pkgs_dir = tmp_path / "rattler" / "pkgs"
+    for name, age in [("old-1.0-0", 3600), ("older-1.0-0", 7200), ("new-1.0-0", 0)]:
+        create_package(pkgs_dir, name, age)
+    (pkgs_dir / "older-1.0-0.lock").write_text("")
+    (tmp_path / "rattler" / "repodata").mkdir()
+
+    assert get_package_cache_env(tmp_path)["RATTLER_CACHE_DIR"] == (tmp_path / "rattler").as_posix()
+
+    freed = prune_package_cache(tmp_path, max_size=500, min_age=600)
+    assert freed == 2000
+    # recently used packages are kept, even if the cache is still too large
+    assert sorted(p.name for p in pkgs_dir.iterdir()) == ["new-1.0-0"]
+    assert (tmp_path / "rattler" / "repodata").is_dir()
+
+
+def test_prune_uses_last_use_markers(tmp_path):
+
+    pkgs_dir = tmp_path / "conda"
+    create_package(pkgs_dir, "python-3.11.7-h123_0", 7200)
+    create_package(pkgs_dir, "pip-23.3-pyhd8ed1ab_0", 3600)
+
+    # extracted long ago, but used by a recent build
+    mark_packages_used(["python-3.11.7-h123_0"], root=tmp_path)
+
+    assert prune_package_cache(tmp_path, max_size=1500, min_age=600) == 1000
+    assert [p.name for p in pkgs_dir.iterdir()] == ["python-3.11.7-h123_0"]
+
+
+def test_prune_is_skipped_while_cache_in_use(tmp_path):
+
+    pkgs_dir = tmp_path / "rattler" / "pkgs"
+    create_package(pkgs_dir, "old-1.0-0", 3600)
+
+    with package_cache_in_use(tmp_path):
+        assert prune_package_cache(tmp_path, max_size=0, min_age=600) == 0
+    assert (pkgs_dir / "old-1.0-0").is_dir()
+
+    assert prune_package_cache(tmp_path, max_size=0, min_age=600) == 1000
+
+
+def test_prune_repodata_cache(tmp_path):
+
+    repodata_dir = tmp_path / "rattler" / "repodata"
+    repodata_dir.mkdir(parents=True)
+    for name, age in [("a1b2", 7200), ("c3d4", 3600), ("e5f6", 0)]:
+        for f in (repodata_dir / f"{name}.json", repodata_dir / f"{name}.info.json"):
+            f.write_bytes(b"x" * 500)
+            os.utime(f, (time.time() - age, time.time() - age))
+
+    freed = prune_package_cache(
+        tmp_path, max_size=0, repodata_max_size=1500, min_age=600
+    )
+    assert freed == 2000
+    assert sorted(p.name for p in repodata_dir.iterdir()) == ["e5f6.info.json", "e5f6.json"]
+
+
+def test_get_resolved_packages():
+
+    rendered = [
+        {
+            "recipe": {"package": {"name": "kiara"}},
+            "finalized_dependencies": {
+                "build": None,
+                "host": {
+                    "specs": [{"spec": "python >=3.8"}],
+                    "resolved": [
+                        {"name": "python", "version": "3.11.7", "build": "h123_0"},
+                        {"name": "pip", "version": "23.3", "build": "pyhd8ed1ab_0"},
+                    ],
+                },
+            },
+        }
+    ]
+
+    assert sorted(get_resolved_packages(rendered)) == [
+        "pip-23.3-pyhd8ed1ab_0",
+        "python-3.11.7-h123_0",
+    ]
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for the local (sqlite) package index."""
+
+import sqlite3
+
+from kiara_plugin.develop.utils import pypi
+from kiara_plugin.develop.utils.pkg_index import PackageIndex, parse_pkg_item
+
+
+def create_pkg_data(name, version, requires_dist=None, classifiers=None):
+
+    return {
+        "info": {
+            "name": name,
+            "version": version,
+            "summary": f"The {name} package.",
+            "license": None,
+            "home_page": None,
+            "project_urls": {"Homepage": f"https://example.com/{name}"},
+            "requires_python": ">=3.8",
+            "requires_dist": requires_dist,
+            "classifiers": classifiers or [],
+        },
+        "releases": {
+            v: [
+                {
+                    "filename": f"{name}-{v}.tar.gz",
+                    "url": f"https://files/{name}-{v}.tar.gz",
+                    "packagetype": "sdist",
+                    "digests": {"sha256": f"sha-{v}"},
+                    "requires_python": ">=3.8",
+                    "yanked": False,
+                }
+            ]
+            for v in ["0.4.0", "0.5.0"]
+        },
+    }
+
+
+class FakeFetcher(object):
+    def __init__(self, pkg_data):
+        self.pkg_data = pkg_data
+
+    def get_many(self, pkgs):
+        return {(n, v): self.pkg_data[(n, v or "0.5.0")] for n, v in pkgs}
+
+
+PKG_DATA = {
+    ("Kiara", "0.5.0"): create_pkg_data(
+        "Kiara",
+        "0.5.0",
+        requires_dist=["httpx>=0.23"],
+        classifiers=["License :: OSI Approved :: Mozilla Public License 2.0 (MPL 2.0)"],
+    ),
+    ("Kiara", "0.4.0"): create_pkg_data("Kiara", "0.4.0"),
+    ("orjson", "0.5.0"): create_pkg_data("orjson", "0.5.0"),
+}
+
+
+def test_parse_pkg_item():
+
+    assert parse_pkg_item("kiara") == ("kiara", None)
+    assert parse_pkg_item(" kiara == 0.5.0 ") == ("kiara", "0.5.0")
+
+
+def test_sync_and_round_trip(tmp_path):
+
+    index = PackageIndex(tmp_path / "index.sqlite")
+    result = index.sync(["Kiara==0.4.0", "orjson"], fetcher=FakeFetcher(PKG_DATA))
+
+    assert sorted(result["kiara"]) == ["0.4.0", "0.5.0"]
+    assert result["orjson"] == ["0.5.0"]
+
+    latest = index.get_pkg_data("kiara")
+    assert latest["info"] == PKG_DATA[("Kiara", "0.5.0")]["info"]
+    assert latest["releases"] == PKG_DATA[("Kiara", "0.5.0")]["releases"]
+
+    pinned = index.get_pkg_data("KIARA", "0.4.0")
+    assert pinned["info"]["version"] == "0.4.0"
+    assert pinned["info"]["requires_dist"] is None
+
+
+def test_query(tmp_path):
+
+    index = PackageIndex(tmp_path / "index.sqlite")
+    index.sync(["Kiara==0.4.0", "orjson"], fetcher=FakeFetcher(PKG_DATA))
+
+    assert [p["name"] for p in index.query()] == ["kiara", "orjson"]
+    (kiara,) = index.query("kia*")
+    assert kiara["latest_version"] == "0.5.0"
+    assert sorted(kiara["versions"]) == ["0.4.0", "0.5.0"]
+
+
+def test_index_without_classifiers_column(tmp_path):
+
+    db_path = tmp_path / "index.sqlite"
+    conn = sqlite3.connect(db_path.as_posix())
+    conn.execute(
+        "CREATE TABLE releases (name TEXT NOT NULL, version TEXT NOT NULL, summary TEXT, license TEXT, home_page TEXT, project_urls TEXT, requires_python TEXT, requires_dist TEXT, PRIMARY KEY (name, version))"
+    )
+    conn.close()
+
+    index = PackageIndex(db_path)
+    index.sync(["Kiara"], fetcher=FakeFetcher(PKG_DATA))
+
+    assert index.get_pkg_data("kiara")["info"]["classifiers"] == [
+        "License :: OSI Approved :: Mozilla Public License 2.0 (MPL 2.0)"
+    ]
+
+
+def test_offline_backend_uses_index_path(tmp_path, monkeypatch):
+
+    db_path = tmp_path / "custom.sqlite"
+    PackageIndex(db_path).sync(["orjson"], fetcher=FakeFetcher(PKG_DATA))
+
+    monkeypatch.setattr(
+        pypi, "_PYPI_METADATA_CACHE", pypi.PyPiMetadataCache((tmp_path / "cache").as_posix())
+    )
+    monkeypatch.setattr(pypi, "_PYPI_METADATA_FETCHER", None)
+    previous = pypi.set_pypi_metadata_backend("json")
+    fetcher = pypi.set_pypi_metadata_backend("index", pkg_index_path=db_path.as_posix())
+    try:
+        assert previous._executor._shutdown
+        assert fetcher.get("orjson")["info"]["version"] == "0.5.0"
+    finally:
+        fetcher.shutdown()
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for the package list parser, and batch spec creation."""
+
+import os
+
+import pytest
+
+from kiara_plugin.develop.utils import write_file_atomic
+from kiara_plugin.develop.utils.pkg_utils import create_pkg_specs, parse_pkg_list
+
+
+def test_parse_pkg_list(tmp_path):
+
+    lines = [
+        "kiara",
+        "",
+        "  kiara_plugin.tabular==0.5.1  ",
+        "orjson==3.9.0 patches/orjson.yaml",
+        "pandas /abs/pandas.yaml",
+    ]
+
+    assert parse_pkg_list(lines, base_dir=tmp_path) == [
+        ("kiara", None, None),
+        ("kiara_plugin.tabular", "0.5.1", None),
+        ("orjson", "3.9.0", os.path.join(tmp_path, "patches/orjson.yaml")),
+        ("pandas", None, "/abs/pandas.yaml"),
+    ]
+
+    with pytest.raises(Exception, match="Invalid package list item"):
+        parse_pkg_list(["kiara 0.5.0 patch.yaml"])
+
+
+def test_duplicate_packages_are_rejected():
+
+    with pytest.raises(Exception, match="Duplicate package"):
+        create_pkg_specs([("foo", "1.0", None), ("Foo", "2.0", None)])
+
+
+def test_write_file_atomic(tmp_path):
+
+    path = tmp_path / "sub" / "spec.json"
+    write_file_atomic(path, "{}")
+    write_file_atomic(path, b"[]")
+
+    assert path.read_bytes() == b"[]"
+    assert os.listdir(path.parent) == ["spec.json"]
+
+
+def test_write_file_atomic_keeps_old_content_on_error(tmp_path):
+
+    path = tmp_path / "spec.json"
+    write_file_atomic(path, "{}")
+    with pytest.raises(TypeError):
+        write_file_atomic(path, 1)  # type: ignore
+
+    assert path.read_text() == "{}"
+    assert os.listdir(tmp_path) == ["spec.json"]
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for reading the metadata of local projects."""
+
+import pytest
+
+from kiara_plugin.develop.utils import licenses, pypi
+from kiara_plugin.develop.utils.licenses import LicenseIndex
+from kiara_plugin.develop.utils.pkg_utils import (
+    create_pkg_spec,
+    get_pkg_metadata_from_project_folder,
+)
+from kiara_plugin.develop.utils.project_metadata import read_static_project_metadata
+
+PYPROJECT = """
+[project]
+name = "kiara_plugin.example"
+version = "0.1.0"
+description = "An example plugin."
+license = {text = "MPL-2.0"}
+dependencies = [
+    "httpx >= 0.23",
+    "tomli ; python_version < '3.11'",
+    "orjson>=3,<4",
+]
+
+[project.urls]
+homepage = "https://github.com/DHARPA-Project/kiara_plugin.example"
+
+[project.optional-dependencies]
+Dev_Utils = [
+    "pytest >= 7",
+    "uvloop ; sys_platform == 'linux' or sys_platform == 'darwin'",
+]
+"""
+
+
+def test_static_requirements_are_normalized(tmp_path):
+
+    (tmp_path / "pyproject.toml").write_text(PYPROJECT)
+
+    metadata = read_static_project_metadata(tmp_path)
+
+    assert metadata is not None
+    assert metadata["requires_dist"] == [
+        "httpx>=0.23",
+        'tomli; python_version < "3.11"',
+        "orjson<4,>=3",
+        'pytest>=7; extra == "dev-utils"',
+        'uvloop; (sys_platform == "linux" or sys_platform == "darwin") and extra == "dev-utils"',
+    ]
+
+
+@pytest.fixture
+def isolated_caches(tmp_path, monkeypatch):
+    """Make sure the developer's (PyPI/license) caches are neither used nor modified."""
+
+    monkeypatch.setattr(
+        pypi,
+        "_PYPI_METADATA_CACHE",
+        pypi.PyPiMetadataCache((tmp_path / "pypi_cache").as_posix()),
+    )
+    monkeypatch.setattr(pypi, "_PYPI_METADATA_FETCHER", None)
+    monkeypatch.setattr(licenses, "_LICENSE_INDEX", LicenseIndex.create())
+    yield
+    if pypi._PYPI_METADATA_FETCHER is not None:
+        pypi._PYPI_METADATA_FETCHER.shutdown()
+
+
+def test_spec_from_static_project(tmp_path, isolated_caches):
+
+    (tmp_path / "pyproject.toml").write_text(PYPROJECT)
+
+    pkg_metadata = get_pkg_metadata_from_project_folder(tmp_path.as_posix())
+    spec = create_pkg_spec(pkg_metadata)
+
+    assert spec.pkg_name == "kiara_plugin.example"
+    assert "pytest>=7" not in spec.pkg_requirements
+    assert len(spec.pkg_requirements) == 3
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for the PyPI metadata cache."""
+
+import threading
+from concurrent.futures import Future
+
+import httpx
+
+from kiara_plugin.develop.utils import pkg_utils
+from kiara_plugin.develop.utils.pypi import (
+    PyPiMetadataCache,
+    PyPiMetadataFetcher,
+    get_pkg_data_from_simple_index,
+)
+
+
+class RecordingCache(PyPiMetadataCache):
+    def __init__(self, responses, **kwargs):
+        super().__init__(**kwargs)
+        self.responses = list(responses)
+        self.requests = []
+
+    def _fetch(self, url, headers):
+        self.requests.append(dict(headers))
+        return self.responses.pop(0)
+
+
+def test_pinned_entries_do_not_expire(tmp_path):
+
+    url = "https://pypi.org/pypi/kiara/0.5.0/json"
+    cache = RecordingCache(
+        [httpx.Response(200, json={"info": {"version": "0.5.0"}})],
+        cache_dir=tmp_path.as_posix(),
+        ttl=0,
+    )
+
+    first = cache.get_json(url, pinned=True)
+    second = cache.get_json(url, pinned=True)
+
+    assert first == second
+    assert len(cache.requests) == 1
+
+
+def test_expired_entries_are_revalidated(tmp_path):
+
+    url = "https://pypi.org/pypi/kiara/json"
+    cache = RecordingCache(
+        [
+            httpx.Response(200, json={"info": {}}, headers={"ETag": '"abc"'}),
+            httpx.Response(304),
+        ],
+        cache_dir=tmp_path.as_posix(),
+        ttl=0,
+    )
+
+    cache.get_json(url)
+    data = cache.get_json(url)
+
+    assert data == {"info": {}}
+    assert cache.requests[1]["If-None-Match"] == '"abc"'
+
+
+def test_invalidate_removes_entries_fetched_with_headers(tmp_path):
+
+    url = "https://pypi.org/simple/kiara/"
+    headers = {"Accept": "application/vnd.pypi.simple.v1+json"}
+    cache = RecordingCache(
+        [httpx.Response(200, json={"v": 1}), httpx.Response(200, json={"v": 2})],
+        cache_dir=tmp_path.as_posix(),
+    )
+
+    assert cache.get_json(url, headers=headers) == {"v": 1}
+    cache.invalidate(url)
+    assert cache.get_json(url, headers=headers) == {"v": 2}
+    assert len(cache.requests) == 2
+
+
+def test_simple_index_backend(tmp_path):
+
+    index = {
+        "name": "kiara",
+        "files": [
+            {
+                "filename": "kiara-0.5.0.tar.gz",
+                "url": "https://files/kiara-0.5.0.tar.gz",
+                "hashes": {"sha256": "abc"},
+            },
+            {
+                "filename": "kiara-0.5.0-py3-none-any.whl",
+                "url": "https://files/kiara-0.5.0-py3-none-any.whl",
+                "hashes": {"sha256": "def"},
+                "core-metadata": True,
+            },
+            {
+                "filename": "kiara-0.6.0a1-py3-none-any.whl",
+                "url": "https://files/kiara-0.6.0a1-py3-none-any.whl",
+                "hashes": {"sha256": "ghi"},
+            },
+        ],
+    }
+    metadata = b"Metadata-Version: 2.1\nName: kiara\nVersion: 0.5.0\nLicense: MPL-2.0\nRequires-Dist: httpx>=0.23\n"
+
+    cache = RecordingCache(
+        [
+            httpx.Response(
+                200,
+                json=index,
+                headers={"Content-Type": "application/vnd.pypi.simple.v1+json"},
+            ),
+            httpx.Response(200, content=metadata),
+        ],
+        cache_dir=tmp_path.as_posix(),
+    )
+
+    data = get_pkg_data_from_simple_index("kiara", cache=cache)
+
+    assert data["info"]["version"] == "0.5.0"
+    assert data["info"]["requires_dist"] == ["httpx>=0.23"]
+    assert data["releases"]["0.5.0"][0]["digests"]["sha256"] == "abc"
+
+
+class BlockingCache(PyPiMetadataCache):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.release = threading.Event()
+        self.urls = []
+
+    def _fetch(self, url, headers):
+        self.urls.append(url)
+        self.release.wait(timeout=10)
+        return httpx.Response(200, json={"info": {"name": "kiara"}, "releases": {}})
+
+
+def test_fetcher_shares_in_flight_requests(tmp_path):
+
+    cache = BlockingCache(cache_dir=tmp_path.as_posix())
+    fetcher = PyPiMetadataFetcher(cache=cache, backend="json")
+
+    first = fetcher.submit("kiara", "0.5.0")
+    second = fetcher.submit("Kiara", "0.5.0")
+    other = fetcher.submit("kiara", "0.4.0")
+    cache.release.set()
+
+    assert first is second
+    assert other is not first
+    assert first.result() == second.result()
+    other.result()
+    assert sorted(cache.urls) == [
+        "https://pypi.org/pypi/kiara/0.4.0/json",
+        "https://pypi.org/pypi/kiara/0.5.0/json",
+    ]
+
+
+class FakeFetcher(object):
+    def __init__(self, requires_dist):
+        self.requires_dist = requires_dist
+        self.submitted = []
+
+    def submit(self, pkg_name, version=None):
+        self.submitted.append(pkg_name)
+        future: Future = Future()
+        future.set_result(
+            {
+                "info": {"requires_dist": self.requires_dist.get(pkg_name, [])},
+                "releases": {},
+            }
+        )
+        return future
+
+
+def test_extras_are_expanded_level_by_level(monkeypatch):
+
+    fetcher = FakeFetcher(
+        {
+            "a": ["b[x]", "c"],
+            "b": ["d; extra == 'x'", "e; extra == 'y'"],
+        }
+    )
+    monkeypatch.setattr(pkg_utils, "get_pypi_metadata_fetcher", lambda: fetcher)
+
+    reqs = pkg_utils.extract_reqs_from_metadata({"requires_dist": ["a[full]", "f"]})
+
+    assert sorted(reqs.keys()) == ["a", "b", "c", "d", "f"]
+    # every package with extras is only fetched once, one level after the other
+    assert fetcher.submitted == ["a", "b"]
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for the rattler-build log phase parser."""
+
+from kiara_plugin.develop.pkg_build.rattler.log_parser import RattlerBuildLogParser
+
+LOG = """
+ ╭─ Running build for recipe: kiara-0.5.0-pyh4616a5c_1
+ │ ╭─ Fetching source code
+ │ │ Found valid source cache file.
+ │ ╰─────────────────── (took 0 seconds)
+ │ ╭─ Resolving environments
+ │ │ Resolving host environment:
+ │ ╰─────────────────── (took 2 seconds)
+ │ ╭─ Installing host environment
+ │ ╭─ Running build script
+ │ │ + python -m pip install --no-deps --ignore-installed .
+ │ ╭─ Packaging new files
+INFO rattler_build::packaging: Compressing archive...
+ │ ╭─ Running tests
+"""
+
+
+def test_phases():
+
+    events = []
+    parser = RattlerBuildLogParser(
+        run="conda", on_phase=lambda phase, _: events.append(phase)
+    )
+    for line in LOG.splitlines():
+        parser.feed(line)
+    phases = parser.finish()
+
+    assert events == [
+        "source_fetch",
+        "environment_solve",
+        "package_download",
+        "build_script",
+        "packaging",
+        "compression",
+        "tests",
+    ]
+    assert [p.name for p in phases] == ["setup", *events]
+    assert all(p.run == "conda" and p.duration >= 0 for p in phases)
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for the release index."""
+
+from kiara_plugin.develop.utils.releases import (
+    ReleaseIndex,
+    check_requirements,
+    create_requirement,
+)
+
+RELEASES = {
+    "1.0": [{"yanked": False}],
+    "1.1": [{"yanked": True}],
+    "1.10": [{"yanked": False}],
+    "2.0rc1": [{"yanked": False}],
+    "not-a-version": [{"yanked": False}],
+}
+
+
+def test_release_index_latest():
+
+    index = ReleaseIndex("pkg", RELEASES)
+
+    assert index.versions() == ["1.10", "1.0"]
+    assert index.latest() == "1.10"
+    assert index.latest(include_prereleases=True) == "2.0rc1"
+
+
+def test_release_index_latest_matching():
+
+    index = ReleaseIndex("pkg", RELEASES)
+
+    assert index.latest_matching("<1.10") == "1.0"
+    assert index.latest_matching(">=2.0rc1") == "2.0rc1"
+    assert index.latest_matching(">3") is None
+    # yanked releases are only selected when pinned exactly
+    assert index.latest_matching("==1.1") == "1.1"
+
+
+def test_conda_requirements():
+
+    assert str(create_requirement("numpy 1.26").specifier) == "==1.26.*"
+    assert str(create_requirement("pandas >=1.0, <2").specifier) == "<2,>=1.0"
+    assert create_requirement("kiara>=0.5").name == "kiara"
+
+
+class FailingFetcher(object):
+    def submit(self, pkg_name, version=None):
+        raise AssertionError(f"Unexpected lookup: {pkg_name}")
+
+
+def test_unchecked_requirements():
+
+    checks = check_requirements(
+        ["numpy 1.26 py39_0", "python >=3.9", "r-base 4.3"], fetcher=FailingFetcher()
+    )
+
+    assert [c.pkg_name for c in checks] == ["numpy", "python", "r-base"]
+    assert checks[0].error.startswith("Can't parse requirement")
+    assert checks[1].error == "Not a PyPI package."
+    assert not any(c.satisfiable for c in checks)
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for the content-addressed source cache."""
+
+import hashlib
+
+import httpx
+import pytest
+
+from kiara_plugin.develop.utils import pypi
+from kiara_plugin.develop.utils.source_cache import SourceCache
+
+CONTENT = b"sdist content" * 1000
+
+
+@pytest.fixture()
+def requests(monkeypatch):
+
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, content=CONTENT)
+
+    client = httpx.Client(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(pypi, "get_http_client", lambda: client)
+    return requests
+
+
+def test_sources_are_only_downloaded_once(tmp_path, requests):
+
+    sha256 = hashlib.sha256(CONTENT).hexdigest()
+    cache = SourceCache(root=tmp_path)
+
+    url = "https://files/kiara-0.5.0.tar.gz"
+    first = cache.fetch(url, sha256)
+    second = cache.fetch(url, sha256)
+
+    assert first == second
+    assert first.name == "kiara-0.5.0.tar.gz"
+    assert first.read_bytes() == CONTENT
+    assert len(requests) == 1
+
+
+def test_invalid_digest(tmp_path, requests):
+
+    cache = SourceCache(root=tmp_path)
+
+    with pytest.raises(Exception):
+        cache.fetch("https://files/kiara-0.5.0.tar.gz", "0" * 64)
+
+    assert cache.get_path("0" * 64) is None
+    assert not list((tmp_path / "00" / ("0" * 64)).iterdir())
+
+
+def test_partial_and_corrupted_files_are_not_cache_hits(tmp_path, requests):
+
+    sha256 = hashlib.sha256(CONTENT).hexdigest()
+    folder = tmp_path / sha256[:2] / sha256
+    folder.mkdir(parents=True)
+    (folder / ".kiara-0.5.0.tar.gz.part").write_bytes(CONTENT[:10])
+    (folder / "kiara-0.4.0.tar.gz").write_bytes(CONTENT[:10])
+
+    cache = SourceCache(root=tmp_path)
+    assert cache.get_path(sha256) is None
+    assert not (folder / "kiara-0.4.0.tar.gz").exists()
+
+    path = cache.fetch("https://files/kiara-0.5.0.tar.gz", sha256)
+    assert path.read_bytes() == CONTENT
+    assert cache.get_path(sha256) == path
+
+
+def test_cached_files_are_only_hashed_again_if_changed(tmp_path, requests, monkeypatch):
+
+    from kiara_plugin.develop.utils import source_cache
+
+    sha256 = hashlib.sha256(CONTENT).hexdigest()
+    path = SourceCache(root=tmp_path).fetch("https://files/kiara-0.5.0.tar.gz", sha256)
+
+    hashed = []
+    get_file_sha256 = source_cache.get_file_sha256
+    monkeypatch.setattr(
+        source_cache,
+        "get_file_sha256",
+        lambda p: hashed.append(p) or get_file_sha256(p),
+    )
+
+    # a new process: the file is unchanged since it was downloaded
+    assert SourceCache(root=tmp_path).get_path(sha256) == path
+    assert hashed == []
+
+    path.write_bytes(CONTENT[:10])
+    assert SourceCache(root=tmp_path).get_path(sha256) is None
+    assert hashed == [path]
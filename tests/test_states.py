@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for the persisted states cache, and dependency-aware resolution."""
+
+import json
+import multiprocessing
+import time
+
+import pytest
+
+from kiara_plugin.develop.pkg_build.states import (
+    State,
+    States,
+    StatesResolutionException,
+    create_file_fingerprint,
+)
+
+
+class FileState(State):
+
+    resolved = 0
+
+    def fingerprint(self, details):
+        return create_file_fingerprint(details["path"])
+
+    def _resolve(self):
+        FileState.resolved += 1
+        path = self.get_config("path")
+        with open(path, "wt") as f:
+            f.write("resolved")
+        return {"path": path}
+
+    def _purge(self):
+        pass
+
+
+def create_states(tmp_path):
+
+    states = States(cache_path=tmp_path / "states.json")
+    states.add_state(FileState("file", path=(tmp_path / "file").as_posix()))
+    return states
+
+
+def test_states_are_persisted(tmp_path):
+
+    FileState.resolved = 0
+    create_states(tmp_path).resolve("file")
+    create_states(tmp_path).resolve("file")
+    assert FileState.resolved == 1
+
+    # changing the file invalidates the fingerprint
+    (tmp_path / "file").write_text("changed content")
+    create_states(tmp_path).resolve("file")
+    assert FileState.resolved == 2
+
+    states = create_states(tmp_path)
+    states.get_state("file").purge()
+    create_states(tmp_path).resolve("file")
+    assert FileState.resolved == 3
+
+
+def _cache_files(cache_path, start, count):
+
+    states = States(cache_path=cache_path)
+    for idx in range(start, start + count):
+        path = cache_path.parent / f"file_{idx}"
+        path.write_text("content")
+        state = FileState(f"file_{idx}", path=path.as_posix())
+        states.add_state(state)
+        states.cache_details(state, {"path": path.as_posix()})
+
+
+def test_concurrent_processes_keep_all_entries(tmp_path):
+
+    cache_path = tmp_path / "states.json"
+    ctx = multiprocessing.get_context("spawn")
+    procs = [
+        ctx.Process(target=_cache_files, args=(cache_path, idx * 20, 20))
+        for idx in range(3)
+    ]
+    for proc in procs:
+        proc.start()
+    for proc in procs:
+        proc.join()
+
+    assert len(json.loads(cache_path.read_text())) == 60
+
+
+class SleepState(State):
+    def _resolve(self):
+        if self.get_config("fail"):
+            raise Exception("failed")
+        time.sleep(self.get_config("duration"))
+        return {"done": True}
+
+    def _purge(self):
+        pass
+
+
+def create_graph_states(tmp_path, fail=()):
+
+    states = States(cache_path=tmp_path / "states.json")
+    for state_id, depends_on, duration in [
+        ("tool", [], 0.1),
+        ("env_a", ["tool"], 0.3),
+        ("env_b", ["tool"], 0.3),
+        ("env_c", ["env_a"], 0.1),
+    ]:
+        states.add_state(
+            SleepState(
+                state_id,
+                depends_on=depends_on,
+                duration=duration,
+                fail=state_id in fail,
+            )
+        )
+    return states
+
+
+def test_resolve_all_parallel(tmp_path):
+
+    states = create_graph_states(tmp_path)
+    start = time.monotonic()
+    result = states.resolve_all(parallel=2)
+    # env_a and env_b overlap
+    assert time.monotonic() - start < 0.75
+    assert result.critical_path == ["tool", "env_a", "env_c"]
+    assert result.critical_path_duration >= 0.5
+
+
+def test_resolve_all_failure(tmp_path):
+
+    states = create_graph_states(tmp_path, fail=["env_a"])
+    with pytest.raises(StatesResolutionException) as e:
+        states.resolve_all(parallel=2)
+
+    assert sorted(e.value.errors.keys()) == ["env_a", "env_c"]
+    assert states.get_state_detail("env_b", "done")
+
+
+class EnvState(SleepState):
+    def _resolve(self):
+        time.sleep(self.get_config("duration"))
+        return {"env_name": self.state_id, "mamba_prefix": self.get_config("prefix")}
+
+
+@pytest.mark.parametrize("operation", ["build_package", "upload_package"])
+def test_conda_env_mgmt_prepares_environments_concurrently(
+    tmp_path, monkeypatch, operation
+):
+
+    from kiara_plugin.develop.pkg_build.conda import CondaEnvMgmt
+
+    mgmt = CondaEnvMgmt()
+    mgmt._states = States(cache_path=None)
+    mgmt._states.add_state(SleepState("micromamba_available", duration=0, fail=False))
+    for state_id in ["conda-build-env", "test-env"]:
+        mgmt._states.add_state(
+            EnvState(
+                state_id,
+                depends_on=["micromamba_available"],
+                duration=0.5,
+                prefix=tmp_path.as_posix(),
+            )
+        )
+
+    class StopBuild(Exception):
+        pass
+
+    def _stop(*args, **kwargs):
+        raise StopBuild()
+
+    monkeypatch.setattr(mgmt, "get_state_details", _stop)
+
+    start = time.monotonic()
+    with pytest.raises(StopBuild):
+        if operation == "build_package":
+            mgmt.build_package(None)
+        else:
+            mgmt.upload_package("pkg.tar.bz2")
+
+    assert time.monotonic() - start < 0.9
+    assert mgmt._states.get_state_detail("test-env", "env_name") == "test-env"
+
+
+@pytest.mark.parametrize(
+    "config, expected",
+    [({}, "pinned"), ({"sha256": "configured"}, "configured")],
+)
+def test_rattler_build_download_is_verified(tmp_path, monkeypatch, config, expected):
+
+    from kiara_plugin.develop.pkg_build.rattler import states as rattler_states
+
+    downloads = []
+
+    def _download(url, target, sha256=None):
+        downloads.append(sha256)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_text("rattler-build")
+        return target
+
+    monkeypatch.setattr(rattler_states.platform, "system", lambda: "Linux")
+    monkeypatch.setattr(rattler_states.platform, "machine", lambda: "x86_64")
+    monkeypatch.setattr(
+        rattler_states,
+        "RATTLER_BUILD_SHA256",
+        {"0.15.0": {"x86_64-unknown-linux-musl": "pinned"}},
+    )
+    monkeypatch.setattr(rattler_states, "download_file", _download)
+
+    state = rattler_states.RattlerBuildAvailable(
+        "rattler-build-available",
+        root_path=tmp_path.as_posix(),
+        version="0.15.0",
+        **config,
+    )
+    state._resolve()
+
+    assert downloads == [expected]